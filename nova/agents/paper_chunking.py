@@ -0,0 +1,89 @@
+import re
+
+from prompt_builder import count_tokens
+
+
+HEADING_PATTERN = re.compile(r'^#{1,6}\s+\S', re.MULTILINE)
+
+
+def split_sections(markdown: str):
+    '''
+    Splits parsed paper markdown at its headings
+    Args:
+        markdown: str: parsed paper
+    Returns:
+        sections: list of str, each starting with its heading (the first may have none)
+    '''
+    starts = [match.start() for match in HEADING_PATTERN.finditer(markdown)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = [markdown[start:end].strip() for start, end in zip(starts, starts[1:] + [len(markdown)])]
+    return [section for section in sections if section]
+
+
+def _longest_prefix(text: str, max_tokens: int) -> str:
+    '''Longest prefix of text within max_tokens, cut at a word boundary where possible'''
+    low, high = 1, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    space = text.rfind(' ', 0, low)
+    return text[:space] if space > low // 2 else text[:low]
+
+
+def _split_oversized(section: str, max_tokens: int):
+    '''Splits a section that does not fit a chunk at paragraph boundaries (or hard, as a last resort)'''
+    pieces = []
+    current = ''
+    for paragraph in section.split('\n\n'):
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if count_tokens(candidate) <= max_tokens:
+            current = candidate
+            continue
+        if current and '\n' not in current and HEADING_PATTERN.match(current):
+            # Keep a lone heading with the text it introduces
+            paragraph = candidate
+        elif current:
+            pieces.append(current)
+        # A single paragraph larger than a chunk is cut into token sized pieces
+        while count_tokens(paragraph) > max_tokens:
+            head = _longest_prefix(paragraph, max_tokens)
+            pieces.append(head)
+            paragraph = paragraph[len(head):].lstrip()
+        current = paragraph
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_paper(markdown: str, max_tokens: int):
+    '''
+    Packs the sections of a paper into chunks of at most max_tokens tokens,
+    keeping sections together where possible
+    Args:
+        markdown: str: parsed paper
+        max_tokens: int: token budget of a chunk
+    Returns:
+        chunks: list of str
+    '''
+    chunks = []
+    current = ''
+    for section in split_sections(markdown):
+        if count_tokens(section) > max_tokens:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.extend(_split_oversized(section, max_tokens))
+            continue
+        candidate = f"{current}\n\n{section}" if current else section
+        if count_tokens(candidate) <= max_tokens:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = section
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,272 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+
+# Shared store of downloaded, parsed and summarized papers, reused across literature reviews
+PAPER_STORE_ROOT = os.getenv('RESEARCH_PAPER_STORE_ROOT', os.path.join('papers', 'store'))
+# Disk budget of the store, least recently used papers are evicted first
+PAPER_STORE_MAX_BYTES = int(os.getenv('RESEARCH_PAPER_STORE_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+
+PDF_FILE_NAME = 'paper.pdf'
+PARSED_FILE_NAME = 'parsed_data.md'
+SUMMARY_FILE_NAME = 'summary.md'
+HASH_CHUNK_SIZE = 1024 * 1024
+# Maximum number of cached chunk summaries, the least recently used are dropped first
+MAX_CHUNK_SUMMARIES = int(os.getenv('RESEARCH_PAPER_STORE_MAX_CHUNK_SUMMARIES', '20000'))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_name(name: str, parser_backend: str) -> str:
+    '''
+    Names an artifact after the PDF parser it was derived with, so switching
+    parsers does not serve parses (and summaries of them) of the other one
+    Args:
+        name: str: PARSED_FILE_NAME or SUMMARY_FILE_NAME
+        parser_backend: str: PDF parser backend, e.g. 'local' or 'llamaparse'
+    Returns:
+        name: str: e.g. parsed_data.local.md
+    '''
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{parser_backend}{extension}"
+
+
+def link_or_copy(src: str, dst: str):
+    '''Hard links a file (cheap, survives eviction of the source) and copies it if linking is not possible'''
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class PaperStore:
+    '''
+    Content addressed store of papers. Every PDF is stored once under its SHA-256
+    together with its parsed markdown and summary; Semantic Scholar paper IDs map
+    onto these entries, so the same paper found by different queries (or under a
+    slightly different title) is only downloaded, parsed and summarized once.
+    Summaries of chunks of long papers are cached by content hash in the index.
+
+    Layout: <root>/index.sqlite, <root>/<sha[:2]>/<sha>/{paper.pdf, parsed_data.<parser>.md, summary.<parser>.md}
+    '''
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        '''
+        Args:
+            root: str: folder of the store
+            max_bytes: int: disk budget of the store
+        '''
+        self.root = root or PAPER_STORE_ROOT
+        self.max_bytes = PAPER_STORE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._db_path = os.path.join(self.root, 'index.sqlite')
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS pdfs (
+                sha256 TEXT PRIMARY KEY,
+                title TEXT,
+                size_bytes INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS paper_ids (
+                paper_id TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL REFERENCES pdfs(sha256) ON DELETE CASCADE)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pdfs_last_access ON pdfs(last_access)')
+            conn.execute('''CREATE TABLE IF NOT EXISTS chunk_summaries (
+                content_hash TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                last_access REAL NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chunk_summaries_last_access ON chunk_summaries(last_access)')
+
+    @contextmanager
+    def _connect(self):
+        # A short lived connection per call keeps the store usable from any thread or worker process
+        conn = sqlite3.connect(self._db_path, timeout=30)
+        try:
+            conn.execute('PRAGMA foreign_keys = ON')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _entry_dir(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def _touch(self, conn, sha256: str):
+        conn.execute('UPDATE pdfs SET last_access = ? WHERE sha256 = ?', (time.time(), sha256))
+
+    def find_pdf(self, paper_id: str):
+        '''
+        Looks up the stored PDF of a Semantic Scholar paper
+        Args:
+            paper_id: str: Semantic Scholar paperId
+        Returns:
+            sha256: str: hash of the stored PDF or None
+        '''
+        if not paper_id:
+            return None
+        with self._lock, self._connect() as conn:
+            row = conn.execute('SELECT sha256 FROM paper_ids WHERE paper_id = ?', (paper_id,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(os.path.join(self._entry_dir(row[0]), PDF_FILE_NAME)):
+                # The files were removed behind the index's back
+                conn.execute('DELETE FROM pdfs WHERE sha256 = ?', (row[0],))
+                return None
+            self._touch(conn, row[0])
+            return row[0]
+
+    def add_pdf(self, pdf_path: str, paper_id: str = None, title: str = None) -> str:
+        '''
+        Adds a downloaded PDF to the store
+        Args:
+            pdf_path: str: path of the downloaded PDF
+            paper_id: str: Semantic Scholar paperId
+            title: str: paper title
+        Returns:
+            sha256: str: hash identifying the stored PDF
+        '''
+        sha256 = file_sha256(pdf_path)
+        entry_dir = self._entry_dir(sha256)
+        stored_path = os.path.join(entry_dir, PDF_FILE_NAME)
+        os.makedirs(entry_dir, exist_ok=True)
+        if not os.path.exists(stored_path):
+            temp_path = stored_path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            link_or_copy(pdf_path, temp_path)
+            os.replace(temp_path, stored_path)
+
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute('''INSERT INTO pdfs (sha256, title, size_bytes, created_at, last_access) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET last_access = excluded.last_access''',
+                (sha256, title, os.path.getsize(stored_path), now, now))
+            if paper_id:
+                conn.execute('INSERT OR REPLACE INTO paper_ids (paper_id, sha256) VALUES (?, ?)', (paper_id, sha256))
+
+        self.evict()
+        return sha256
+
+    def link_pdf(self, sha256: str, dst_path: str):
+        '''Places the stored PDF at dst_path (e.g. in a review's workspace)'''
+        link_or_copy(os.path.join(self._entry_dir(sha256), PDF_FILE_NAME), dst_path)
+
+    def get_artifact(self, sha256: str, name: str):
+        '''
+        Reads a derived artifact (parsed markdown or summary) of a stored PDF
+        Args:
+            sha256: str: hash of the PDF
+            name: str: artifact file name (see artifact_name)
+        Returns:
+            content: str: the artifact or None if it is not stored
+        '''
+        if not sha256:
+            return None
+        try:
+            with open(os.path.join(self._entry_dir(sha256), name), 'r', encoding='utf-8') as f:
+                content = f.read()
+        except OSError:
+            return None
+        with self._lock, self._connect() as conn:
+            self._touch(conn, sha256)
+        return content
+
+    def put_artifact(self, sha256: str, name: str, content: str):
+        '''
+        Stores a derived artifact of a stored PDF
+        Args:
+            sha256: str: hash of the PDF
+            name: str: artifact file name (see artifact_name)
+            content: str: the artifact
+        '''
+        if not sha256:
+            return
+        entry_dir = self._entry_dir(sha256)
+        if not os.path.isdir(entry_dir):
+            return
+        path = os.path.join(entry_dir, name)
+        temp_path = path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+        size = sum(os.path.getsize(os.path.join(entry_dir, file_name)) for file_name in os.listdir(entry_dir))
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE pdfs SET size_bytes = ?, last_access = ? WHERE sha256 = ?', (size, time.time(), sha256))
+        self.evict()
+
+    def get_chunk_summary(self, content_hash: str):
+        '''
+        Looks up the cached summary of a chunk of paper text
+        Args:
+            content_hash: str: hash of the chunk (and the prompt used to summarize it)
+        Returns:
+            summary: str: the cached summary or None
+        '''
+        with self._lock, self._connect() as conn:
+            row = conn.execute('SELECT summary FROM chunk_summaries WHERE content_hash = ?', (content_hash,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE chunk_summaries SET last_access = ? WHERE content_hash = ?', (time.time(), content_hash))
+            return row[0]
+
+    def put_chunk_summary(self, content_hash: str, summary: str):
+        '''
+        Caches the summary of a chunk of paper text
+        Args:
+            content_hash: str: hash of the chunk (and the prompt used to summarize it)
+            summary: str: the summary
+        '''
+        with self._lock, self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO chunk_summaries (content_hash, summary, last_access) VALUES (?, ?, ?)',
+                         (content_hash, summary, time.time()))
+            conn.execute('''DELETE FROM chunk_summaries WHERE content_hash IN (
+                SELECT content_hash FROM chunk_summaries ORDER BY last_access DESC LIMIT -1 OFFSET ?)''',
+                (MAX_CHUNK_SUMMARIES,))
+
+    def evict(self) -> int:
+        '''
+        Removes least recently used papers until the store fits its disk budget
+        Returns:
+            removed: int: number of evicted papers
+        '''
+        removed = 0
+        with self._lock, self._connect() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM pdfs').fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            for sha256, size in conn.execute('SELECT sha256, size_bytes FROM pdfs ORDER BY last_access').fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM pdfs WHERE sha256 = ?', (sha256,))
+                shutil.rmtree(self._entry_dir(sha256), ignore_errors=True)
+                total -= size
+                removed += 1
+        if removed:
+            print(f"Evicted {removed} papers from the paper store")
+        return removed
+
+
+_paper_store = None
+_paper_store_lock = threading.Lock()
+
+
+def get_paper_store() -> PaperStore:
+    '''Returns the process wide paper store, creating it on first use'''
+    global _paper_store
+    with _paper_store_lock:
+        if _paper_store is None:
+            _paper_store = PaperStore()
+    return _paper_store
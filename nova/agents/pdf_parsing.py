@@ -0,0 +1,214 @@
+import os
+import re
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+
+# 'local' parses PDFs with PyMuPDF on this host, 'llamaparse' uses the LlamaParse cloud API
+PDF_PARSER_BACKEND = os.getenv('RESEARCH_PDF_PARSER', 'local').lower()
+PDF_PARSER_WORKERS = int(os.getenv('RESEARCH_PDF_PARSER_WORKERS', str(min(4, os.cpu_count() or 1))))
+REFERENCE_TITLES = ["references", "bibliography"]
+
+# Text this much larger than the body text is treated as a heading
+HEADING_SIZE_RATIO = 1.15
+MAX_HEADING_LEVELS = 3
+MAX_HEADING_LENGTH = 200
+
+
+def remove_reference_section(pdf_path: str, out_path: str):
+    doc = fitz.open(pdf_path)
+
+    def get_reference_page_number(doc):
+        toc = doc.get_toc()
+        for item in reversed(toc):
+            title = item[1].lower()
+            if any(ref_title in title for ref_title in REFERENCE_TITLES):
+                return item[2]
+        return None
+
+    ref_num = get_reference_page_number(doc)
+    if ref_num is None:
+        doc.save(out_path)
+        doc.close()
+        print("Couldn't locate reference section")
+        return None
+
+    # remove pages after the reference section
+    ref_page = get_reference_page_number(doc) - 1 # since pages are 1-indexed
+    page_to_remove = ref_page + 1 # since reference can start from middle of the page
+    # print("Reference page:", page_to_remove)
+    if ref_page:
+        # print(f"Deleting pages from {page_to_remove+1} to {doc.page_count}")
+        doc.delete_pages(page_to_remove, doc.page_count - 1)
+
+    doc.save(out_path)
+    doc.close()
+    return None
+
+
+def clean_text(text):
+    # replace links with "<LINK>" token
+    text = re.sub(r'http\S+', '<LINK>', text)
+
+    # remove the references section
+    for ref_title in REFERENCE_TITLES:
+        ref_start = text.lower().find(f'# {ref_title.lower()}')
+        if ref_start != -1:
+            text = text[:ref_start]
+
+    # remove anything in square brackets
+    text = re.sub(r'\[.*?\]', '', text)
+
+    # remove email addresses
+    text = re.sub(r'\S+@\S+', '', text)
+    return text
+
+
+def _block_lines(block):
+    '''Yields (text, max font size) for every line of a PyMuPDF text block'''
+    for line in block.get('lines', []):
+        spans = [span for span in line.get('spans', []) if span.get('text', '').strip()]
+        if spans:
+            yield ''.join(span['text'] for span in spans).strip(), max(span['size'] for span in spans)
+
+
+def pdf_to_markdown(pdf_path: str, remove_references: bool = False) -> str:
+    '''
+    Extracts markdown-ish text from a PDF with PyMuPDF. Text set noticeably larger
+    than the body text becomes a heading (#, ##, ### by size), other blocks become
+    paragraphs with hyphenated line breaks joined.
+    Args:
+        pdf_path: str: path of the PDF
+        remove_references: bool: drop the pages after the reference section first
+    Returns:
+        content: str: extracted text
+    '''
+    temp_path = None
+    if remove_references:
+        fd, temp_path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        remove_reference_section(pdf_path, temp_path)
+        pdf_path = temp_path
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            pages = [page.get_text('dict')['blocks'] for page in doc]
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+    # The body font size is the size most characters are set in
+    size_counts = Counter()
+    for blocks in pages:
+        for block in blocks:
+            for text, size in _block_lines(block):
+                size_counts[round(size, 1)] += len(text)
+    if not size_counts:
+        return ''
+    body_size = size_counts.most_common(1)[0][0]
+    heading_sizes = sorted((size for size in size_counts if size >= body_size * HEADING_SIZE_RATIO), reverse=True)
+    heading_levels = {size: min(level, MAX_HEADING_LEVELS) for level, size in enumerate(heading_sizes, start=1)}
+
+    parts = []
+    for blocks in pages:
+        for block in blocks:
+            lines = list(_block_lines(block))
+            if not lines:
+                continue
+            block_size = round(max(size for _, size in lines), 1)
+            text = ''
+            for line_text, _ in lines:
+                if text.endswith('-'):
+                    text = text[:-1] + line_text
+                else:
+                    text = f"{text} {line_text}" if text else line_text
+
+            level = heading_levels.get(block_size)
+            if level and len(text) <= MAX_HEADING_LENGTH:
+                parts.append(f"{'#' * level} {text}")
+            else:
+                parts.append(text)
+
+    return '\n\n'.join(parts)
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    '''Returns the pool used for local parsing, so papers are parsed on several cores at once'''
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn: forking a process that runs threads (the web server, the job loop) is unsafe
+            _process_pool = ProcessPoolExecutor(max_workers=PDF_PARSER_WORKERS,
+                                                mp_context=multiprocessing.get_context('spawn'))
+    return _process_pool
+
+
+def reset_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+_llamaparse_parser = None
+
+
+def get_llamaparse_parser():
+    '''
+    Creates the LlamaParse client on first use
+    Raises ImportError or ValueError if llama_cloud_services or the API key is missing
+    '''
+    global _llamaparse_parser
+    if _llamaparse_parser is None:
+        from llama_cloud_services import LlamaParse
+
+        api_key = os.getenv('LLAMA_CLOUD_API_KEY')
+        if not api_key:
+            raise ValueError("LLAMA_CLOUD_API_KEY not found in environment variables or .env file.")
+        _llamaparse_parser = LlamaParse(
+            api_key=api_key,
+            result_type="markdown",  # "markdown" and "text" are available
+            num_workers=4,  # if multiple files passed, split in `num_workers` API calls
+            verbose=True,
+            language="en",  # Optionally you can define a language, default=en
+        )
+    return _llamaparse_parser
+
+
+async def parse_pdf_content(pdf_path: str) -> str:
+    '''
+    Parses a PDF with the configured backend
+    Args:
+        pdf_path: str: path of the PDF
+    Returns:
+        content: str: markdown text of the paper (not yet cleaned)
+    '''
+    if PDF_PARSER_BACKEND == 'llamaparse':
+        try:
+            parser = get_llamaparse_parser()
+        except (ImportError, ValueError) as e:
+            print(f"LlamaParse is not available, parsing locally: {e}")
+        else:
+            parsed_data = await parser.aload_data(pdf_path)
+            return '\n'.join(doc.text for doc in parsed_data)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_process_pool(), pdf_to_markdown, pdf_path)
+    except BrokenProcessPool as e:
+        # A crashed worker breaks the whole pool, start a fresh one next time and parse this paper in a thread
+        print(f"PDF parsing process pool broke, parsing in a thread: {e}")
+        reset_process_pool()
+        return await asyncio.to_thread(pdf_to_markdown, pdf_path)
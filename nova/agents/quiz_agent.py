@@ -32,7 +32,7 @@ class QuizGenerator:
         self.openai_api_version = openai_api_version
         self.openai_deployment = openai_deployment
 
-    def generate_quiz(self, documents, topic, num_questions=5, options_per_question=4):
+    def generate_quiz(self, documents, topic, num_questions=5, options_per_question=4, subject_digest=None):
         """
         Generate a quiz based on the provided documents and topic.
 
@@ -41,6 +41,8 @@ class QuizGenerator:
             topic: The specific topic to focus on
             num_questions: Number of questions to generate (default: 5)
             options_per_question: Number of options per question (default: 4)
+            subject_digest: Optional subject digest record (see subject_digest.py), used to
+                            extract only the documents covering the topic
 
         Returns:
             List of question dictionaries, each containing:
@@ -51,6 +53,19 @@ class QuizGenerator:
         try:
             logger.info(f"Generating quiz on topic: '{topic}' from {len(documents)} documents")
 
+            overview = ""
+            if subject_digest and subject_digest.get('documents'):
+                from subject_digest import relevant_documents, subject_topics, subject_key_terms
+
+                # Questions need the full text, but only of the documents whose contents or key terms match the topic
+                relevant_ids = set(relevant_documents(subject_digest, topic))
+                relevant = [doc for doc in documents if str(doc.get('_id')) in relevant_ids]
+                if relevant:
+                    logger.info(f"Subject digest narrowed the quiz to {len(relevant)} of {len(documents)} documents")
+                    documents = relevant
+                overview = (f"Subject topics: {'; '.join(subject_topics(subject_digest))}\n"
+                            f"Subject key terms: {', '.join(subject_key_terms(subject_digest))}\n\n---\n")
+
             # Extract relevant content from documents related to the topic
             document_content = self._extract_document_content(documents)
 
@@ -59,7 +74,7 @@ class QuizGenerator:
                 return []
 
             # Generate quiz questions using Azure OpenAI
-            quiz_questions = self._generate_questions_with_openai(document_content, topic, num_questions, options_per_question)
+            quiz_questions = self._generate_questions_with_openai(overview + document_content, topic, num_questions, options_per_question)
 
             logger.info(f"Successfully generated {len(quiz_questions)} quiz questions")
             return quiz_questions
@@ -8,8 +8,8 @@ load_dotenv() # Load environment variables from .env file
 
 import urllib3
 import json
+import threading
 import warnings
-import re # Add re import for sanitization
 
 urllib3.disable_warnings()
 
@@ -27,190 +27,315 @@ def get_api_key(key_name):
         raise ValueError(f"{key_name} not found in environment variables or .env file.")
 
 
-LLAMA_CLOUD_API_KEY = get_api_key('LLAMA_CLOUD_API_KEY')
-TOGETHER_API_KEY = get_api_key('TOGETHER_API_KEY')
-GROQ_API_KEY = get_api_key('GROQ_API_KEY')
-
-
 NUM_SEARCH_RESULTS = 10
 
-SEMANTIC_API_MAX_RETRIES = 10
-
 PAPER_SAVE_DIR = 'papers'
 REMOVE_REFERENCE_SECTION_FROM_PDF = False
-REFERENCE_TITLES = ["references", "bibliography"]
 
 USE_CACHE_FOR_PDF_PARSING = True
 USE_CACHE_FOR_SUMMARIZATION = True
 
 
 
-from autogen_ext.models.openai import OpenAIChatCompletionClient
+# Model clients are built on first use, so importing this module needs no API keys
+_model_clients = {}
+_model_clients_lock = threading.Lock()
 
-model_client = OpenAIChatCompletionClient(
-    model="llama3-70b-8192",
-    base_url="https://api.groq.com/openai/v1",
-    api_key=os.environ["GROQ_API_KEY"],
-    model_info={
-        "vision": False,
-        "function_calling": True,
-        "json_output": False,
-        "family": "unknown",
-    },
-)
 
+def get_model_client():
+    '''
+    Returns the Groq model client used by the search agent
+    '''
+    with _model_clients_lock:
+        if 'groq' not in _model_clients:
+            from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+            _model_clients['groq'] = OpenAIChatCompletionClient(
+                model="llama3-70b-8192",
+                base_url="https://api.groq.com/openai/v1",
+                api_key=get_api_key('GROQ_API_KEY'),
+                model_info={
+                    "vision": False,
+                    "function_calling": True,
+                    "json_output": False,
+                    "family": "unknown",
+                },
+            )
+        return _model_clients['groq']
 
-model_client_together = OpenAIChatCompletionClient(
-    model="meta-llama/Llama-Vision-Free",
-    base_url="https://api.together.xyz/v1",
-    max_tokens=10000,
-    api_key=TOGETHER_API_KEY,
-    model_info={
-        "vision": False,
-        "function_calling": True,
-        "json_output": False,
-        "functional_calling": True,
-        "family": "unknown",
-    }
-)
+
+def get_model_client_together():
+    '''
+    Returns the Together model client used by the summarizer and report generator
+    '''
+    with _model_clients_lock:
+        if 'together' not in _model_clients:
+            from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+            _model_clients['together'] = OpenAIChatCompletionClient(
+                model="meta-llama/Llama-Vision-Free",
+                base_url="https://api.together.xyz/v1",
+                max_tokens=10000,
+                api_key=get_api_key('TOGETHER_API_KEY'),
+                model_info={
+                    "vision": False,
+                    "function_calling": True,
+                    "json_output": False,
+                    "functional_calling": True,
+                    "family": "unknown",
+                }
+            )
+        return _model_clients['together']
 
 
 
 
 
 import requests
-import fitz
 import time
+import shutil
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from agents.research_workspace import ResearchWorkspace, cleanup_workspaces, sanitize_title
+from agents.paper_store import get_paper_store, artifact_name, PARSED_FILE_NAME, SUMMARY_FILE_NAME
+from agents.semantic_scholar import get_semantic_scholar_client, SemanticScholarError
+from agents.pdf_parsing import PDF_PARSER_BACKEND, parse_pdf_content, clean_text, remove_reference_section
+from agents.paper_chunking import chunk_paper
+from prompt_builder import count_tokens
+
+
+
+# Bounded parallelism for PDF downloads, all downloads share one connection pool
+DOWNLOAD_CONCURRENCY = int(os.getenv('RESEARCH_DOWNLOAD_CONCURRENCY', '5'))
+DOWNLOAD_CONNECT_TIMEOUT_SECONDS = 10
+DOWNLOAD_READ_TIMEOUT_SECONDS = int(os.getenv('RESEARCH_DOWNLOAD_TIMEOUT_SECONDS', '60'))
+DOWNLOAD_MAX_BYTES = int(os.getenv('RESEARCH_DOWNLOAD_MAX_BYTES', str(50 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Attempts per PDF; after a connection error or timeout the next attempt resumes the partial file
+DOWNLOAD_ATTEMPTS = 3
+TRANSIENT_DOWNLOAD_ERRORS = (requests.ConnectionError, requests.Timeout,
+                             requests.exceptions.ChunkedEncodingError)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+# PyMuPDF is not thread-safe, the download threads take turns using it
+_fitz_lock = threading.Lock()
+
+
+def get_http_session():
+    '''
+    Returns the process wide requests session used for downloads, creating it on first use
+    '''
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=DOWNLOAD_CONCURRENCY,
+                pool_maxsize=DOWNLOAD_CONCURRENCY,
+                max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=['GET']),
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'user-agent': 'requests/2.0.0'})
+            _http_session = session
+    return _http_session
+
 
+def is_valid_pdf(path: str) -> bool:
+    '''
+    Cheap check that a file is a complete PDF (header and end-of-file marker present)
+    '''
+    try:
+        size = os.path.getsize(path)
+        if size < 8:
+            return False
+        with open(path, 'rb') as f:
+            if f.read(5) != b'%PDF-':
+                return False
+            f.seek(max(size - 2048, 0))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+
+def download_pdf(session, url: str, path: str, max_bytes: int = None, timeout=None):
+    '''
+    Downloads a PDF, skipping files that were already downloaded completely
+    and resuming partial downloads when the server supports range requests
+    Args:
+        session: requests.Session: session used for the request
+        url: str: URL of the PDF
+        path: str: destination path
+        max_bytes: int: maximum size of the PDF
+        timeout: (connect, read) timeout in seconds
+    Returns:
+        downloaded: bool: False if an existing valid file was reused
+    '''
+    if is_valid_pdf(path):
+        return False
 
+    max_bytes = DOWNLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    timeout = timeout or (DOWNLOAD_CONNECT_TIMEOUT_SECONDS, DOWNLOAD_READ_TIMEOUT_SECONDS)
+    part_path = path + '.part'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
 
-def download_pdf(session, url: str, path: str):
-    headers = { 'user-agent': 'requests/2.0.0'}
-    with session.get(url, headers=headers, stream=True, verify=False) as response:
+    with session.get(url, headers=headers, stream=True, verify=False, timeout=timeout) as response:
         response.raise_for_status()
-        if response.headers['content-type'] != 'application/pdf':
+        if response.status_code != 206:
+            # The server ignored the range request, start over
+            offset = 0
+        if offset == 0 and 'application/pdf' not in response.headers.get('content-type', ''):
             raise Exception('The response is not a pdf')
 
-        with open(path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
+        content_length = response.headers.get('content-length')
+        if content_length and offset + int(content_length) > max_bytes:
+            raise Exception(f'The pdf is larger than {max_bytes} bytes')
+
+        written = offset
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_bytes:
+                    f.close()
+                    os.remove(part_path)
+                    raise Exception(f'The pdf is larger than {max_bytes} bytes')
                 f.write(chunk)
-    return None
-
-
-def query_semantic_scholar(query: str, limit: int, ntries:int = None):
-    if ntries is None:
-        ntries = int(SEMANTIC_API_MAX_RETRIES)
-    if ntries <= 0:
-        print("Semantic Scholar API rate limit exceeded, exiting...")
-        return []
-
-    url = (
-        f"https://api.semanticscholar.org/graph/v1/paper/search?"
-        f"query={query}&openAccessPdf&limit={limit}&fields=title,year,abstract,isOpenAccess,openAccessPdf"
-    )
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        return data.get("data", [])
-    elif response.status_code == 429:
-        #print("Semantic Scholar API rate limit exceeded, retrying...")
-        time.sleep(SEMANTIC_API_MAX_RETRIES - ntries)
-        return query_semantic_scholar(query, limit, ntries - 1)
-    else:
-        print("Semantic Scholar API error:", response.status_code)
-        return []
-
-
-
-def remove_reference_section(pdf_path: str, out_path: str):
-    doc = fitz.open(pdf_path)
-
-    def get_reference_page_number(doc):
-        toc = doc.get_toc()
-        for item in reversed(toc):
-            title = item[1].lower()
-            if any(ref_title in title for ref_title in REFERENCE_TITLES):
-                return item[2]
-        return None
-
-    ref_num = get_reference_page_number(doc)
-    if ref_num is None:
-        doc.save(out_path)
-        print("Couldn't locate reference section")
-        return None
-
-    # remove pages after the reference section
-    ref_page = get_reference_page_number(doc) - 1 # since pages are 1-indexed
-    page_to_remove = ref_page + 1 # since reference can start from middle of the page
-    # print("Reference page:", page_to_remove)
-    if ref_page:
-        # print(f"Deleting pages from {page_to_remove+1} to {doc.page_count}")
-        doc.delete_pages(page_to_remove, doc.page_count - 1)
-
-    doc.save(out_path)
-    doc.close()
-    return None
 
+    os.replace(part_path, path)
+    return True
 
 
-def get_papers(query: str, num_papers: int):
+async def get_papers(query: str, num_papers: int, workspace: ResearchWorkspace = None):
     '''
     Downloads papers from Semantic Scholar API
     Args:
         query: str: search query
         num_papers: int: number of papers to download
+        workspace: ResearchWorkspace: workspace of the review the papers are downloaded for
     Returns:
         papers: list of dictionaries containing paper metadata
     '''
-    papers = []
+    if workspace is None:
+        workspace = ResearchWorkspace()
+    try:
+        results = await get_semantic_scholar_client().search_papers(query, NUM_SEARCH_RESULTS)
+    except SemanticScholarError as e:
+        print(e)
+        results = []
+    candidates = [paper for paper in results if (paper.get('openAccessPdf') or {}).get('url')]
+    # Downloads block, keep them off the event loop
+    return await asyncio.to_thread(download_papers, candidates, num_papers, workspace)
+
+
+def download_papers(candidates: list, num_papers: int, workspace: ResearchWorkspace):
+    '''
+    Downloads the PDFs of the best ranked candidates
+    Args:
+        candidates: list: search results in rank order
+        num_papers: int: number of papers to download
+        workspace: ResearchWorkspace: workspace of the review the papers are downloaded for
+    Returns:
+        papers: list of dictionaries containing paper metadata
+    '''
+    session = get_http_session()
+    downloaded = {}
 
-    for paper in query_semantic_scholar(query, NUM_SEARCH_RESULTS):
-        try:
-            # Sanitize the paper title for use as a directory name
-            # Keep alphanumeric, underscore, hyphen. Replace others with underscore.
-            sanitized_title = re.sub(r'[^a-zA-Z0-9_]', '_', paper['title'])
-            # Replace multiple consecutive underscores with a single one
-            sanitized_title = re.sub(r'_+', '_', sanitized_title)
-            # Remove leading/trailing underscores
-            sanitized_title = sanitized_title.strip('_')
-
-            fname = sanitized_title # Use the sanitized title
-            paper_folder = os.path.join(PAPER_SAVE_DIR, fname)
-            os.makedirs(paper_folder, exist_ok=True)
-            out_path = os.path.join(paper_folder, f"paper.pdf")
-            download_pdf(requests.Session(), paper['openAccessPdf']['url'], out_path)
+    paper_store = get_paper_store()
 
-        except Exception as e:
-            # Attempt to remove the directory if an error occurred after its creation
-            if 'paper_folder' in locals() and os.path.exists(paper_folder):
-                try:
-                    # Check if the directory is empty before removing
-                    if not os.listdir(paper_folder):
-                        os.rmdir(paper_folder)
-                    else:
-                        # If not empty, perhaps log or handle differently,
-                        # for now, we'll print a message.
-                        print(f"Directory {paper_folder} is not empty, not removing.")
-                except OSError as oe:
-                    print(f"Error removing directory {paper_folder}: {oe}")
-            print(f"Failed to download or process {paper.get('title', 'Unknown Title')}: {e}")
-            continue
+    def fetch(paper):
+        paper_folder = workspace.paper_folder(paper['title'])
+        out_path = os.path.join(paper_folder, f"paper.pdf")
+        try:
+            # Papers found by an earlier review are reused from the paper store
+            pdf_sha256 = paper_store.find_pdf(paper.get('paperId'))
+            if pdf_sha256:
+                paper_store.link_pdf(pdf_sha256, out_path)
+            else:
+                for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+                    try:
+                        download_pdf(session, paper['openAccessPdf']['url'], out_path)
+                        break
+                    except TRANSIENT_DOWNLOAD_ERRORS as e:
+                        # The .part file is kept, the next attempt continues it with a range request
+                        if attempt == DOWNLOAD_ATTEMPTS:
+                            raise
+                        print(f"Download of {paper['title']} interrupted ({e}), resuming")
+                        time.sleep(attempt)
+                pdf_sha256 = paper_store.add_pdf(out_path, paper_id=paper.get('paperId'), title=paper['title'])
+        except Exception:
+            # Giving up on this paper, remove the directory with whatever was written to it
+            shutil.rmtree(paper_folder, ignore_errors=True)
+            raise
 
         if REMOVE_REFERENCE_SECTION_FROM_PDF:
             out_path_no_ref = os.path.join(paper_folder, f"paper_no_ref.pdf")
-            remove_reference_section(out_path, out_path_no_ref)
-
+            with _fitz_lock:
+                remove_reference_section(out_path, out_path_no_ref)
+        return out_path, pdf_sha256
+
+    # Two candidates with the same paper ID or the same sanitized title would
+    # download into the same folder and .part file at the same time
+    unique_candidates = []
+    seen_paper_ids = set()
+    seen_folders = set()
+    for paper in candidates:
+        paper_id = paper.get('paperId')
+        folder = sanitize_title(paper['title'])
+        if (paper_id and paper_id in seen_paper_ids) or folder in seen_folders:
+            continue
+        if paper_id:
+            seen_paper_ids.add(paper_id)
+        seen_folders.add(folder)
+        unique_candidates.append(paper)
+    candidates = unique_candidates
+
+    # Only as many downloads as papers are still missing run at once, a failed
+    # download is replaced by the next best ranked candidate
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY) as executor:
+        pending = {}
+        next_candidate = 0
+        while True:
+            while (next_candidate < len(candidates) and len(pending) < DOWNLOAD_CONCURRENCY
+                   and len(downloaded) + len(pending) < num_papers):
+                if not workspace.has_capacity():
+                    print(f"Workspace {workspace.path} reached its disk quota, not downloading more papers")
+                    next_candidate = len(candidates)
+                    break
+                pending[executor.submit(fetch, candidates[next_candidate])] = next_candidate
+                next_candidate += 1
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rank = pending.pop(future)
+                paper = candidates[rank]
+                try:
+                    downloaded[rank] = future.result()
+                    print(f"Downloaded : {paper['title']}")
+                except Exception as e:
+                    print(f"Failed to download or process {paper.get('title', 'Unknown Title')}: {e}")
 
+    # Keep the search ranking regardless of which download finished first
+    papers = []
+    for rank in sorted(downloaded)[:num_papers]:
+        paper = candidates[rank]
+        pdf_path, pdf_sha256 = downloaded[rank]
         papers.append({
             "title": paper["title"],
             "year": paper["year"],
             "abstract": paper["abstract"],
-            "pdf_path": out_path,
+            "pdf_path": pdf_path,
+            "pdf_sha256": pdf_sha256,
         }
         )
-        print(f"Downloaded : {paper['title']}")
-        if len(papers) == num_papers:
-            break
 
     print(f"Downloaded {len(papers)} papers")
     return papers
@@ -220,21 +345,8 @@ def get_papers(query: str, num_papers: int):
 
 
 
-from llama_cloud_services import LlamaParse
-import asyncio
-
-parser = LlamaParse(
-    api_key=LLAMA_CLOUD_API_KEY,
-    result_type="markdown",  # "markdown" and "text" are available
-    num_workers=4,  # if multiple files passed, split in `num_workers` API calls
-    verbose=True,
-    language="en",  # Optionally you can define a language, default=en
-)
-
-
 async def parse_pdf(pdf_path):
-    parsed_data = await parser.aload_data(pdf_path)
-    return parsed_data
+    return await parse_pdf_content(pdf_path)
 
 
 
@@ -243,8 +355,7 @@ async def parse_all_papers(papers):
     results = await asyncio.gather(*tasks)  # Run all tasks in parallel
 
     # Store results back in papers
-    for paper, parsed_data in zip(papers, results):
-        content = '\n'.join(doc.text for doc in parsed_data)
+    for paper, content in zip(papers, results):
         paper["parsed_data"] = content
 
     return papers
@@ -252,29 +363,6 @@ async def parse_all_papers(papers):
 
 
 
-
-
-import re
-def clean_text(text):
-    # replace links with "<LINK>" token
-    text = re.sub(r'http\S+', '<LINK>', text)
-
-    # remove the references section
-    for ref_title in REFERENCE_TITLES:
-        ref_start = text.lower().find(f'# {ref_title.lower()}')
-        if ref_start != -1:
-            text = text[:ref_start]
-
-    # remove anything in square brackets
-    text = re.sub(r'\[.*?\]', '', text)
-
-    # remove email addresses
-    text = re.sub(r'\S+@\S+', '', text)
-    return text
-
-
-
-
 from autogen_core.models import AssistantMessage, UserMessage, SystemMessage
 from autogen_core import (
     MessageContext,
@@ -312,6 +400,23 @@ def log_msg(agent, msg: Message):
         print(f"{msg.display_msg}\n")
 
 
+def report_progress(progress, event_type: str, message: str, **data):
+    '''
+    Forwards a progress event to the callback passed to literature_review (if any)
+    Args:
+        progress: callable(event_type, message, **data) or None
+        event_type: str: machine readable event type
+        message: str: human readable description, None for state updates that are not shown as an event
+            (e.g. partial_report=... while the report is written)
+    '''
+    if progress is None:
+        return
+    try:
+        progress(event_type, message, **data)
+    except Exception as e:
+        print(f"Failed to report progress: {e}")
+
+
 
 search_topic_type = "SearchAgent"
 paper_summarizer = "SummarizerAgent"
@@ -332,21 +437,29 @@ SEARCH_AGENT_PROMPT = (
 )
 
 
-search_papers_tool = FunctionTool(
-    func=get_papers,
-    name="search_papers",
-    description="Search for papers on a given topic using Semantic Scholar API"
-)
+def make_search_papers_tool(workspace: ResearchWorkspace):
+    '''
+    Creates the search tool of a review, bound to the review's workspace
+    '''
+    async def search_papers(query: str, num_papers: int):
+        return await get_papers(query, num_papers, workspace=workspace)
+
+    return FunctionTool(
+        func=search_papers,
+        name="search_papers",
+        description="Search for papers on a given topic using Semantic Scholar API"
+    )
 
 
 
 @type_subscription(topic_type=search_topic_type)
 class SearchAgent(RoutedAgent):
-    def __init__(self, model_client: ChatCompletionClient) -> None:
+    def __init__(self, model_client: ChatCompletionClient, workspace: ResearchWorkspace, progress=None) -> None:
         super().__init__("A search agent")
         self._system_message = SystemMessage(content=SEARCH_AGENT_PROMPT)
         self._model_client = model_client
-        self._search_papers_tool = search_papers_tool
+        self._search_papers_tool = make_search_papers_tool(workspace)
+        self._progress = progress
 
     @message_handler
     async def on_message(self, message: Message, ctx: MessageContext) -> None:
@@ -358,12 +471,16 @@ class SearchAgent(RoutedAgent):
         )
         if isinstance(llm_result.content, str):
             log_msg(self, Message(display_msg=llm_result.content))
+            # Without a search there is nothing to wait for
+            await self.publish_message(Termination(reason="No search was performed"), DefaultTopicId())
             return None
 
         papers, arguments = await self._handle_tool_call(llm_result)
 
         refined_title = arguments['query']
         num_papers = len(papers)
+        report_progress(self._progress, 'papers_found', f"Found {num_papers} papers on '{refined_title}'",
+                        num_papers=num_papers, query=refined_title, titles=[paper["title"] for paper in papers])
         message_to_report_generator = Message(
             display_msg = f"Found {num_papers} papers on the topic '{refined_title}'",
             hidden_content = {'num_papers': num_papers }
@@ -375,7 +492,7 @@ class SearchAgent(RoutedAgent):
         for paper in papers:
             message_to_summarizer = Message(
                 display_msg= f'PDF for the paper "{paper["title"]}" is saved at path - "{paper["pdf_path"]}"',
-                hidden_content = {'pdf_path': paper["pdf_path"], 'title': paper["title"] }
+                hidden_content = {'pdf_path': paper["pdf_path"], 'title': paper["title"], 'pdf_sha256': paper.get("pdf_sha256") }
             )
             log_msg(self, message_to_summarizer)
             tsk = self.publish_message(message_to_summarizer, topic_id=TopicId(paper_summarizer, source=self.id.key))
@@ -411,8 +528,24 @@ SUMMARIZER_AGENT_PROMPT = (
 "Therefore, ensure that the summary you write is informative enough to be used in a literature review. "
 )
 
+CHUNK_SUMMARIZER_PROMPT = (
+"You are an agent in a multi-agent system designed for generating literature review. "
+"You will be given one part of a longer technical paper. "
+"Summarize this part in less than 250 words, keeping its objectives, methods, results and limitations. "
+"Your summary will be combined with the summaries of the other parts into a summary of the whole paper. "
+)
+
+# Papers longer than this are summarized per chunk (map) and the chunk summaries combined (reduce)
+SUMMARY_SINGLE_PASS_MAX_TOKENS = int(os.getenv('RESEARCH_SUMMARY_SINGLE_PASS_MAX_TOKENS', '6000'))
+SUMMARY_CHUNK_MAX_TOKENS = int(os.getenv('RESEARCH_SUMMARY_CHUNK_MAX_TOKENS', '3000'))
+# Maximum number of chunk summaries requested at the same time
+SUMMARY_CHUNK_CONCURRENCY = int(os.getenv('RESEARCH_SUMMARY_CHUNK_CONCURRENCY', '4'))
+# Stored parses and summaries are only reused with the parser that produced them
+PARSED_ARTIFACT_NAME = artifact_name(PARSED_FILE_NAME, PDF_PARSER_BACKEND)
+SUMMARY_ARTIFACT_NAME = artifact_name(SUMMARY_FILE_NAME, PDF_PARSER_BACKEND)
+
 
-async def parse_pdf_and_save(pdf_path: str):
+async def parse_pdf_and_save(pdf_path: str, pdf_sha256: str = None):
     dir_path = os.path.dirname(pdf_path)
     out_path = os.path.join(dir_path, "parsed_data.md")
 
@@ -420,12 +553,19 @@ async def parse_pdf_and_save(pdf_path: str):
         with open(out_path, 'r') as f:
             return f.read()
 
+    paper_store = get_paper_store()
+    if USE_CACHE_FOR_PDF_PARSING:
+        content = await asyncio.to_thread(paper_store.get_artifact, pdf_sha256, PARSED_ARTIFACT_NAME)
+        if content is not None:
+            return content
 
-    parsed_data = await parser.aload_data(pdf_path)
-    content = '\n'.join(doc.text for doc in parsed_data)
+    # Parse the copy without references when get_papers produced one
+    pdf_no_ref_path = os.path.join(dir_path, "paper_no_ref.pdf")
+    content = await parse_pdf_content(pdf_no_ref_path if os.path.exists(pdf_no_ref_path) else pdf_path)
     content = clean_text(content)
     with open(out_path, 'w') as f:
         f.write(content)
+    await asyncio.to_thread(paper_store.put_artifact, pdf_sha256, PARSED_ARTIFACT_NAME, content)
 
     return content
 
@@ -433,10 +573,13 @@ async def parse_pdf_and_save(pdf_path: str):
 
 @type_subscription(topic_type=paper_summarizer)
 class SummarizerAgent(RoutedAgent):
-    def __init__(self, model_client: ChatCompletionClient) -> None:
+    def __init__(self, model_client: ChatCompletionClient, progress=None) -> None:
         super().__init__("A paper summarizer agent")
         self._system_message = SystemMessage(content=SUMMARIZER_AGENT_PROMPT)
+        self._chunk_system_message = SystemMessage(content=CHUNK_SUMMARIZER_PROMPT)
         self._model_client = model_client
+        self._progress = progress
+        self._chunk_semaphore = asyncio.Semaphore(SUMMARY_CHUNK_CONCURRENCY)
 
 
     @message_handler
@@ -447,26 +590,22 @@ class SummarizerAgent(RoutedAgent):
         except KeyError as e:
             print(f"Invalid message received in {self.id.type}: {message.display_msg}")
             raise e
+        pdf_sha256 = message.hidden_content.get('pdf_sha256')
 
         summary_path = os.path.join(os.path.dirname(pdf_path), "summary.md")
-
-        if USE_CACHE_FOR_SUMMARIZATION and os.path.exists(summary_path):
-            pass
-        else:
-            content = await parse_pdf_and_save(pdf_path)
-            content = f"Summarize the paper titled '{title}.'\n Below is the content - {content}"
-            llm_result = await self._model_client.create(
-                messages=[self._system_message, UserMessage(content=content, source=self.id.key)],
-                cancellation_token=ctx.cancellation_token,
+        try:
+            await self._summarize(pdf_path, pdf_sha256, title, summary_path, ctx)
+        except Exception as e:
+            # Tell the report generator so it does not wait for this paper
+            print(f"Failed to summarize {title}: {e}")
+            report_progress(self._progress, 'paper_failed', f'Could not summarize "{title}"', title=title)
+            await self.publish_message(
+                Message(display_msg=f'Summarizing the paper "{title}" failed', hidden_content={'failed': True, 'title': title}),
+                topic_id=TopicId(report_generator_type, source=self.id.key)
             )
+            return None
 
-            summary = llm_result.content
-            assert isinstance(summary, str)
-
-
-            with open(summary_path, 'w') as f:
-                f.write(summary)
-
+        report_progress(self._progress, 'paper_summarized', f'Summarized "{title}"', title=title)
         message_to_reporter = Message(
             display_msg = f'Summary for the paper "{title}" is saved at path - "{summary_path}"',
             hidden_content = {'summary_path': summary_path, 'title': title}
@@ -475,6 +614,74 @@ class SummarizerAgent(RoutedAgent):
         await self.publish_message(message_to_reporter, topic_id=TopicId(report_generator_type, source=self.id.key))
         return None
 
+    async def _summarize(self, pdf_path: str, pdf_sha256: str, title: str, summary_path: str, ctx: MessageContext) -> None:
+        paper_store = get_paper_store()
+        stored_summary = None
+        if USE_CACHE_FOR_SUMMARIZATION:
+            stored_summary = await asyncio.to_thread(paper_store.get_artifact, pdf_sha256, SUMMARY_ARTIFACT_NAME)
+
+        if USE_CACHE_FOR_SUMMARIZATION and os.path.exists(summary_path):
+            pass
+        elif stored_summary is not None:
+            # Summarized by an earlier review, reuse it
+            with open(summary_path, 'w') as f:
+                f.write(stored_summary)
+        else:
+            content = await parse_pdf_and_save(pdf_path, pdf_sha256)
+            report_progress(self._progress, 'paper_parsed', f'Parsed "{title}"', title=title)
+            summary = await self._summarize_content(title, content, ctx.cancellation_token)
+
+            with open(summary_path, 'w') as f:
+                f.write(summary)
+            await asyncio.to_thread(paper_store.put_artifact, pdf_sha256, SUMMARY_ARTIFACT_NAME, summary)
+
+    async def _complete(self, system_message: SystemMessage, content: str, cancellation_token: CancellationToken) -> str:
+        llm_result = await self._model_client.create(
+            messages=[system_message, UserMessage(content=content, source=self.id.key)],
+            cancellation_token=cancellation_token,
+        )
+        summary = llm_result.content
+        assert isinstance(summary, str)
+        return summary
+
+    async def _summarize_content(self, title: str, content: str, cancellation_token: CancellationToken) -> str:
+        if count_tokens(content) <= SUMMARY_SINGLE_PASS_MAX_TOKENS:
+            return await self._complete(self._system_message,
+                                        f"Summarize the paper titled '{title}.'\n Below is the content - {content}",
+                                        cancellation_token)
+
+        # Map: summarize section-aligned chunks concurrently
+        chunks = chunk_paper(content, SUMMARY_CHUNK_MAX_TOKENS)
+        print(f"Summarizing {title} in {len(chunks)} chunks")
+        partials = await asyncio.gather(*[self._summarize_chunk(title, chunk, cancellation_token) for chunk in chunks])
+
+        # Reduce: combine in further rounds while the chunk summaries do not fit a single request
+        while len(partials) > 1 and count_tokens('\n\n'.join(partials)) > SUMMARY_SINGLE_PASS_MAX_TOKENS:
+            groups = chunk_paper('\n\n'.join(partials), SUMMARY_CHUNK_MAX_TOKENS)
+            if len(groups) >= len(partials):
+                break
+            partials = await asyncio.gather(*[self._summarize_chunk(title, group, cancellation_token) for group in groups])
+
+        sections = '\n\n'.join(f"Part {index}:\n{partial}" for index, partial in enumerate(partials, start=1))
+        return await self._complete(self._system_message,
+                                    f"Summarize the paper titled '{title}.'\n Below are summaries of its consecutive parts - {sections}",
+                                    cancellation_token)
+
+    async def _summarize_chunk(self, title: str, chunk: str, cancellation_token: CancellationToken) -> str:
+        # Keyed by the prompt as well, so changing it does not serve stale summaries
+        content_hash = hashlib.sha256(f"{CHUNK_SUMMARIZER_PROMPT}\0{chunk}".encode('utf-8')).hexdigest()
+        paper_store = get_paper_store()
+        summary = await asyncio.to_thread(paper_store.get_chunk_summary, content_hash)
+        if summary is not None:
+            return summary
+
+        async with self._chunk_semaphore:
+            summary = await self._complete(self._chunk_system_message,
+                                           f"Part of the paper titled '{title}':\n{chunk}",
+                                           cancellation_token)
+        await asyncio.to_thread(paper_store.put_chunk_summary, content_hash, summary)
+        return summary
+
 
 
 REPORT_GENERATOR_AGENT_PROMPT = (
@@ -530,13 +737,36 @@ Note:
 
 
 
+# Once this many seconds passed since the search, the report is written from the summaries available
+REPORT_DEADLINE_SECONDS = int(os.getenv('RESEARCH_REPORT_DEADLINE_SECONDS', '600'))
+# Minimum seconds between two updates of the streamed report
+REPORT_STREAM_UPDATE_SECONDS = 1.0
+
+
+def compose_partial_report(summaries, num_papers: int) -> str:
+    '''
+    Builds a preliminary report from the summaries received so far, shown while the final report is pending
+    '''
+    content = f"# Preliminary results\n\n*Summaries of {len(summaries)} of {num_papers} papers, the full literature review is being written.*\n\n"
+    for title, summary in summaries:
+        content += f"## {title}\n\n{summary}\n\n"
+    return content
+
+
 @type_subscription(topic_type=report_generator_type)
 class ReportGeneratorAgent(RoutedAgent):
-    def __init__(self, model_client: ChatCompletionClient) -> None:
+    def __init__(self, model_client: ChatCompletionClient, report_path: str, progress=None,
+                 deadline_seconds: int = REPORT_DEADLINE_SECONDS) -> None:
         super().__init__("A paper summarizer agent")
         self._system_message = SystemMessage(content=REPORT_GENERATOR_AGENT_PROMPT)
         self._model_client = model_client
+        self._report_path = report_path
+        self._progress = progress
+        self._deadline_seconds = deadline_seconds
+        self._deadline_task = None
+        self._finalized = False
         self.num_papers = None
+        self.num_failed = 0
         self.summaries = []
 
 
@@ -547,44 +777,104 @@ class ReportGeneratorAgent(RoutedAgent):
             self.num_papers = num_papers
             if len(self.summaries) > 0:
                 raise ValueError("Summaries should be empty when num_papers is set")
+            if num_papers == 0:
+                # No summaries will ever arrive, stop instead of waiting forever
+                await self.publish_message(Termination(reason="No papers found"), DefaultTopicId())
+            else:
+                self._deadline_task = asyncio.create_task(self._deadline())
             return None
 
         if self.num_papers is None:
             raise ValueError(f"Number of papers should be set before receiving summaries. Got: {message.display_msg}")
 
+        if self._finalized:
+            # Arrived after the deadline, the report is already being written without it
+            return None
 
-        title, summary_path = message.hidden_content['title'], message.hidden_content['summary_path']
-        with open(summary_path, 'r') as f:
-            summary = f.read()
-            self.summaries.append((title, summary))
+        if message.hidden_content.get('failed'):
+            self.num_failed += 1
+        else:
+            title, summary_path = message.hidden_content['title'], message.hidden_content['summary_path']
+            with open(summary_path, 'r') as f:
+                summary = f.read()
+                self.summaries.append((title, summary))
+            report_progress(self._progress, 'partial_report', None,
+                            partial_report=compose_partial_report(self.summaries, self.num_papers))
 
-        if len(self.summaries) == self.num_papers:
-            content = f'Below are the summaries of {self.num_papers} papers:\n\n'
-            for title, summary in self.summaries:
-                content += f'Paper: {title}\n{summary}\n\n'
+        if len(self.summaries) + self.num_failed == self.num_papers:
+            await self._finalize(ctx.cancellation_token)
 
-            llm_result = await self._model_client.create(
-                messages=[self._system_message, UserMessage(content=content, source=self.id.key)],
-                cancellation_token=ctx.cancellation_token,
-            )
+        return None
 
-            report = llm_result.content
-            assert isinstance(report, str)
+    async def _deadline(self):
+        await asyncio.sleep(self._deadline_seconds)
+        if self._finalized:
+            return
+        print(f"Report deadline reached with {len(self.summaries)} of {self.num_papers} summaries")
+        report_progress(self._progress, 'deadline_reached',
+                        f'Time limit reached, writing the report from {len(self.summaries)} of {self.num_papers} papers')
+        try:
+            await self._finalize(CancellationToken(), cancel_deadline=False)
+        except Exception as e:
+            print(f"Failed to write the report after the deadline: {e}")
 
-            report_path = os.path.join(PAPER_SAVE_DIR, "initial_report.md")
-            with open(report_path, 'w') as f:
-                f.write(report)
+    async def _finalize(self, cancellation_token: CancellationToken, cancel_deadline: bool = True) -> None:
+        # Only one synthesis per review, whichever of the last summary and the deadline comes first
+        if self._finalized:
+            return
+        self._finalized = True
+        if cancel_deadline and self._deadline_task is not None:
+            self._deadline_task.cancel()
 
-            message_to_user = Message(
-                display_msg = f"Report is saved at path - {report_path}\n\n Here is the content:\n{report}",
-                hidden_content = {'initial_report': report, 'report_path': report_path}
-            )
-            log_msg(self, message_to_user)
-            await self.publish_message(Termination(reason="Report generated"), DefaultTopicId())
-            # await self.publish_message(message_to_user, topic_id=TopicId(user_agent_type, source=self.id.key))
+        if not self.summaries:
+            await self.publish_message(Termination(reason="No paper could be summarized"), DefaultTopicId())
+            return
 
+        report_progress(self._progress, 'generating_report', f'Writing the report from {len(self.summaries)} summaries')
+        content = f'Below are the summaries of {len(self.summaries)} papers:\n\n'
+        for title, summary in self.summaries:
+            content += f'Paper: {title}\n{summary}\n\n'
 
-        return None
+        try:
+            report = await self._stream_report(content, cancellation_token)
+        except Exception as e:
+            print(f"Failed to generate the report: {e}")
+            await self.publish_message(Termination(reason=f"Report generation failed: {e}"), DefaultTopicId())
+            return
+
+        report_path = self._report_path
+        with open(report_path, 'w') as f:
+            f.write(report)
+
+        message_to_user = Message(
+            display_msg = f"Report is saved at path - {report_path}\n\n Here is the content:\n{report}",
+            hidden_content = {'initial_report': report, 'report_path': report_path}
+        )
+        log_msg(self, message_to_user)
+        report_progress(self._progress, 'report_generated', 'Report generated', report_path=report_path)
+        await self.publish_message(Termination(reason="Report generated"), DefaultTopicId())
+        # await self.publish_message(message_to_user, topic_id=TopicId(user_agent_type, source=self.id.key))
+
+    async def _stream_report(self, content: str, cancellation_token: CancellationToken) -> str:
+        # Stream the synthesis so the report shows up while it is being written
+        report = ''
+        last_update = time.monotonic()
+        async for chunk in self._model_client.create_stream(
+            messages=[self._system_message, UserMessage(content=content, source=self.id.key)],
+            cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, str):
+                report += chunk
+                if time.monotonic() - last_update >= REPORT_STREAM_UPDATE_SECONDS:
+                    report_progress(self._progress, 'partial_report', None, partial_report=report)
+                    last_update = time.monotonic()
+            elif isinstance(chunk.content, str):
+                # The final result holds the complete text
+                report = chunk.content
+
+        if not report:
+            raise ValueError("The model returned an empty report")
+        return report
 
 
 @type_subscription(topic_type=user_agent_type)
@@ -699,19 +989,37 @@ from autogen_core import SingleThreadedAgentRuntime
 
 
 
-async def literature_review(user_query):
+async def literature_review(user_query, progress=None, job_id=None):
+    '''
+    Runs the multi-agent literature review pipeline
+    Args:
+        user_query: str: literature review topic
+        progress: optional callable(event_type, message, **data) receiving progress events
+        job_id: str: ID of the review, names its workspace (generated if not given)
+    Returns:
+        report_path: str: path of the generated report
+    '''
+    # Opportunistically free disk space of earlier reviews before starting a new one
+    await asyncio.to_thread(cleanup_workspaces)
+    with ResearchWorkspace(job_id) as workspace:
+        return await _run_literature_review(user_query, workspace, progress)
+
+
+async def _run_literature_review(user_query, workspace, progress):
     termination_handler = TerminationHandler()
     runtime = SingleThreadedAgentRuntime(intervention_handlers=[termination_handler])
+    model_client = get_model_client()
+    model_client_together = get_model_client_together()
     await SearchAgent.register(
-        runtime, type=search_topic_type, factory=lambda: SearchAgent(model_client=model_client)
+        runtime, type=search_topic_type, factory=lambda: SearchAgent(model_client=model_client, workspace=workspace, progress=progress)
     )
 
     await SummarizerAgent.register(
-        runtime, type=paper_summarizer, factory=lambda: SummarizerAgent(model_client=model_client_together)
+        runtime, type=paper_summarizer, factory=lambda: SummarizerAgent(model_client=model_client_together, progress=progress)
     )
 
     await ReportGeneratorAgent.register(
-        runtime, type=report_generator_type, factory=lambda: ReportGeneratorAgent(model_client=model_client_together)
+        runtime, type=report_generator_type, factory=lambda: ReportGeneratorAgent(model_client=model_client_together, report_path=workspace.report_path, progress=progress)
     )
 
     # await UserAgent.register(
@@ -733,9 +1041,19 @@ async def literature_review(user_query):
         topic_id=TopicId(search_topic_type, source="default"),
     )
 
-    await runtime.stop_when(lambda: termination_handler.has_terminated)
+    try:
+        await runtime.stop_when(lambda: termination_handler.has_terminated)
+    except asyncio.CancelledError:
+        # The job timed out or was cancelled, stop the agents still working
+        await runtime.stop()
+        raise
+
+    # Only a finished report counts as a result, partial runs return nothing
+    if termination_handler.termination_value.reason != "Report generated":
+        print(f"Literature review ended without a report: {termination_handler.termination_value.reason}")
+        return None
 
-    return os.path.join(PAPER_SAVE_DIR, "initial_report.md")
+    return workspace.report_path
 
 
 
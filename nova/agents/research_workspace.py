@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import uuid
+import shutil
+
+
+# Root folder under which every literature review gets its own workspace
+WORKSPACE_ROOT = os.getenv('RESEARCH_WORKSPACE_ROOT', os.path.join('papers', 'jobs'))
+# Maximum disk space a single review may use for downloaded papers and parsed data
+WORKSPACE_MAX_BYTES = int(os.getenv('RESEARCH_WORKSPACE_MAX_BYTES', str(500 * 1024 * 1024)))
+# Finished workspaces are kept this long before they are removed
+WORKSPACE_RETENTION_SECONDS = int(os.getenv('RESEARCH_WORKSPACE_RETENTION_SECONDS', '3600'))
+# Workspaces of reviews that never finished (e.g. the worker died) are removed after this long
+WORKSPACE_STALE_SECONDS = int(os.getenv('RESEARCH_WORKSPACE_STALE_SECONDS', str(24 * 3600)))
+# Disk budget for all workspaces together, the oldest finished ones are removed first
+WORKSPACES_MAX_TOTAL_BYTES = int(os.getenv('RESEARCH_WORKSPACES_MAX_TOTAL_BYTES', str(5 * 1024 * 1024 * 1024)))
+
+DONE_MARKER = '.done'
+SAFE_JOB_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def sanitize_title(title: str) -> str:
+    '''
+    Turns a paper title into a safe directory name
+    Args:
+        title: str: paper title
+    Returns:
+        name: str: alphanumeric/underscore only name
+    '''
+    # Keep alphanumeric, underscore, hyphen. Replace others with underscore.
+    name = re.sub(r'[^a-zA-Z0-9_]', '_', title)
+    # Replace multiple consecutive underscores with a single one
+    name = re.sub(r'_+', '_', name)
+    # Remove leading/trailing underscores
+    return name.strip('_')[:150] or 'untitled'
+
+
+def get_dir_size(path: str) -> int:
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total += os.path.getsize(os.path.join(dir_path, file_name))
+            except OSError:
+                continue
+    return total
+
+
+class ResearchWorkspace:
+    '''
+    Private directory of a single literature review, so that concurrent reviews
+    never read or overwrite each other's papers, summaries and reports.
+
+    Layout: <root>/<job_id>/{papers/<title>/..., initial_report.md, .done}
+    '''
+
+    def __init__(self, job_id: str = None, root: str = None, max_bytes: int = None):
+        '''
+        Args:
+            job_id: str: ID of the review (a new one is generated if not given)
+            root: str: folder holding all workspaces
+            max_bytes: int: disk quota of this workspace
+        '''
+        self.job_id = job_id or uuid.uuid4().hex
+        if not SAFE_JOB_ID_PATTERN.match(self.job_id):
+            raise ValueError(f"Invalid job ID: {self.job_id}")
+        self.root = root or WORKSPACE_ROOT
+        self.max_bytes = WORKSPACE_MAX_BYTES if max_bytes is None else max_bytes
+        self.path = os.path.join(self.root, self.job_id)
+        self.papers_dir = os.path.join(self.path, 'papers')
+        self.report_path = os.path.join(self.path, 'initial_report.md')
+        os.makedirs(self.papers_dir, exist_ok=True)
+
+    def paper_folder(self, title: str) -> str:
+        '''
+        Creates (if needed) and returns the folder for a paper of this review
+        Args:
+            title: str: paper title
+        Returns:
+            paper_folder: str: path of the folder
+        '''
+        paper_folder = os.path.join(self.papers_dir, sanitize_title(title))
+        os.makedirs(paper_folder, exist_ok=True)
+        return paper_folder
+
+    def used_bytes(self) -> int:
+        return get_dir_size(self.path)
+
+    def has_capacity(self) -> bool:
+        '''Whether the workspace is still below its disk quota'''
+        return self.used_bytes() < self.max_bytes
+
+    def close(self):
+        '''Marks the review as finished, making the workspace eligible for cleanup'''
+        try:
+            with open(os.path.join(self.path, DONE_MARKER), 'w') as f:
+                f.write(str(time.time()))
+        except OSError as e:
+            print(f"Failed to mark workspace {self.path} as finished: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def cleanup_workspaces(root: str = None, retention_seconds: int = None, stale_seconds: int = None,
+                       max_total_bytes: int = None) -> int:
+    '''
+    Removes expired workspaces and enforces the total disk budget
+    Args:
+        root: str: folder holding all workspaces
+        retention_seconds: int: age after which finished workspaces are removed
+        stale_seconds: int: age after which unfinished workspaces are removed
+        max_total_bytes: int: disk budget for all workspaces together
+    Returns:
+        removed: int: number of removed workspaces
+    '''
+    root = root or WORKSPACE_ROOT
+    retention_seconds = WORKSPACE_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+    stale_seconds = WORKSPACE_STALE_SECONDS if stale_seconds is None else stale_seconds
+    max_total_bytes = WORKSPACES_MAX_TOTAL_BYTES if max_total_bytes is None else max_total_bytes
+
+    if not os.path.isdir(root):
+        return 0
+
+    now = time.time()
+    removed = 0
+    finished = []
+    total_bytes = 0
+
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        marker = os.path.join(path, DONE_MARKER)
+        try:
+            if os.path.exists(marker):
+                age = now - os.path.getmtime(marker)
+                if age > retention_seconds:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+                    continue
+                size = get_dir_size(path)
+                finished.append((os.path.getmtime(marker), path, size))
+            else:
+                if now - os.path.getmtime(path) > stale_seconds:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+                    continue
+                size = get_dir_size(path)
+        except OSError:
+            continue
+        total_bytes += size
+
+    # Over budget: remove the oldest finished workspaces, running reviews are never touched
+    for _, path, size in sorted(finished):
+        if total_bytes <= max_total_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_bytes -= size
+        removed += 1
+
+    if removed:
+        print(f"Removed {removed} literature review workspaces")
+    return removed
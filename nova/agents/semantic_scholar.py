@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+
+import requests
+
+
+SEMANTIC_SCHOLAR_API_URL = os.getenv('SEMANTIC_SCHOLAR_API_URL', 'https://api.semanticscholar.org/graph/v1')
+# Optional, raises the rate limit granted by Semantic Scholar
+SEMANTIC_SCHOLAR_API_KEY = os.getenv('SEMANTIC_SCHOLAR_API_KEY')
+# Requests per second allowed for the whole process (shared by all reviews)
+SEMANTIC_SCHOLAR_RATE_PER_SECOND = float(os.getenv('SEMANTIC_SCHOLAR_RATE_PER_SECOND', '1'))
+SEMANTIC_SCHOLAR_BURST = int(os.getenv('SEMANTIC_SCHOLAR_BURST', '1'))
+SEMANTIC_SCHOLAR_CACHE_DIR = os.getenv('SEMANTIC_SCHOLAR_CACHE_DIR', os.path.join('papers', 'semantic_scholar_cache'))
+SEMANTIC_SCHOLAR_CACHE_TTL_SECONDS = int(os.getenv('SEMANTIC_SCHOLAR_CACHE_TTL_SECONDS', str(24 * 3600)))
+SEMANTIC_SCHOLAR_MAX_RETRIES = 5
+SEMANTIC_SCHOLAR_TIMEOUT_SECONDS = 30
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+SEARCH_FIELDS = 'paperId,title,year,abstract,isOpenAccess,openAccessPdf'
+
+
+class TokenBucket:
+    '''
+    Thread safe token bucket. Callers reserve a token and wait until it is due,
+    so concurrent callers (threads or coroutines) are spaced out instead of
+    bursting. A 429 response pauses the bucket for everybody.
+    '''
+
+    def __init__(self, rate: float, capacity: int = 1):
+        '''
+        Args:
+            rate: float: tokens added per second
+            capacity: int: maximum burst size
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        '''
+        Reserves a token
+        Returns:
+            delay: float: seconds to wait before the token may be used
+        '''
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            # Tokens may go negative, each further caller waits one interval longer
+            self._tokens -= 1
+            delay = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(delay, self._paused_until - now)
+
+    def pause(self, seconds: float):
+        '''Stops handing out tokens for the given number of seconds (e.g. after a 429)'''
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ResponseCache:
+    '''On-disk cache of API responses, one JSON file per request'''
+
+    def __init__(self, cache_dir: str, ttl_seconds: int):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    @staticmethod
+    def make_key(url: str, params: dict) -> str:
+        payload = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('stored_at', 0) > self.ttl_seconds:
+            return None
+        return entry.get('data')
+
+    def put(self, key: str, data):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'stored_at': time.time(), 'data': data}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Failed to cache Semantic Scholar response: {e}")
+
+
+class SemanticScholarError(Exception):
+    pass
+
+
+def get_retry_after(response) -> float:
+    '''Reads the Retry-After header (in seconds) of a response, None if absent or not numeric'''
+    value = response.headers.get('Retry-After')
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class SemanticScholarClient:
+    '''
+    Async client for the Semantic Scholar Graph API.
+
+    Blocking HTTP calls run in a worker thread so the event loop of the agents is
+    never blocked; requests are rate limited by a shared token bucket, retried with
+    exponential backoff (honouring Retry-After) and cached on disk.
+    '''
+
+    def __init__(self, base_url: str = None, api_key: str = None, rate_limiter: TokenBucket = None,
+                 cache: ResponseCache = None, max_retries: int = SEMANTIC_SCHOLAR_MAX_RETRIES,
+                 timeout: float = SEMANTIC_SCHOLAR_TIMEOUT_SECONDS, session: requests.Session = None):
+        '''
+        Args:
+            base_url: str: API base URL (e.g. a local mock server)
+            api_key: str: optional Semantic Scholar API key
+            rate_limiter: TokenBucket: limiter shared by all requests
+            cache: ResponseCache: response cache, None disables caching
+            max_retries: int: retries on 429 and 5xx responses
+            timeout: float: request timeout in seconds
+            session: requests.Session: session used for the requests
+        '''
+        self.base_url = (base_url or SEMANTIC_SCHOLAR_API_URL).rstrip('/')
+        self.api_key = api_key if api_key is not None else SEMANTIC_SCHOLAR_API_KEY
+        self.rate_limiter = rate_limiter or TokenBucket(SEMANTIC_SCHOLAR_RATE_PER_SECOND, SEMANTIC_SCHOLAR_BURST)
+        self.cache = cache
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(BACKOFF_BASE_SECONDS * (2 ** attempt), BACKOFF_MAX_SECONDS)
+        # Jitter keeps concurrent reviews from retrying in lockstep
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def get(self, path: str, params: dict = None):
+        '''
+        Sends a GET request to the API
+        Args:
+            path: str: endpoint path, e.g. '/paper/search'
+            params: dict: query parameters (URL-encoded by requests)
+        Returns:
+            data: the decoded JSON response
+        '''
+        url = f"{self.base_url}{path}"
+        cache_key = ResponseCache.make_key(url, params)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                return cached
+
+        headers = {'x-api-key': self.api_key} if self.api_key else {}
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire_async()
+            try:
+                response = await asyncio.to_thread(self.session.get, url, params=params, headers=headers,
+                                                   timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt == self.max_retries:
+                    raise SemanticScholarError(f"Semantic Scholar request failed: {e}") from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 200:
+                data = response.json()
+                if self.cache is not None:
+                    await asyncio.to_thread(self.cache.put, cache_key, data)
+                return data
+
+            if response.status_code != 429 and response.status_code < 500:
+                raise SemanticScholarError(f"Semantic Scholar API error: {response.status_code}")
+            if attempt == self.max_retries:
+                break
+
+            delay = get_retry_after(response)
+            if delay is None:
+                delay = self._backoff(attempt)
+            if response.status_code == 429:
+                # Everybody sharing the limiter backs off, not just this request
+                self.rate_limiter.pause(delay)
+            print(f"Semantic Scholar API returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        raise SemanticScholarError("Semantic Scholar API rate limit exceeded")
+
+    async def search_papers(self, query: str, limit: int, fields: str = SEARCH_FIELDS):
+        '''
+        Searches for open access papers
+        Args:
+            query: str: search query
+            limit: int: maximum number of results
+            fields: str: comma separated paper fields to return
+        Returns:
+            papers: list of paper dictionaries
+        '''
+        params = {'query': query, 'openAccessPdf': '', 'limit': limit, 'fields': fields}
+        data = await self.get('/paper/search', params=params)
+        return data.get('data', []) or []
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_semantic_scholar_client() -> SemanticScholarClient:
+    '''Returns the process wide client, so all reviews share one rate limiter and cache'''
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SemanticScholarClient(
+                cache=ResponseCache(SEMANTIC_SCHOLAR_CACHE_DIR, SEMANTIC_SCHOLAR_CACHE_TTL_SECONDS)
+            )
+    return _client
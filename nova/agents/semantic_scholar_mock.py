@@ -0,0 +1,149 @@
+'''
+Local stand-in for the Semantic Scholar Graph API, for exercising the research
+pipeline without network access or rate limits.
+
+Run it with `python -m agents.semantic_scholar_mock --port 8765` and point
+SEMANTIC_SCHOLAR_API_URL at http://127.0.0.1:8765/graph/v1, or start it from
+Python with MockSemanticScholarServer.
+'''
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def make_paper(index: int, query: str, pdf_base_url: str = None):
+    paper_id = f"mock{index:04d}"
+    return {
+        'paperId': paper_id,
+        'title': f"{query.title()} Study {index}",
+        'year': 2020 + index % 5,
+        'abstract': f"A mock paper about {query}.",
+        'isOpenAccess': True,
+        'openAccessPdf': {'url': f"{pdf_base_url or ''}/pdf/{paper_id}.pdf"},
+    }
+
+
+# Smallest well-formed PDF, enough for download validation
+MOCK_PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+            b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n")
+
+
+class MockSemanticScholarServer:
+    '''
+    Serves /graph/v1/paper/search and /pdf/<id>.pdf from a background thread.
+
+    Failures can be injected to exercise retry logic: the first `rate_limit_first`
+    search requests get a 429 with a Retry-After header. All received requests are
+    recorded in `requests`.
+    '''
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, papers=None, rate_limit_first: int = 0,
+                 retry_after: float = 1):
+        '''
+        Args:
+            host: str: interface to bind
+            port: int: port to bind (0 picks a free port)
+            papers: list: fixed search results (generated from the query if None)
+            rate_limit_first: int: number of search requests answered with 429
+            retry_after: float: Retry-After value sent with the 429 responses
+        '''
+        self.papers = papers
+        self.rate_limit_first = rate_limit_first
+        self.retry_after = retry_after
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        '''Value for SEMANTIC_SCHOLAR_API_URL'''
+        return f"{self.url}/graph/v1"
+
+    def _make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(parsed.query, keep_blank_values=True).items()}
+                with mock._lock:
+                    mock.requests.append({'path': parsed.path, 'params': params})
+                    request_number = len(mock.requests)
+
+                if parsed.path == '/graph/v1/paper/search':
+                    if request_number <= mock.rate_limit_first:
+                        self._send_json(429, {'message': 'Too Many Requests'}, {'Retry-After': str(mock.retry_after)})
+                        return
+                    query = params.get('query', '')
+                    limit = int(params.get('limit', 10))
+                    papers = mock.papers if mock.papers is not None else [make_paper(i, query, mock.url) for i in range(limit)]
+                    self._send_json(200, {'total': len(papers), 'offset': 0, 'data': papers[:limit]})
+                elif parsed.path.startswith('/pdf/'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/pdf')
+                    self.send_header('Content-Length', str(len(MOCK_PDF)))
+                    self.end_headers()
+                    self.wfile.write(MOCK_PDF)
+                else:
+                    self._send_json(404, {'error': 'Not found'})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='semantic-scholar-mock', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        '''Serves in the calling thread until interrupted'''
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Run a mock Semantic Scholar API")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--rate-limit-first', type=int, default=0, help="Answer the first N searches with 429")
+    args = arg_parser.parse_args()
+
+    server = MockSemanticScholarServer(args.host, args.port, rate_limit_first=args.rate_limit_first)
+    print(f"Mock Semantic Scholar API listening on {server.api_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
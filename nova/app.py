@@ -1,10 +1,10 @@
 import os
 import uuid
 import json
-import base64
-import tempfile
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash, send_file, Response
+import atexit
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, jsonify, session, flash, send_file, Response
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import os.path
 import datetime
@@ -14,14 +14,21 @@ from bson import ObjectId, errors
 from werkzeug.utils import secure_filename
 
 # Import our utility modules
-from document_processor import extract_document_text, prepare_document_for_indexing, extract_text_from_pdf
-from search_utils import AzureSearchClient, get_relevant_context
+# (search_utils, timetable_agent and agents.quiz_agent pull in the Azure and
+# calendar SDKs, they are imported by their service factories to keep worker startup fast)
+from document_processor import extract_document_text, prepare_document_for_indexing, decode_base64_content, extract_text_from_buffer
+from document_digest import build_digest, FALLBACK_MAX_DOCUMENTS, FALLBACK_MAX_DIGEST_BUILDS, FALLBACK_MAX_CONTEXT_CHARS
+from subject_digest import fold_in_document, fold_out_document, sync_subject_digest, format_subject_digest
 from mongodb_utils import MongoDBClient
+from response_cache import ResponseCache, context_fingerprint
+from search_cache import SearchResultCache
+from prompt_builder import PromptSection, build_messages
+from attachment_store import AttachmentStore
 from journal_utils import JournalExtractor
 from motivational_utils import motivational , get_values
-from timetable_agent import TimetableAgentSystem
-from agents.research_agent import run_lit_review
-from agents.quiz_agent import QuizGenerator
+from research_jobs import ResearchJobManager
+from services import ServiceContainer
+from health import health_bp
 from models import User
 from auth import auth_bp
 
@@ -29,35 +36,141 @@ from auth import auth_bp
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config.from_pyfile('config.py')
-
-# Configure session
-app.secret_key = app.config['SECRET_KEY']
-# Configure URL handling - this ensures routes work with or without trailing slashes
-app.url_map.strict_slashes = False
-
-# Initialize Flask-Login
+# Initialize Flask-Login (bound to the app by create_app)
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'  # Set the login view
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'error'
 
-# Register the auth blueprint
-app.register_blueprint(auth_bp, url_prefix='/auth')
+# The app's pages and API, registered on every app built by create_app
+main_bp = Blueprint('main', __name__)
+
+def create_http_session(config):
+    """Create the pooled HTTP session used for Azure OpenAI requests"""
+    http_session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config['HTTP_POOL_MAXSIZE'])
+    http_session.mount('https://', adapter)
+    http_session.mount('http://', adapter)
+    return http_session
+
+def prime_http_session(http_session, config):
+    """Open a connection to Azure OpenAI so the first chat request skips the TCP/TLS handshake"""
+    if not config.get('AZURE_OPENAI_ENDPOINT'):
+        return True
+    # Any HTTP response means the connection is up and back in the pool
+    http_session.head(config['AZURE_OPENAI_ENDPOINT'], timeout=config['HTTP_PRIME_TIMEOUT_SECONDS'])
+    return True
+
+def register_services(services, config):
+    """
+    Register the app's lazily created services
+
+    Args:
+        services: ServiceContainer to register the services with
+        config: Flask config the services are built from
+    """
+    def create_search_client():
+        from search_utils import AzureSearchClient
+        return AzureSearchClient(endpoint=config['AZURE_SEARCH_ENDPOINT'], api_key=config['AZURE_SEARCH_API_KEY'], index_name=config['AZURE_SEARCH_INDEX_NAME'],
+                                 failure_threshold=config['AZURE_SEARCH_CIRCUIT_FAILURE_THRESHOLD'],
+                                 reset_timeout_seconds=config['AZURE_SEARCH_CIRCUIT_RESET_SECONDS'],
+                                 upload_concurrency=config['AZURE_SEARCH_UPLOAD_CONCURRENCY'],
+                                 upload_batch_bytes=config['AZURE_SEARCH_UPLOAD_BATCH_BYTES'])
+
+    def create_mongodb_client():
+        client = MongoDBClient(uri=config['MONGODB_URI'], db_name=config['MONGODB_DB_NAME'])
+        # Try to establish connection
+        client.connect()
+        return client
+
+    def create_timetable_agent_system():
+        from timetable_agent import TimetableAgentSystem
+        return TimetableAgentSystem(openai_endpoint=config['AZURE_OPENAI_ENDPOINT'], openai_api_key=config['AZURE_OPENAI_API_KEY'], openai_api_version=config['AZURE_OPENAI_API_VERSION'], openai_deployment=config['AZURE_OPENAI_CHAT_DEPLOYMENT'], document_intelligence_endpoint=config.get('AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT'), document_intelligence_key=config.get('AZURE_DOCUMENT_INTELLIGENCE_KEY'))
+
+    def create_quiz_generator():
+        from agents.quiz_agent import QuizGenerator
+        return QuizGenerator(
+            openai_endpoint=config['AZURE_OPENAI_ENDPOINT'],
+            openai_api_key=config['AZURE_OPENAI_API_KEY'],
+            openai_api_version=config['AZURE_OPENAI_API_VERSION'],
+            openai_deployment=config['AZURE_OPENAI_CHAT_DEPLOYMENT']
+        )
+
+    def create_response_cache():
+        return ResponseCache(
+            ttl_seconds=config['RESPONSE_CACHE_TTL_SECONDS'],
+            similarity_threshold=config['RESPONSE_CACHE_SIMILARITY_THRESHOLD'],
+            max_entries_per_subject=config['RESPONSE_CACHE_MAX_ENTRIES_PER_SUBJECT']
+        )
+
+    def create_attachment_store():
+        return AttachmentStore(
+            root_folder=config['ATTACHMENT_FOLDER'],
+            ttl_seconds=config['ATTACHMENT_TTL_SECONDS'],
+            max_attachments_per_session=config['ATTACHMENT_MAX_PER_SESSION']
+        )
+
+    def create_research_job_manager():
+        return ResearchJobManager(
+            jobs_folder=config['RESEARCH_JOBS_FOLDER'],
+            max_concurrent_jobs=config['RESEARCH_MAX_CONCURRENT_JOBS'],
+            job_timeout_seconds=config['RESEARCH_JOB_TIMEOUT_SECONDS'],
+            job_retention_seconds=config['RESEARCH_JOB_RETENTION_SECONDS']
+        )
+
+    # Logins and subjects need MongoDB, search falls back to MongoDB when Azure AI Search is down
+    services.register('mongodb', create_mongodb_client, close=lambda client: client.close(),
+                      check=lambda client: client.ping(), required=True)
+    services.register('search', create_search_client, check=lambda client: client.is_available)
+    services.register('http', lambda: create_http_session(config), close=lambda http_session: http_session.close(),
+                      check=lambda http_session: prime_http_session(http_session, config))
+    services.register('timetable', create_timetable_agent_system)
+    services.register('quiz', create_quiz_generator)
+    services.register('response_cache', create_response_cache)
+    services.register('search_cache', lambda: SearchResultCache(ttl_seconds=config['SEARCH_CACHE_TTL_SECONDS'],
+                                                                max_entries=config['SEARCH_CACHE_MAX_ENTRIES']))
+    services.register('attachments', create_attachment_store)
+    services.register('research_jobs', create_research_job_manager)
+
+def create_app(config_filename='config.py'):
+    """
+    Create and configure the Flask application
+
+    Services are created on first use; call services.start_warm_up() (done by
+    gunicorn's post_fork hook) to create them before traffic arrives.
+
+    Args:
+        config_filename: Config file, relative to the app's root path
+
+    Returns:
+        The Flask application, with its ServiceContainer in app.extensions['services']
+    """
+    flask_app = Flask(__name__)
+    flask_app.config.from_pyfile(config_filename)
+
+    # Configure session
+    flask_app.secret_key = flask_app.config['SECRET_KEY']
+    # Configure URL handling - this ensures routes work with or without trailing slashes
+    flask_app.url_map.strict_slashes = False
+
+    login_manager.init_app(flask_app)
+
+    # Register the pages, auth and health check blueprints
+    flask_app.register_blueprint(main_bp)
+    flask_app.register_blueprint(auth_bp, url_prefix='/auth')
+    flask_app.register_blueprint(health_bp)
 
-# Ensure the upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Ensure the upload directory exists
+    os.makedirs(flask_app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Initialize Azure Search client (lazy initialization)
-search_client = None
-# Initialize MongoDB client (lazy initialization)
-mongodb_client = None
-# Initialize Timetable Agent System (lazy initialization)
-timetable_agent_system = None
-# Initialize Quiz Generator (lazy initialization)
-quiz_generator = None
+    services = ServiceContainer()
+    register_services(services, flask_app.config)
+    flask_app.extensions['services'] = services
+    # Make get_mongodb_client accessible from other modules via current_app.config
+    flask_app.config['get_mongodb_client'] = lambda: services.get('mongodb')
+    # Connections are closed when the worker exits, not after every request
+    atexit.register(services.close)
+    return flask_app
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -65,47 +178,61 @@ def load_user(user_id):
     mongo_client = get_mongodb_client()
     return User.get(user_id, mongo_client)
 
+def get_services():
+    """Get the service container of the current app"""
+    return current_app.extensions['services']
+
 def get_search_client():
     """Get or initialize the Azure Search client"""
-    global search_client
-    if (search_client is None):
-        search_client = AzureSearchClient(endpoint=app.config['AZURE_SEARCH_ENDPOINT'], api_key=app.config['AZURE_SEARCH_API_KEY'], index_name=app.config['AZURE_SEARCH_INDEX_NAME'])
-    return search_client
+    return get_services().get('search')
 
 def get_mongodb_client():
     """Get or initialize the MongoDB client"""
-    global mongodb_client
-    if (mongodb_client is None):
-        mongodb_client = MongoDBClient(uri=app.config['MONGODB_URI'], db_name=app.config['MONGODB_DB_NAME'])
-        # Try to establish connection
-        mongodb_client.connect()
-    return mongodb_client
+    return get_services().get('mongodb')
 
-# Make get_mongodb_client accessible from other modules via app.config
-app.config['get_mongodb_client'] = get_mongodb_client
+def get_http_session():
+    """Get or initialize the pooled HTTP session for Azure OpenAI requests"""
+    return get_services().get('http')
 
 def get_timetable_agent_system():
     """Get or initialize the Timetable Agent System"""
-    global timetable_agent_system
-    if (timetable_agent_system is None):
-        timetable_agent_system = TimetableAgentSystem(openai_endpoint=app.config['AZURE_OPENAI_ENDPOINT'], openai_api_key=app.config['AZURE_OPENAI_API_KEY'], openai_api_version=app.config['AZURE_OPENAI_API_VERSION'], openai_deployment=app.config['AZURE_OPENAI_CHAT_DEPLOYMENT'], document_intelligence_endpoint=app.config.get('AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT'), document_intelligence_key=app.config.get('AZURE_DOCUMENT_INTELLIGENCE_KEY'))
-    return timetable_agent_system
+    return get_services().get('timetable')
 
 def get_quiz_generator():
     """Get or initialize the Quiz Generator"""
-    global quiz_generator
-    if (quiz_generator is None):
-        quiz_generator = QuizGenerator(
-            openai_endpoint=app.config['AZURE_OPENAI_ENDPOINT'],
-            openai_api_key=app.config['AZURE_OPENAI_API_KEY'],
-            openai_api_version=app.config['AZURE_OPENAI_API_VERSION'],
-            openai_deployment=app.config['AZURE_OPENAI_CHAT_DEPLOYMENT']
-        )
-    return quiz_generator
+    return get_services().get('quiz')
+
+def get_response_cache():
+    """Get or initialize the subject chat response cache (None when disabled)"""
+    if not current_app.config.get('RESPONSE_CACHE_ENABLED'):
+        return None
+    return get_services().get('response_cache')
+
+def get_search_cache():
+    """Get or initialize the search result cache (None when disabled)"""
+    if not current_app.config.get('SEARCH_CACHE_ENABLED'):
+        return None
+    return get_services().get('search_cache')
+
+def get_attachment_store():
+    """Get or initialize the general chat attachment store"""
+    return get_services().get('attachments')
+
+def get_research_job_manager():
+    """Get or initialize the literature review job manager"""
+    return get_services().get('research_jobs')
+
+def invalidate_subject_caches(subject_id, mongo_client):
+    """Invalidate caches derived from a subject's documents after they change"""
+    # Bumping the version in MongoDB invalidates cached entries in every worker
+    mongo_client.bump_subject_documents_version(subject_id)
+    for cache in (get_response_cache(), get_search_cache()):
+        if cache is not None:
+            cache.invalidate_subject(subject_id)
 
 # Helper function to check if a file has an allowed extension
 def allowed_file(filename):
-    return ('.' in filename) and (filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS'])
+    return ('.' in filename) and (filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS'])
 
 # Helper function to get or create a session ID
 def get_session_id():
@@ -113,6 +240,42 @@ def get_session_id():
         session['session_id'] = str(uuid.uuid4())
     return session['session_id']
 
+def extract_file_context(file_source, file_type, file_name, content_hash=None):
+    """
+    Extract the content of a chat attachment as context for the AI
+
+    Args:
+        file_source: File content as a path, bytes or a binary stream
+        file_type: MIME type of the file
+        file_name: Name of the file
+        content_hash: SHA-256 hex digest of the content if already known
+
+    Returns:
+        Extracted text from the file or a message if extraction is not possible
+    """
+    # For PDFs, extract in memory; re-attached files are served from the extraction cache
+    if file_type == 'application/pdf' or file_name.lower().endswith('.pdf'):
+        pdf_name = file_name if file_name.lower().endswith('.pdf') else f"{file_name}.pdf"
+        text_content = extract_text_from_buffer(file_source, pdf_name, content_hash=content_hash)
+
+        # If we got text content, return it
+        if text_content and not text_content.startswith("Error"):
+            return f"Content extracted from PDF '{file_name}':\n\n{text_content}"
+        else:
+            return f"The PDF file '{file_name}' could not be processed properly. Please provide specific questions about it."
+
+    # For text files
+    elif file_type.startswith('text/'):
+        if isinstance(file_source, (str, os.PathLike)):
+            with open(file_source, 'rb') as f:
+                return f.read().decode('utf-8', errors='replace')
+        file_source.seek(0)
+        return file_source.read().decode('utf-8', errors='replace')
+
+    # For other file types
+    else:
+        return f"The file '{file_name}' of type '{file_type}' was uploaded but cannot be processed directly. Please provide specific questions about it."
+
 def process_base64_file(base64_data, file_type, file_name):
     """
     Process a base64-encoded file and extract its content
@@ -126,52 +289,50 @@ def process_base64_file(base64_data, file_type, file_name):
         Extracted text from the file or a message if extraction is not possible
     """
     try:
-        # Remove the data URI prefix if present
-        if base64_data.startswith('data:'):
-            # Extract the base64 part after the comma
-            base64_data = base64_data.split(',', 1)[1]
-
-        # Decode the base64 data
-        file_data = base64.b64decode(base64_data)
-
-        # For PDFs, use our existing PDF extraction functionality
-        if file_type == 'application/pdf' or file_name.lower().endswith('.pdf'):
-            # We need to write the PDF to a temporary file to use pdfplumber
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(file_data)
-                temp_path = temp_file.name
-
-            # Extract text from the PDF
-            text_content = extract_text_from_pdf(temp_path)
-
-            # Remove the temporary file
-            os.unlink(temp_path)
-
-            # If we got text content, return it
-            if text_content and not text_content.startswith("Error"):
-                return f"Content extracted from PDF '{file_name}':\n\n{text_content}"
-            else:
-                return f"The PDF file '{file_name}' could not be processed properly. Please provide specific questions about it."
-
-        # For text files
-        elif file_type.startswith('text/'):
-            return file_data.decode('utf-8', errors='replace')
-
-        # For other file types
-        else:
-            return f"The file '{file_name}' of type '{file_type}' was uploaded but cannot be processed directly. Please provide specific questions about it."
+        # Decode the base64 data (and data URI prefix) straight into an in-memory buffer
+        file_buffer, content_hash = decode_base64_content(base64_data)
+        return extract_file_context(file_buffer, file_type, file_name, content_hash=content_hash)
 
     except Exception as e:
         logger.error(f"Error processing file {file_name}: {str(e)}")
         return f"Error processing file {file_name}: {str(e)}"
 
+def get_attachment_context(session_id, attachment_id):
+    """
+    Get the extracted content of a stored chat attachment, extracting it on first use
+
+    Args:
+        session_id: ID of the session the attachment belongs to
+        attachment_id: ID of the attachment
+
+    Returns:
+        Tuple of (file name, extracted context) or (None, None) if the attachment does not exist
+    """
+    store = get_attachment_store()
+    metadata = store.get_metadata(session_id, attachment_id)
+    if metadata is None:
+        return None, None
+
+    # Extracted text is cached next to the file, so later messages skip extraction
+    file_context = store.get_extracted_text(session_id, attachment_id)
+    if file_context is None:
+        file_path = store.get_file_path(session_id, attachment_id)
+        try:
+            with open(file_path, 'rb') as f:
+                file_context = extract_file_context(f, metadata['type'], metadata['name'])
+            store.set_extracted_text(session_id, attachment_id, file_context)
+        except Exception as e:
+            logger.error(f"Error processing attachment {metadata['name']}: {str(e)}")
+            file_context = f"Error processing file {metadata['name']}: {str(e)}"
+    return metadata['name'], file_context
+
 # Routes
-@app.route('/')
+@main_bp.route('/')
 def index():
     """Render the general chat page (front page)"""
     return render_template('index.html')
 
-@app.route('/api/chat/general', methods=['POST'])
+@main_bp.route('/api/chat/general', methods=['POST'])
 def general_chat():
     """API endpoint for the general chat functionality"""
     try:
@@ -185,7 +346,16 @@ def general_chat():
         file_data = request.json.get('file')
         file_context = ""
 
-        if file_data and isinstance(file_data, dict):
+        # Files uploaded through the attachment API are referenced by ID
+        attachment_id = request.json.get('attachment_id')
+        if attachment_id:
+            file_name, file_context = get_attachment_context(session_id, attachment_id)
+            if file_name is None:
+                return jsonify({"error": "Attachment not found"}), 404
+            logger.info(f"Using stored attachment {attachment_id} ({file_name})")
+            user_message += f"\n\nI've uploaded a file named '{file_name}' for context. Please consider it when responding."
+
+        elif file_data and isinstance(file_data, dict):
             file_name = file_data.get('name', 'uploaded file')
             file_content = file_data.get('content', '')
             file_type = file_data.get('type', '')
@@ -210,21 +380,25 @@ def general_chat():
         subject_journal_entries = mongo_client.get_all_subject_journal_entries(session_id=session_id, user_id=user_id)
         subject_memory_context = JournalExtractor.get_memory_context(subject_journal_entries, max_entries=10)
 
-        # Combine all contexts
-        combined_context = ""
-
-        # Add file context first if available with strong emphasis
+        # Build the prompt context sections, the uploaded file first with strong emphasis
+        sections = []
         if file_context:
-            combined_context += "### UPLOADED FILE CONTEXT - IMPORTANT ###\n" + file_context + "\n\n"
+            sections.append(PromptSection('UPLOADED FILE CONTEXT', file_context, priority=0,
+                                          max_tokens=current_app.config['PROMPT_FILE_CONTEXT_MAX_TOKENS'], strategy='head_tail'))
 
         # Add memory contexts
+        memory_context = ""
         if user_memory_context:
-            combined_context += "User's General Memory:\n" + user_memory_context + "\n\n"
+            memory_context += "User's General Memory:\n" + user_memory_context + "\n\n"
         if subject_memory_context:
-            combined_context += "User's Subject-Specific Memory:\n" + subject_memory_context
+            memory_context += "User's Subject-Specific Memory:\n" + subject_memory_context
+        if memory_context:
+            title = 'Additional context information' if file_context else 'Context information'
+            sections.append(PromptSection(title, memory_context, priority=1,
+                                          max_tokens=current_app.config['PROMPT_MEMORY_MAX_TOKENS']))
 
         # Call Azure OpenAI API with combined memory context
-        response = call_azure_openai(user_message, combined_context, is_subject_chat=False, has_file_context=(file_context != ""))
+        response = call_azure_openai(user_message, sections, is_subject_chat=False, has_file_context=(file_context != ""))
 
         # Extract and save important information from the user's message
         extracted_info = JournalExtractor.extract_important_information(user_message)
@@ -251,19 +425,59 @@ def general_chat():
         logger.error(f"Error in general chat: {str(e)}")
         return jsonify({"error": "An error occurred processing your request"}), 500
 
-def call_azure_openai(user_message, context=None, is_subject_chat=False, has_file_context=False):
-    """Call Azure OpenAI API with user message and optional context"""
+@main_bp.route('/api/chat/attachments', methods=['POST'])
+def upload_chat_attachment():
+    """API endpoint for uploading a general chat attachment once and referencing it by ID"""
     try:
-        endpoint = app.config['AZURE_OPENAI_ENDPOINT']
-        api_key = app.config['AZURE_OPENAI_API_KEY']
-        api_version = app.config['AZURE_OPENAI_API_VERSION']
-        deployment = app.config['AZURE_OPENAI_CHAT_DEPLOYMENT']
+        session_id = get_session_id()
+
+        if 'file' not in request.files or request.files['file'].filename == '':
+            return jsonify({"error": "No file provided"}), 400
+
+        file = request.files['file']
+        file_name = secure_filename(file.filename) or 'uploaded file'
+        file_type = file.mimetype or ''
+
+        metadata = get_attachment_store().save(session_id, file, file_name, file_type)
+
+        # Extract right away so the first chat message does not wait for it
+        get_attachment_context(session_id, metadata['id'])
+
+        return jsonify({"success": True, "attachment": {k: metadata[k] for k in ('id', 'name', 'type', 'size')}}), 201
+    except Exception as e:
+        logger.error(f"Error uploading chat attachment: {str(e)}")
+        return jsonify({"error": "An error occurred uploading the attachment"}), 500
+
+@main_bp.route('/api/chat/attachments/<attachment_id>', methods=['DELETE'])
+def delete_chat_attachment(attachment_id):
+    """API endpoint for removing a general chat attachment"""
+    session_id = get_session_id()
+    if not get_attachment_store().delete(session_id, attachment_id):
+        return jsonify({"error": "Attachment not found"}), 404
+    return jsonify({"success": True})
+
+def call_azure_openai(user_message, sections=None, is_subject_chat=False, has_file_context=False):
+    """
+    Call Azure OpenAI API with user message and optional context
+
+    Args:
+        user_message: The user's message
+        sections: Optional list of PromptSection objects with the context for the request
+        is_subject_chat: Whether the message comes from a subject-specific chat
+        has_file_context: Whether the context includes an uploaded file
+    """
+    try:
+        endpoint = current_app.config['AZURE_OPENAI_ENDPOINT']
+        api_key = current_app.config['AZURE_OPENAI_API_KEY']
+        api_version = current_app.config['AZURE_OPENAI_API_VERSION']
+        deployment = current_app.config['AZURE_OPENAI_CHAT_DEPLOYMENT']
         # Build API URL
         url = f"{endpoint}/openai/deployments/{deployment}/chat/completions?api-version={api_version}"
-        # Prepare the request payload
-        messages = [{'role': 'user', 'content': user_message}]
+        sections = [section for section in (sections or []) if section.content]
+        has_document_context = any(section.title == 'DOCUMENT INFORMATION' for section in sections)
+
         # Add context if provided
-        if context:
+        if sections:
             system_role = 'You are a helpful AI assistant for students named Nova.'
 
             # Enhance system message for file context
@@ -285,62 +499,6 @@ def call_azure_openai(user_message, context=None, is_subject_chat=False, has_fil
             else:
                 system_role += ' Use the following information from previous conversations to provide personalized assistance.'
                 system_role += " IMPORTANT: I have the ability to remember important information you share with me. When you need me to remember something specific, please clearly state it with phrases like 'remember that...', 'note that...', or 'this is important:'. This information will be saved in your journal for future reference."
-
-            system_message = {'role': 'system', 'content': system_role}
-            messages.insert(0, system_message)
-
-            # Add context message with better formatting
-            if has_file_context:
-                # Place higher emphasis on file context by making it a separate message
-                context_parts = context.split("### UPLOADED FILE CONTEXT - IMPORTANT ###")
-                if len(context_parts) > 1:
-                    file_context = context_parts[1].split("\n\n")[0].strip()
-                    other_context = context_parts[0] + "\n\n" + "\n\n".join(context_parts[1].split("\n\n")[1:])
-
-                    # Add file context as a separate system message
-                    file_context_message = {'role': 'system', 'content': f"UPLOADED FILE CONTEXT:\n{file_context}"}
-                    messages.insert(1, file_context_message)
-
-                    # Add other context if it exists
-                    if other_context.strip():
-                        other_context_message = {'role': 'system', 'content': f'Additional context information:\n{other_context}'}
-                        messages.insert(2, other_context_message)
-                else:
-                    # Fallback if splitting didn't work as expected
-                    context_message = {'role': 'system', 'content': f'Context information:\n{context}'}
-                    messages.insert(1, context_message)
-            elif is_subject_chat and "### DOCUMENT INFORMATION ###" in context:
-                # For subject chat, split document and conversation information for better context handling
-                context_parts = context.split("### DOCUMENT INFORMATION ###")
-                if len(context_parts) > 1:
-                    doc_start = context_parts[1].find("\n") + 1  # Skip the header line
-                    doc_context = context_parts[1][doc_start:].strip()
-
-                    if "### PREVIOUS CONVERSATION INFORMATION ###" in doc_context:
-                        doc_parts = doc_context.split("### PREVIOUS CONVERSATION INFORMATION ###")
-                        doc_context = doc_parts[0].strip()
-                        conv_context = doc_parts[1].strip()
-
-                        # Add document context as a separate assistant message for better visibility
-                        doc_context_message = {'role': 'assistant', 'content': f"DOCUMENT INFORMATION:\n{doc_context}"}
-                        messages.insert(1, doc_context_message)
-
-                        # Add conversation context if it exists
-                        if conv_context:
-                            conv_context_message = {'role': 'system', 'content': f'PREVIOUS CONVERSATION INFORMATION:\n{conv_context}'}
-                            messages.insert(2, conv_context_message)
-                    else:
-                        # Only document context exists
-                        doc_context_message = {'role': 'assistant', 'content': f"DOCUMENT INFORMATION:\n{doc_context}"}
-                        messages.insert(1, doc_context_message)
-                else:
-                    # Fallback if splitting didn't work as expected
-                    context_message = {'role': 'system', 'content': f'Context information:\n{context}'}
-                    messages.insert(1, context_message)
-            else:
-                # Normal context handling
-                context_message = {'role': 'system', 'content': f'Context information:\n{context}'}
-                messages.insert(1, context_message)
         else:
             # Even without context, add information about journal functionality
             system_role = 'You are a helpful AI assistant for students named Nova.'
@@ -349,14 +507,14 @@ def call_azure_openai(user_message, context=None, is_subject_chat=False, has_fil
             else:
                 system_role += " IMPORTANT: I have the ability to remember important information you share with me. When you need me to remember something specific, please clearly state it with phrases like 'remember that...', 'note that...', or 'this is important:'. This information will be saved in your journal for future reference."
 
-            system_message = {'role': 'system', 'content': system_role}
-            messages.insert(0, system_message)
+        # Fit the context sections into the prompt token budget
+        messages = build_messages(system_role, user_message, sections, max_prompt_tokens=current_app.config['PROMPT_MAX_TOKENS'])
 
         # Increase max tokens when file context is present to allow for longer responses
         max_tokens = 1000 if has_file_context else 800
 
         # For subject chat with document information, increase token limit for more comprehensive answers
-        if is_subject_chat and context and "### DOCUMENT INFORMATION ###" in context:
+        if is_subject_chat and has_document_context:
             max_tokens = 1200
 
         payload = {
@@ -369,7 +527,7 @@ def call_azure_openai(user_message, context=None, is_subject_chat=False, has_fil
 
         # Send request to Azure OpenAI
         headers = {'Content-Type': 'application/json', 'api-key': api_key}
-        response = requests.post(url, headers=headers, json=payload)
+        response = get_http_session().post(url, headers=headers, json=payload)
         response.raise_for_status()
         result = response.json()
         ai_response = result['choices'][0]['message']['content']
@@ -378,7 +536,7 @@ def call_azure_openai(user_message, context=None, is_subject_chat=False, has_fil
         logger.error(f"Azure OpenAI API error: {str(e)}")
         raise
 
-@app.route('/subjects')
+@main_bp.route('/subjects')
 def subjects_list():
     """Render the subjects page with a list of subjects"""
     user_id = current_user.id if current_user.is_authenticated else None
@@ -395,7 +553,7 @@ def subjects_list():
 
     return render_template('subjects.html', subjects=subjects)
 
-@app.route('/subjects/add', methods=['POST'])
+@main_bp.route('/subjects/add', methods=['POST'])
 def add_subject():
     """Add a new subject"""
     user_id = current_user.id if current_user.is_authenticated else None
@@ -404,7 +562,7 @@ def add_subject():
     subject_name = request.form.get('subject_name')
     if not subject_name:
         flash('Subject name is required', 'error')
-        return redirect(url_for('subjects_list'))
+        return redirect(url_for('main.subjects_list'))
 
     # Create a new subject in MongoDB
     mongo_client = get_mongodb_client()
@@ -422,9 +580,9 @@ def add_subject():
     else:
         flash('Failed to add subject', 'error')
 
-    return redirect(url_for('subjects_list'))
+    return redirect(url_for('main.subjects_list'))
 
-@app.route('/subjects/<subject_id>')
+@main_bp.route('/subjects/<subject_id>')
 def subject_detail(subject_id):
     """Render the subject detail page"""
     user_id = current_user.id if current_user.is_authenticated else None
@@ -440,7 +598,7 @@ def subject_detail(subject_id):
 
     if (subject is None):
         flash('Subject not found', 'error')
-        return redirect(url_for('subjects_list'))
+        return redirect(url_for('main.subjects_list'))
 
     # Get document metadata from MongoDB
     documents = mongo_client.get_subject_documents(subject_id, user_id=user_id)
@@ -448,7 +606,7 @@ def subject_detail(subject_id):
 
     return render_template('subject_detail.html', subject=subject)
 
-@app.route('/subjects/<subject_id>/upload', methods=['POST'])
+@main_bp.route('/subjects/<subject_id>/upload', methods=['POST'])
 def upload_document(subject_id):
     """Upload one or more documents for a specific subject"""
     user_id = current_user.id if current_user.is_authenticated else None
@@ -490,7 +648,7 @@ def upload_document(subject_id):
         # Secure the filename and generate a unique filename
         filename = secure_filename(file.filename)
         unique_filename = f'{subject_id}_{str(uuid.uuid4())}_{filename}'
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
         try:
             # Save the file
             file.save(file_path)
@@ -509,11 +667,21 @@ def upload_document(subject_id):
 
             uploaded_documents.append(document_data)
 
+            # Extract the text once, for the digest and for indexing
+            document_text = extract_document_text(file_path)
+            if document_text and document_id:
+                # The digest serves the fallback context and topic extraction without re-parsing the file
+                digest = build_digest(document_text)
+                mongo_client.set_document_digest(document_id, digest)
+                # Only this document's entry is added to the subject digest
+                fold_in_document(mongo_client, subject_id, document_id, filename, digest)
+
             # Process and index the document in Azure AI Search if available
-            if app.config.get('AZURE_SEARCH_ENDPOINT') and app.config.get('AZURE_SEARCH_API_KEY'):
+            if current_app.config.get('AZURE_SEARCH_ENDPOINT') and current_app.config.get('AZURE_SEARCH_API_KEY'):
                 try:
                     # Prepare the document for indexing
-                    documents = prepare_document_for_indexing(doc_info=document_data, subject_name=subject['name'], file_path=file_path)
+                    documents = prepare_document_for_indexing(doc_info=document_data, subject_name=subject['name'],
+                                                              file_path=file_path, document_text=document_text)
                     # Upload to Azure AI Search
                     if documents:
                         search_client = get_search_client()
@@ -529,6 +697,9 @@ def upload_document(subject_id):
     if not uploaded_documents:
         return jsonify({'error': 'No valid documents were uploaded'}), 400
 
+    # The subject's documents changed, so cached answers are stale
+    invalidate_subject_caches(subject_id, mongo_client)
+
     # Return success with array of document data
     if len(uploaded_documents) == 1:
         return jsonify({'success': True, 'message': 'Document uploaded successfully', 'document': uploaded_documents[0]})
@@ -536,7 +707,7 @@ def upload_document(subject_id):
         return jsonify({'success': True, 'message': f'{len(uploaded_documents)} documents uploaded successfully', 'documents': uploaded_documents})
 
 # Add document deletion endpoint
-@app.route('/api/subjects/<subject_id>/documents/<document_id>/delete', methods=['DELETE'])
+@main_bp.route('/api/subjects/<subject_id>/documents/<document_id>/delete', methods=['DELETE'])
 @login_required
 def delete_document_route(subject_id, document_id):
     mongo_client = get_mongodb_client()
@@ -568,7 +739,7 @@ def delete_document_route(subject_id, document_id):
 
         if storage_path:
             if not os.path.isabs(storage_path):
-                full_storage_path = os.path.join(app.config['UPLOAD_FOLDER'], storage_path)
+                full_storage_path = os.path.join(current_app.config['UPLOAD_FOLDER'], storage_path)
             else:
                 full_storage_path = storage_path
 
@@ -593,6 +764,12 @@ def delete_document_route(subject_id, document_id):
 
         if delete_result.deleted_count == 1:
             logger.info(f"Successfully deleted document metadata for _id={doc_object_id}, user {current_user.id}") # Keep log for successful DB operation
+            fold_out_document(mongo_client, subject_id, document_id)
+            if current_app.config.get('AZURE_SEARCH_ENDPOINT') and current_app.config.get('AZURE_SEARCH_API_KEY'):
+                # Before the caches are invalidated, so no search can cache the deleted chunks again
+                removed = get_search_client().delete_document_entries(document_id)
+                logger.info(f"Removed {removed} index entries of document {document_id}")
+            invalidate_subject_caches(subject_id, mongo_client)
             message = "Document deleted successfully."
             if storage_path: # If there was an expectation of a physical file
                 if not file_deleted_physically:
@@ -620,7 +797,7 @@ def delete_document_route(subject_id, document_id):
         logger.error(f"Unexpected error in delete_document_route for doc_id {document_id}, user {current_user.id}: {str(e)}", exc_info=True) # Keep log for any other exception
         return jsonify({"success": False, "message": "An unexpected error occurred."}), 500
 
-@app.route("/api/motivational")
+@main_bp.route("/api/motivational")
 def api_reading():
     message = "Please Generate a motivational quote depending on the users mode. Send only the quote in double quotation and the guy who said it afterwards -" \
     "+ dont add the following quotes and get new things" + str(get_values())
@@ -628,7 +805,7 @@ def api_reading():
     x = motivational(response)
     return jsonify(value=x)
 
-@app.route('/api/subjects/<subject_id>/chat', methods=['POST'])
+@main_bp.route('/api/subjects/<subject_id>/chat', methods=['POST'])
 def subject_chat(subject_id):
     """API endpoint for subject-specific chat functionality"""
     try:
@@ -651,7 +828,8 @@ def subject_chat(subject_id):
             return jsonify({'error': 'No message provided'}), 400
 
         # Use Azure AI Search to retrieve relevant document chunks as context
-        document_context = retrieve_document_context(subject_id, user_message, user_id)
+        document_context = retrieve_document_context(subject_id, user_message, user_id,
+                                                     documents_version=subject.get('documents_version', 0))
 
         # Retrieve subject journal entries for additional context
         journal_entries = mongo_client.get_subject_journal_entries(
@@ -661,22 +839,35 @@ def subject_chat(subject_id):
         )
         journal_context = JournalExtractor.get_memory_context(journal_entries)
 
-        # Combine document and journal context with better formatting
-        combined_context = ''
+        # Build the prompt context sections, document information takes priority over memory
+        sections = []
         if document_context:
-            combined_context += '### DOCUMENT INFORMATION ###\n' + document_context + '\n\n'
+            sections.append(PromptSection('DOCUMENT INFORMATION', document_context, role='assistant', priority=0,
+                                          max_tokens=current_app.config['PROMPT_DOCUMENT_CONTEXT_MAX_TOKENS']))
         if journal_context:
-            combined_context += '### PREVIOUS CONVERSATION INFORMATION ###\n' + journal_context + '\n\n'
-
-        # Add a instruction if both contexts are present
-        if document_context and journal_context:
-            combined_context += 'Please use both document information and previous conversation context to provide a comprehensive answer.\n\n'
+            conversation_context = journal_context
+            # Add a instruction if both contexts are present
+            if document_context:
+                conversation_context += '\n\nPlease use both document information and previous conversation context to provide a comprehensive answer.'
+            sections.append(PromptSection('PREVIOUS CONVERSATION INFORMATION', conversation_context, priority=1,
+                                          max_tokens=current_app.config['PROMPT_MEMORY_MAX_TOKENS']))
         # Add a title for empty context
-        elif (not combined_context):
-            combined_context = 'No relevant information found.'
-
-        # Call Azure OpenAI with the combined context
-        response = call_azure_openai(user_message, combined_context, is_subject_chat=True)
+        if not sections:
+            sections.append(PromptSection('Context information', 'No relevant information found.'))
+
+        # Answer repeated questions against the same context from the response cache
+        cache = get_response_cache()
+        fingerprint = context_fingerprint(*(section.content for section in sections))
+        documents_version = subject.get('documents_version', 0)
+        response = cache.get(subject_id, user_message, fingerprint, documents_version) if cache is not None else None
+
+        if response is None:
+            # Call Azure OpenAI with the combined context
+            response = call_azure_openai(user_message, sections, is_subject_chat=True)
+            if cache is not None:
+                cache.put(subject_id, user_message, fingerprint, response, documents_version)
+        else:
+            logger.info(f"Answered subject chat for subject {subject_id} from the response cache")
 
         # Extract and save important information from user's message only
         extracted_info = JournalExtractor.extract_important_information(user_message)
@@ -703,7 +894,7 @@ def subject_chat(subject_id):
         logger.error(f"Error in subject chat: {str(e)}")
         return jsonify({'error': 'An error occurred processing your request'}), 500
 
-def retrieve_document_context(subject_id, query, user_id=None):
+def retrieve_document_context(subject_id, query, user_id=None, documents_version=0):
     """
     Retrieve relevant document content from Azure AI Search based on the query
     If Azure AI Search is not available, fall back to direct document extraction
@@ -712,6 +903,7 @@ def retrieve_document_context(subject_id, query, user_id=None):
         subject_id: Subject ID
         query: User's query
         user_id: Optional user ID for filtering documents
+        documents_version: The subject's documents version, cached search results of older versions are not used
     """
     try:
         # Log the incoming query for debugging
@@ -721,24 +913,34 @@ def retrieve_document_context(subject_id, query, user_id=None):
             logger.warning("Empty query provided to retrieve_document_context")
             return "No document context available - search query was empty."
 
-        # Extract key terms from the query to improve search
-        search_query = query
-        if len(query) > 100:  # If query is long, extract key terms
-            search_query = extract_search_terms(query)
-            logger.info(f"Original query was long. Using extracted search terms: '{search_query}'")
-
         # Check if we have Azure Search credentials
-        if app.config.get('AZURE_SEARCH_ENDPOINT') and app.config.get('AZURE_SEARCH_API_KEY'):
+        if current_app.config.get('AZURE_SEARCH_ENDPOINT') and current_app.config.get('AZURE_SEARCH_API_KEY'):
             search_client = get_search_client()
 
             # First try to use Azure AI Search
+            # Identical searches shortly after each other (retries, several tabs) are answered from the cache
+            search_cache = get_search_cache()
+            cache_key = SearchResultCache.make_key(subject_id, query, documents_version)
+            context = search_cache.get(cache_key) if search_cache is not None else None
+            if context is not None:
+                return context
+
             if search_client.is_available:
-                context = get_relevant_context(search_client, search_query, subject_id, user_id=user_id)
+                from retrieval import retrieve_context, NO_RESULTS_CONTEXT
+                # Searches the raw question, its key terms and their synonyms concurrently and fuses the rankings.
+                # The index has no user field, the subject filter already scopes the search to the user's documents
+                context = retrieve_context(search_client, query, subject_id,
+                                           max_results=current_app.config['RETRIEVAL_MAX_RESULTS'],
+                                           budget_seconds=current_app.config['RETRIEVAL_BUDGET_SECONDS'],
+                                           candidates=current_app.config['RETRIEVAL_RERANK_CANDIDATES'])
                 # If we got a meaningful context, return it
                 if context and not context.startswith("Error") and not context.startswith("Azure AI Search is not available"):
+                    # Only found context is cached, a document uploaded meanwhile may still answer the question
+                    if search_cache is not None and context != NO_RESULTS_CONTEXT:
+                        search_cache.put(cache_key, context)
                     return context
                 # Otherwise, log the issue and continue to fallback
-                logger.warning(f"Azure AI Search retrieval failed for query: '{search_query}', falling back to direct document extraction")
+                logger.warning(f"Azure AI Search retrieval failed for query: '{query}', falling back to direct document extraction")
 
         # Fall back to direct document extraction (either Azure Search is unavailable or failed)
         mongo_client = get_mongodb_client()
@@ -747,26 +949,19 @@ def retrieve_document_context(subject_id, query, user_id=None):
         if not documents:
             return 'No documents available for this subject yet.'
 
-        # Prepare a more comprehensive context from available documents
-        context_parts = []
-
-        # Try to get content from multiple documents (up to 3)
-        for idx, doc in enumerate(documents[:3]):
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], doc['storage_path'])
-            if os.path.exists(file_path):
-                text = extract_document_text(file_path)
-                if text:
-                    # Extract a reasonable sample from the document (first 1000 characters)
-                    sample = ((text[:1000] + '...') if (len(text) > 1000) else text)
-                    context_parts.append(f"Document: {doc['filename']}\n\n{sample}")
-
-                    # If we've already got a decent amount of content, stop here
-                    if len('\n\n---\n\n'.join(context_parts)) > 3000:
-                        break
-
-        if context_parts:
-            logger.info(f"Falling back to direct document extraction. Found {len(context_parts)} documents.")
-            return '\n\n---\n\n'.join(context_parts)
+        # Use the subject digest (topics, key terms and a summary of each document) instead of parsing the files.
+        # Documents uploaded before digests existed are folded in here once, a few per request
+        subject_digest = sync_subject_digest(mongo_client, subject_id, current_app.config['UPLOAD_FOLDER'],
+                                             max_builds=FALLBACK_MAX_DIGEST_BUILDS)
+        context = ''
+        if subject_digest and subject_digest.get('documents'):
+            # Documents whose headings and key terms match the question first
+            context = format_subject_digest(subject_digest, query=query, max_documents=FALLBACK_MAX_DOCUMENTS,
+                                            max_chars=FALLBACK_MAX_CONTEXT_CHARS)
+
+        if context:
+            logger.info(f"Falling back to the subject digest ({len(subject_digest['documents'])} documents)")
+            return context
         else:
             return 'Document content could not be retrieved. Please check that the uploaded documents are in a supported format.'
 
@@ -774,44 +969,8 @@ def retrieve_document_context(subject_id, query, user_id=None):
         logger.error(f"Error retrieving document context: {str(e)}")
         return f"Error retrieving document context: {str(e)}"
 
-def extract_search_terms(query, max_terms=5):
-    """
-    Extract key search terms from a long query to improve search results
-    """
-    try:
-        # Remove common words and keep nouns and key terms
-        words = query.lower().split()
-        # Common English stop words to filter out
-        stop_words = {'a', 'an', 'the', 'and', 'or', 'but', 'is', 'are', 'was', 'were',
-                      'be', 'been', 'being', 'to', 'of', 'for', 'with', 'about', 'against',
-                      'between', 'into', 'through', 'during', 'before', 'after', 'above',
-                      'below', 'from', 'up', 'down', 'in', 'out', 'on', 'off', 'over',
-                      'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when',
-                      'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more',
-                      'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own',
-                      'same', 'so', 'than', 'too', 'very', 'can', 'will', 'just', 'should',
-                      'now', 'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those'}
-
-        # Keep words that are not stop words and are at least 3 characters long
-        filtered_words = [word for word in words if word not in stop_words and len(word) >= 3]
-
-        # Get the most frequent terms (excluding very common words)
-        from collections import Counter
-        word_counts = Counter(filtered_words)
-        top_terms = [word for word, count in word_counts.most_common(max_terms)]
-
-        # Join the top terms back into a search query
-        if top_terms:
-            return ' '.join(top_terms)
-        else:
-            # If no good terms found, return the original query
-            return query
-    except Exception as e:
-        logger.error(f"Error extracting search terms: {str(e)}")
-        return query
-
 # Timetable Generator Routes
-@app.route('/timetable')
+@main_bp.route('/timetable')
 def timetable():
     """Render the timetable generation page"""
     user_id = current_user.id if current_user.is_authenticated else None
@@ -828,7 +987,7 @@ def timetable():
 
     return render_template('timetable.html', subjects=subjects)
 
-@app.route('/api/timetable/extract_topics', methods=['POST'])
+@main_bp.route('/api/timetable/extract_topics', methods=['POST'])
 def extract_topics():
     """API endpoint for extracting topics from subject documents (Agent 1)"""
     try:
@@ -862,14 +1021,17 @@ def extract_topics():
         timetable_agent = get_timetable_agent_system()
 
         # Extract topics from documents using Agent 1
-        extraction_results = timetable_agent.extract_topics_from_documents(documents=documents, upload_folder=app.config['UPLOAD_FOLDER'], scope=scope)
+        # The subject digest holds the summary, contents and key terms of every document
+        subject_digest = sync_subject_digest(mongo_client, subject_id, current_app.config['UPLOAD_FOLDER'])
+        extraction_results = timetable_agent.extract_topics_from_documents(documents=documents, upload_folder=current_app.config['UPLOAD_FOLDER'], scope=scope,
+                                                                           mongo_client=mongo_client, subject_digest=subject_digest)
 
         return jsonify({'success': True, 'subject': subject, 'extraction_results': extraction_results})
     except Exception as e:
         logger.error(f"Error extracting topics: {str(e)}")
         return jsonify({'error': f"Error extracting topics: {str(e)}"}), 500
 
-@app.route('/api/timetable/generate', methods=['POST'])
+@main_bp.route('/api/timetable/generate', methods=['POST'])
 def generate_timetable():
     """API endpoint for generating a study timetable using the multi-agent workflow"""
     try:
@@ -912,7 +1074,7 @@ def generate_timetable():
         logger.error(f"Error generating timetable: {str(e)}")
         return jsonify({'error': f"Error generating timetable: {str(e)}"}), 500
 
-@app.route('/api/timetable/download', methods=['POST'])
+@main_bp.route('/api/timetable/download', methods=['POST'])
 def download_timetable():
     """API endpoint for downloading timetable as iCalendar (.ics) file"""
     try:
@@ -939,39 +1101,57 @@ def download_timetable():
         return jsonify({'error': f"Error downloading timetable: {str(e)}"}), 500
 
 # Research Assistant Routes
-@app.route('/research-assistant/')
+@main_bp.route('/research-assistant/')
 def research_assistant():
     """Render the research assistant page with literature review functionality"""
     return render_template('research_assistant.html', app_name="Nova")
 
-@app.route('/api/research-assistant/generate', methods=['POST'])
+@main_bp.route('/api/research-assistant/generate', methods=['POST'])
 def generate_literature_review():
-    """API endpoint for generating a literature review using the run_lit_review function"""
+    """API endpoint for starting a literature review job; poll the returned status URL for progress"""
     try:
         # Get the query from the request
         query = request.json.get('query', '')
         if not query:
             return jsonify({"error": "No query provided"}), 400
 
-        # Call the run_lit_review function to generate the literature review
-        logger.info(f"Generating literature review for query: {query}")
-        report_path = run_lit_review(query)
+        # The review runs in the background, the request only submits it
+        logger.info(f"Submitting literature review for query: {query}")
+        job = get_research_job_manager().submit(query, owner_id=get_session_id())
 
-        # Check if the report was generated successfully
-        if not report_path or not os.path.exists(report_path):
-            return jsonify({"error": "Failed to generate literature review report"}), 500
-
-        # Read the report content
-        with open(report_path, 'r') as f:
-            report_content = f.read()
-
-        return jsonify({"success": True, "report": report_content})
+        return jsonify({
+            "success": True,
+            "job_id": job['id'],
+            "status": job['status'],
+            "status_url": url_for('main.literature_review_status', job_id=job['id'])
+        }), 202
     except Exception as e:
         logger.error(f"Error generating literature review: {str(e)}")
         return jsonify({"error": f"Error generating literature review: {str(e)}"}), 500
 
+@main_bp.route('/api/research-assistant/jobs/<job_id>', methods=['GET'])
+def literature_review_status(job_id):
+    """API endpoint for polling the status, progress events and report of a literature review job"""
+    since = request.args.get('since', 0, type=int)
+    job = get_research_job_manager().get(job_id, since=since)
+
+    # Jobs are only visible to the session that started them
+    if job is None or job.get('owner_id') != get_session_id():
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify({
+        "success": True,
+        "job_id": job['id'],
+        "status": job['status'],
+        "events": [{'type': event['type'], 'message': event['message']} for event in job['events']],
+        "next_event": job['next_event'],
+        "report": job['report'],
+        "partial_report": job.get('partial_report'),
+        "error": job['error']
+    })
+
 # Quiz Generation Routes
-@app.route('/quiz')
+@main_bp.route('/quiz')
 def quiz():
     """Render the quiz generation page with subject selection"""
     user_id = current_user.id if current_user.is_authenticated else None
@@ -988,7 +1168,7 @@ def quiz():
 
     return render_template('quiz.html', subjects=subjects)
 
-@app.route('/api/quiz/generate', methods=['POST'])
+@main_bp.route('/api/quiz/generate', methods=['POST'])
 def generate_quiz():
     """API endpoint for generating a quiz based on subject documents and topic"""
     try:
@@ -1023,14 +1203,18 @@ def generate_quiz():
         # Update the documents to include the upload folder path
         for doc in documents:
             # Store the upload folder temporarily for document content extraction
-            doc['_upload_folder'] = app.config['UPLOAD_FOLDER']
+            doc['_upload_folder'] = current_app.config['UPLOAD_FOLDER']
+
+        # The subject digest tells which documents cover the topic, only those are extracted
+        subject_digest = sync_subject_digest(mongo_client, subject_id, current_app.config['UPLOAD_FOLDER'])
 
         # Generate the quiz
         quiz_questions = quiz_gen.generate_quiz(
             documents=documents,
             topic=topic,
             num_questions=5,  # Default to 5 questions
-            options_per_question=4  # Default to 4 options per question
+            options_per_question=4,  # Default to 4 options per question
+            subject_digest=subject_digest
         )
 
         if not quiz_questions:
@@ -1045,7 +1229,7 @@ def generate_quiz():
         logger.error(f"Error generating quiz: {str(e)}")
         return jsonify({"error": f"Error generating quiz: {str(e)}"}), 500
 
-@app.route('/api/quiz/submit', methods=['POST'])
+@main_bp.route('/api/quiz/submit', methods=['POST'])
 def submit_quiz():
     """API endpoint for scoring a submitted quiz"""
     try:
@@ -1072,12 +1256,8 @@ def submit_quiz():
         logger.error(f"Error scoring quiz: {str(e)}")
         return jsonify({"error": f"Error scoring quiz: {str(e)}"}), 500
 
-# Clean up resources when app is shutting down
-@app.teardown_appcontext
-def close_connections(exception=None):
-    global mongodb_client
-    if mongodb_client:
-        mongodb_client.close()
+# Module-level app for wsgi.py, gunicorn and `python app.py`
+app = create_app()
 
 if (__name__ == '__main__'):
     app.run(debug=app.config['DEBUG'])
@@ -0,0 +1,256 @@
+"""
+attachment_store.py - Temporary per-session storage of general chat attachments
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Session and attachment IDs are used as directory names, only allow safe characters
+SAFE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Minimum number of seconds between two sweeps for expired attachments
+CLEANUP_INTERVAL_SECONDS = 300
+
+class AttachmentStore:
+    """
+    Stores chat attachments on disk, scoped to a session, together with their
+    extracted text so that later messages can reference them by ID without
+    re-uploading or re-extracting the file.
+
+    Layout: <root>/<session_id>/<attachment_id>/{file, meta.json, extracted.txt}
+    """
+
+    def __init__(self, root_folder: str, ttl_seconds: int = 86400, max_attachments_per_session: int = 10):
+        """
+        Initialize the attachment store
+
+        Args:
+            root_folder: Folder where attachments are stored
+            ttl_seconds: Time after which unused attachments are removed
+            max_attachments_per_session: Maximum number of attachments kept per session
+                (the oldest are removed first)
+        """
+        self.root_folder = root_folder
+        self.ttl_seconds = ttl_seconds
+        self.max_attachments_per_session = max_attachments_per_session
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(root_folder, exist_ok=True)
+
+    def _session_folder(self, session_id: str) -> str:
+        if not SAFE_ID_PATTERN.match(session_id or ''):
+            raise ValueError("Invalid session ID")
+        return os.path.join(self.root_folder, session_id)
+
+    def _attachment_folder(self, session_id: str, attachment_id: str) -> Optional[str]:
+        if not SAFE_ID_PATTERN.match(attachment_id or ''):
+            return None
+        return os.path.join(self._session_folder(session_id), attachment_id)
+
+    def save(self, session_id: str, file_storage, file_name: str, file_type: str) -> Dict[str, Any]:
+        """
+        Save an uploaded file for a session
+
+        Args:
+            session_id: ID of the session the attachment belongs to
+            file_storage: Werkzeug FileStorage of the uploaded file
+            file_name: Sanitized file name
+            file_type: MIME type reported by the client
+
+        Returns:
+            Attachment metadata (id, name, type, size)
+        """
+        self.cleanup_expired()
+
+        attachment_id = uuid.uuid4().hex
+        folder = os.path.join(self._session_folder(session_id), attachment_id)
+        os.makedirs(folder, exist_ok=True)
+
+        file_path = os.path.join(folder, 'file')
+        # Werkzeug spools multipart parts to disk, save() copies that stream in chunks
+        file_storage.save(file_path)
+
+        metadata = {
+            'id': attachment_id,
+            'name': file_name,
+            'type': file_type,
+            'size': os.path.getsize(file_path),
+            'created_at': time.time()
+        }
+        with open(os.path.join(folder, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+
+        self._enforce_session_limit(session_id)
+        logger.info(f"Stored chat attachment {attachment_id} ({metadata['size']} bytes)")
+        return metadata
+
+    def get_file_path(self, session_id: str, attachment_id: str) -> Optional[str]:
+        """
+        Get the path of a stored attachment's file
+
+        Args:
+            session_id: ID of the session the attachment belongs to
+            attachment_id: ID of the attachment
+
+        Returns:
+            Path to the file or None if the attachment does not exist
+        """
+        folder = self._attachment_folder(session_id, attachment_id)
+        if folder is None:
+            return None
+        file_path = os.path.join(folder, 'file')
+        return file_path if os.path.exists(file_path) else None
+
+    def get_metadata(self, session_id: str, attachment_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the metadata of a stored attachment
+
+        Args:
+            session_id: ID of the session the attachment belongs to
+            attachment_id: ID of the attachment
+
+        Returns:
+            Attachment metadata or None if the attachment does not exist
+        """
+        folder = self._attachment_folder(session_id, attachment_id)
+        if folder is None:
+            return None
+        try:
+            with open(os.path.join(folder, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_extracted_text(self, session_id: str, attachment_id: str) -> Optional[str]:
+        """
+        Get the cached extracted text of an attachment
+
+        Args:
+            session_id: ID of the session the attachment belongs to
+            attachment_id: ID of the attachment
+
+        Returns:
+            The extracted text or None if it has not been extracted yet
+        """
+        folder = self._attachment_folder(session_id, attachment_id)
+        if folder is None:
+            return None
+        try:
+            with open(os.path.join(folder, 'extracted.txt'), 'r', encoding='utf-8') as f:
+                text = f.read()
+            # Referencing an attachment keeps it alive for another TTL period
+            os.utime(folder)
+            return text
+        except OSError:
+            return None
+
+    def set_extracted_text(self, session_id: str, attachment_id: str, text: str) -> None:
+        """
+        Cache the extracted text of an attachment
+
+        Args:
+            session_id: ID of the session the attachment belongs to
+            attachment_id: ID of the attachment
+            text: The extracted text
+        """
+        folder = self._attachment_folder(session_id, attachment_id)
+        if folder is None or not os.path.isdir(folder):
+            return
+        temp_path = os.path.join(folder, 'extracted.txt.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, os.path.join(folder, 'extracted.txt'))
+
+    def list_attachments(self, session_id: str) -> List[Dict[str, Any]]:
+        """
+        List the attachments of a session, oldest first
+
+        Args:
+            session_id: ID of the session
+
+        Returns:
+            List of attachment metadata dictionaries
+        """
+        folder = self._session_folder(session_id)
+        if not os.path.isdir(folder):
+            return []
+        attachments = []
+        for attachment_id in os.listdir(folder):
+            metadata = self.get_metadata(session_id, attachment_id)
+            if metadata:
+                attachments.append(metadata)
+        return sorted(attachments, key=lambda a: a.get('created_at', 0))
+
+    def delete(self, session_id: str, attachment_id: str) -> bool:
+        """
+        Delete an attachment
+
+        Args:
+            session_id: ID of the session the attachment belongs to
+            attachment_id: ID of the attachment
+
+        Returns:
+            True if the attachment was deleted, False if it did not exist
+        """
+        folder = self._attachment_folder(session_id, attachment_id)
+        if folder is None or not os.path.isdir(folder):
+            return False
+        shutil.rmtree(folder, ignore_errors=True)
+        return True
+
+    def _enforce_session_limit(self, session_id: str) -> None:
+        attachments = self.list_attachments(session_id)
+        for metadata in attachments[:max(len(attachments) - self.max_attachments_per_session, 0)]:
+            self.delete(session_id, metadata['id'])
+
+    def cleanup_expired(self, force: bool = False) -> int:
+        """
+        Remove attachments older than the TTL (at most once per CLEANUP_INTERVAL_SECONDS)
+
+        Args:
+            force: Run the sweep even if one ran recently
+
+        Returns:
+            Number of attachments removed
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_cleanup < CLEANUP_INTERVAL_SECONDS:
+                return 0
+            self._last_cleanup = now
+
+        removed = 0
+        try:
+            for session_id in os.listdir(self.root_folder):
+                session_folder = os.path.join(self.root_folder, session_id)
+                if not os.path.isdir(session_folder):
+                    continue
+                for attachment_id in os.listdir(session_folder):
+                    attachment_folder = os.path.join(session_folder, attachment_id)
+                    try:
+                        if now - os.path.getmtime(attachment_folder) > self.ttl_seconds:
+                            shutil.rmtree(attachment_folder, ignore_errors=True)
+                            removed += 1
+                    except OSError:
+                        continue
+                try:
+                    if not os.listdir(session_folder):
+                        os.rmdir(session_folder)
+                except OSError:
+                    continue
+        except OSError as e:
+            logger.error(f"Error cleaning up chat attachments: {str(e)}")
+
+        if removed:
+            logger.info(f"Removed {removed} expired chat attachments")
+        return removed
@@ -23,7 +23,7 @@ def login():
     # If user is already logged in, redirect to home
     if current_user.is_authenticated:
         flash('You are already logged in.', 'info')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     # Handle form submission
     if request.method == 'POST':
@@ -60,7 +60,7 @@ def login():
 
         # Redirect to home page or next page
         next_page = request.args.get('next')
-        return redirect(next_page or url_for('index'))
+        return redirect(next_page or url_for('main.index'))
 
     # GET request - show login form
     return render_template('login.html')
@@ -71,7 +71,7 @@ def register():
     # If user is already logged in, redirect to home
     if current_user.is_authenticated:
         flash('You are already logged in.', 'info')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     # Handle form submission
     if request.method == 'POST':
@@ -113,7 +113,7 @@ def register():
 
             # Redirect to home page or next page
             next_page = request.args.get('next')
-            return redirect(next_page or url_for('index'))
+            return redirect(next_page or url_for('main.index'))
 
     # GET request - show registration form
     return render_template('register.html')
@@ -124,7 +124,7 @@ def logout():
     """Log out the current user"""
     logout_user()
     flash('You have been logged out.', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 @auth_bp.route('/profile')
 @login_required
@@ -0,0 +1,267 @@
+"""
+extraction_benchmark.py - Measures DOCX and Markdown text extraction on large syllabus files
+
+Generates a syllabus-like DOCX (headings, paragraphs and a large timetable
+table with merged cells) and a Markdown file of the same content, then times
+document_processor's extractors on them. If python-docx / markdown are
+installed, the previous extractors (python-docx object model, markdown
+rendered to HTML and stripped) are timed on the same files for comparison.
+Real files can be added with --files.
+
+Usage (from the nova directory):
+    python benchmarks/extraction_benchmark.py [--weeks 200] [--runs 5] [--files syllabus.docx notes.md]
+"""
+
+import io
+import os
+import re
+import sys
+import time
+import zipfile
+import argparse
+import statistics
+import tracemalloc
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from document_processor import extract_text_from_docx, extract_text_from_markdown  # noqa: E402
+
+WORD_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+TOPICS = ['Cell structure', 'Membrane transport', 'Enzymes', 'Respiration', 'Photosynthesis',
+          'Genetics', 'Evolution', 'Ecology', 'Homeostasis', 'Immunology']
+TABLE_COLUMNS = ['Week', 'Session', 'Topic', 'Reading', 'Assessment', 'Notes']
+SESSIONS_PER_WEEK = 3
+
+def syllabus_content(weeks: int) -> list:
+    """
+    Build the content of a generated syllabus
+
+    Args:
+        weeks: Number of weeks (sections and table row groups)
+
+    Returns:
+        List of ('heading', level, text), ('paragraph', text) and ('table', rows) blocks
+    """
+    blocks = [('heading', 1, 'Biology 101 Syllabus')]
+    rows = []
+    for week in range(1, weeks + 1):
+        topic = TOPICS[week % len(TOPICS)]
+        blocks.append(('heading', 2, f'Week {week}: {topic}'))
+        blocks.append(('paragraph', f'This week covers {topic.lower()} in depth. Students read the assigned chapter, '
+                                    f'complete the problem set and prepare questions about {topic.lower()} '
+                                    f'for the seminar. Learning outcome {week}: explain the key mechanisms.'))
+        for session in range(1, SESSIONS_PER_WEEK + 1):
+            rows.append([str(week), f'Session {session}', topic, f'Chapter {week}.{session}',
+                         'Quiz' if session == SESSIONS_PER_WEEK else '', f'Room {100 + session}'])
+    blocks.append(('heading', 2, 'Timetable'))
+    blocks.append(('table', rows))
+    return blocks
+
+def _docx_paragraph(text: str, style: str = None) -> str:
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{properties}<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+def build_docx(blocks: list) -> bytes:
+    """
+    Write syllabus blocks as a DOCX file
+
+    The week column of the timetable is merged vertically over each week's
+    sessions, as in most real timetables.
+
+    Args:
+        blocks: Output of syllabus_content
+
+    Returns:
+        Content of the DOCX file
+    """
+    body = []
+    for block in blocks:
+        if block[0] == 'heading':
+            body.append(_docx_paragraph(block[2], f'Heading{block[1]}'))
+        elif block[0] == 'paragraph':
+            body.append(_docx_paragraph(block[1]))
+        else:
+            table = ['<w:tbl><w:tblGrid>' + '<w:gridCol/>' * len(TABLE_COLUMNS) + '</w:tblGrid>']
+            table.append('<w:tr>' + ''.join(f'<w:tc>{_docx_paragraph(column)}</w:tc>' for column in TABLE_COLUMNS) + '</w:tr>')
+            for index, row in enumerate(block[1]):
+                cells = []
+                for column, value in enumerate(row):
+                    if column == 0:
+                        # First session of a week starts the merge, the others continue it
+                        if index % SESSIONS_PER_WEEK == 0:
+                            cells.append(f'<w:tc><w:tcPr><w:vMerge w:val="restart"/></w:tcPr>{_docx_paragraph(value)}</w:tc>')
+                        else:
+                            cells.append(f'<w:tc><w:tcPr><w:vMerge/></w:tcPr>{_docx_paragraph("")}</w:tc>')
+                    else:
+                        cells.append(f'<w:tc>{_docx_paragraph(value)}</w:tc>')
+                table.append('<w:tr>' + ''.join(cells) + '</w:tr>')
+            table.append('</w:tbl>')
+            body.append(''.join(table))
+
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:document xmlns:w="{WORD_NAMESPACE}"><w:body>{"".join(body)}</w:body></w:document>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES)
+        archive.writestr('_rels/.rels', PACKAGE_RELS)
+        archive.writestr('word/document.xml', document)
+    return buffer.getvalue()
+
+def build_markdown(blocks: list) -> bytes:
+    """
+    Write syllabus blocks as a Markdown file
+
+    Args:
+        blocks: Output of syllabus_content
+
+    Returns:
+        Content of the Markdown file
+    """
+    lines = []
+    for block in blocks:
+        if block[0] == 'heading':
+            lines.extend([f"{'#' * block[1]} {block[2]}", ''])
+        elif block[0] == 'paragraph':
+            lines.extend([f"{block[1]} See the [course page](https://example.edu/bio101) and **bring notes**.",
+                          '', '- Read the *assigned* chapter', '- Solve `problem_set.pdf`', ''])
+        else:
+            lines.append('| ' + ' | '.join(TABLE_COLUMNS) + ' |')
+            lines.append('|' + '---|' * len(TABLE_COLUMNS))
+            for row in block[1]:
+                lines.append('| ' + ' | '.join(row) + ' |')
+            lines.append('')
+    return '\n'.join(lines).encode('utf-8')
+
+def legacy_docx(data: bytes) -> str:
+    """The previous DOCX extractor (python-docx object model)"""
+    from docx import Document
+
+    doc = Document(io.BytesIO(data))
+    text_content = [para.text for para in doc.paragraphs if para.text]
+    for table in doc.tables:
+        for row in table.rows:
+            row_text = [cell.text for cell in row.cells if cell.text]
+            if row_text:
+                text_content.append(" | ".join(row_text))
+    return "\n\n".join(text_content)
+
+def legacy_markdown(data: bytes) -> str:
+    """The previous Markdown extractor (rendered to HTML, tags stripped)"""
+    import markdown
+
+    return re.sub(r'<[^>]*>', '', markdown.markdown(data.decode('utf-8')))
+
+def measure(extractor, data: bytes, runs: int) -> dict:
+    """
+    Time an extractor
+
+    Args:
+        extractor: Function taking the file content
+        data: File content
+        runs: Number of timed runs
+
+    Returns:
+        Dictionary with the median seconds, throughput, peak memory and output length
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = extractor(data)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    extractor(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        'seconds': median,
+        'mb_per_second': (len(data) / (1024 * 1024)) / median if median else float('inf'),
+        'peak_mb': peak / (1024 * 1024),
+        'chars': len(text)
+    }
+
+def available(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+def report(name: str, data: bytes, candidates: list, runs: int):
+    """
+    Time the extractors of one file and print a comparison
+
+    Args:
+        name: File name shown in the report
+        data: File content
+        candidates: List of (label, extractor)
+        runs: Number of timed runs per extractor
+    """
+    print(f"{name} ({len(data) / 1024:.0f} KB):")
+    baseline = None
+    for label, extractor in candidates:
+        result = measure(extractor, data, runs)
+        if baseline is None:
+            baseline = result['seconds']
+            speedup = ''
+        else:
+            speedup = f"  ({result['seconds'] / baseline:.1f}x the time of the first)"
+        print(f"  {label:<22} {result['seconds'] * 1000:9.1f} ms  {result['mb_per_second']:7.1f} MB/s  "
+              f"peak {result['peak_mb']:6.1f} MB  {result['chars']:>9} chars{speedup}")
+
+def candidates_for(extension: str) -> list:
+    """Extractors to compare for a file type, the current one first"""
+    if extension == '.docx':
+        candidates = [('streaming (zip+xml)', extract_text_from_docx)]
+        if available('docx'):
+            candidates.append(('python-docx', legacy_docx))
+        return candidates
+    candidates = [('direct tokenizer', extract_text_from_markdown)]
+    if available('markdown'):
+        candidates.append(('markdown -> html', legacy_markdown))
+    return candidates
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure DOCX and Markdown text extraction")
+    parser.add_argument('--weeks', type=int, default=200, help="Size of the generated syllabus in weeks")
+    parser.add_argument('--runs', type=int, default=5, help="Timed runs per extractor")
+    parser.add_argument('--files', nargs='*', default=[], help="Additional .docx or .md files to measure")
+    args = parser.parse_args()
+
+    blocks = syllabus_content(args.weeks)
+    print(f"Generated syllabus: {args.weeks} weeks, {args.weeks * SESSIONS_PER_WEEK} timetable rows")
+    report('syllabus.docx', build_docx(blocks), candidates_for('.docx'), args.runs)
+    report('syllabus.md', build_markdown(blocks), candidates_for('.md'), args.runs)
+
+    for path in args.files:
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in ('.docx', '.md'):
+            print(f"Skipping {path}: only .docx and .md files are measured")
+            continue
+        with open(path, 'rb') as f:
+            report(os.path.basename(path), f.read(), candidates_for(extension), args.runs)
+
+    if not (available('docx') and available('markdown')):
+        print("Install python-docx and markdown to compare with the previous extractors")
+
+if __name__ == '__main__':
+    main()
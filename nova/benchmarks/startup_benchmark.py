@@ -0,0 +1,156 @@
+"""
+startup_benchmark.py - Measures how long a fresh worker takes to import the app
+
+Every run starts a new interpreter (like a new gunicorn worker), imports the
+target module and reports the import time and which heavy optional stacks got
+loaded on the way. With --breakdown, one extra run under `python -X importtime`
+shows which modules the time goes to. With --budget-ms, the script exits with
+status 1 when the median import time is over budget, so it can gate a deploy.
+
+Usage (from the nova directory):
+    python benchmarks/startup_benchmark.py [--runs 5] [--module app] [--breakdown 15] [--budget-ms 1500]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+NOVA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules that should only be loaded once the feature using them is used
+HEAVY_MODULES = [
+    'agents.research_agent',
+    'agents.quiz_agent',
+    'timetable_agent',
+    'search_utils',
+    'autogen_core',
+    'autogen_ext',
+    'azure.search.documents',
+    'fitz',
+    'llama_cloud_services',
+    'pdfplumber',
+    'docx',
+    'markdown',
+    'icalendar',
+]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+def run_once(module: str) -> dict:
+    """
+    Import the module in a fresh interpreter
+
+    Args:
+        module: Name of the module to import
+
+    Returns:
+        Dictionary with the import time in seconds and the heavy modules that were loaded
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=NOVA_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    # The last line is ours, anything before it is output of the imported modules
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def profile_imports(module: str) -> list:
+    """
+    Import the module in a fresh interpreter with -X importtime
+
+    Args:
+        module: Name of the module to import
+
+    Returns:
+        List of (module name, self microseconds, cumulative microseconds, depth) in import order
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=NOVA_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0 and name.strip() == 'site':
+            # Everything up to here is interpreter startup, not the import being profiled
+            entries = []
+            continue
+        entries.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return entries
+
+def print_breakdown(entries: list, limit: int):
+    """
+    Print the slowest imports and the self time per top-level package
+
+    Args:
+        entries: Output of profile_imports
+        limit: Number of rows per table
+    """
+    print(f"  slowest imports (cumulative, top {limit}):")
+    for name, _, cumulative, depth in sorted(entries, key=lambda entry: entry[2], reverse=True)[:limit]:
+        print(f"    {cumulative / 1000:8.1f} ms  {'  ' * depth}{name}")
+
+    per_package = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        per_package[name.split('.')[0]] += self_us
+    print(f"  self time by top-level package (top {limit}):")
+    for package, self_us in sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:limit]:
+        print(f"    {self_us / 1000:8.1f} ms  {package}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure worker startup (module import) time")
+    parser.add_argument('--runs', type=int, default=5, help="Number of fresh interpreters to start")
+    parser.add_argument('--module', default='app', help="Module to import")
+    parser.add_argument('--breakdown', type=int, default=0, metavar='N',
+                        help="Show the N slowest imports from an extra -X importtime run")
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="Exit with status 1 if the median import time exceeds this many milliseconds")
+    args = parser.parse_args()
+
+    timings = []
+    loaded = set()
+    for _ in range(args.runs):
+        measurement = run_once(args.module)
+        timings.append(measurement['seconds'])
+        loaded.update(measurement['loaded'])
+
+    median_ms = statistics.median(timings) * 1000
+    print(f"Import of '{args.module}' over {args.runs} runs:")
+    print(f"  median {median_ms:.0f} ms, min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms")
+    if loaded:
+        print(f"  heavy modules loaded at import: {', '.join(sorted(loaded))}")
+    else:
+        print("  no heavy modules loaded at import")
+
+    if args.breakdown > 0:
+        print_breakdown(profile_imports(args.module), args.breakdown)
+
+    if args.budget_ms is not None:
+        if median_ms > args.budget_ms:
+            print(f"  OVER BUDGET: median {median_ms:.0f} ms > {args.budget_ms:.0f} ms")
+            sys.exit(1)
+        print(f"  within budget of {args.budget_ms:.0f} ms")
+
+if __name__ == '__main__':
+    main()
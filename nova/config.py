@@ -19,6 +19,12 @@ AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv('AZURE_OPENAI_CHAT_DEPLOYMENT', 'gpt-35
 AZURE_SEARCH_ENDPOINT = os.getenv('AZURE_SEARCH_ENDPOINT')
 AZURE_SEARCH_API_KEY = os.getenv('AZURE_SEARCH_API_KEY')
 AZURE_SEARCH_INDEX_NAME = os.getenv('AZURE_SEARCH_INDEX_NAME', 'student-documents')
+# Consecutive search failures before search is skipped, and for how long (then one probe request is tried)
+AZURE_SEARCH_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('AZURE_SEARCH_CIRCUIT_FAILURE_THRESHOLD', '3'))
+AZURE_SEARCH_CIRCUIT_RESET_SECONDS = float(os.getenv('AZURE_SEARCH_CIRCUIT_RESET_SECONDS', '30'))
+# Upload batches in flight at once, and the payload size a batch is cut at (the service limit is 16 MB)
+AZURE_SEARCH_UPLOAD_CONCURRENCY = int(os.getenv('AZURE_SEARCH_UPLOAD_CONCURRENCY', '4'))
+AZURE_SEARCH_UPLOAD_BATCH_BYTES = int(os.getenv('AZURE_SEARCH_UPLOAD_BATCH_BYTES', str(8 * 1024 * 1024)))
 
 # Azure Document Intelligence configuration
 AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT = os.getenv('AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT')
@@ -35,4 +41,44 @@ MONGODB_SUBJECT_JOURNALS_COLLECTION = os.getenv('MONGODB_SUBJECT_JOURNALS_COLLEC
 # File upload configuration
 MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB max upload size
 UPLOAD_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), 'subject_documents'))
-ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt', 'md'}
\ No newline at end of file
+ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt', 'md'}
+
+# Subject chat response cache (opt-in)
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '3600'))
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('RESPONSE_CACHE_SIMILARITY_THRESHOLD', '0.8'))
+RESPONSE_CACHE_MAX_ENTRIES_PER_SUBJECT = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES_PER_SUBJECT', '200'))
+
+# Time subject chat waits for its concurrent search query variants
+RETRIEVAL_BUDGET_SECONDS = float(os.getenv('RETRIEVAL_BUDGET_SECONDS', '1.5'))
+# Hits fetched per query variant and re-ranked, and how many of them go into the prompt
+RETRIEVAL_RERANK_CANDIDATES = int(os.getenv('RETRIEVAL_RERANK_CANDIDATES', '50'))
+RETRIEVAL_MAX_RESULTS = int(os.getenv('RETRIEVAL_MAX_RESULTS', '5'))
+
+# Subject chat search result cache (short-lived, keyed by subject, documents version and normalized query)
+SEARCH_CACHE_ENABLED = os.getenv('SEARCH_CACHE_ENABLED', 'true').lower() == 'true'
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv('SEARCH_CACHE_TTL_SECONDS', '300'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '1024'))
+
+# Prompt token budgets for Azure OpenAI chat requests
+PROMPT_MAX_TOKENS = int(os.getenv('PROMPT_MAX_TOKENS', '12000'))
+PROMPT_FILE_CONTEXT_MAX_TOKENS = int(os.getenv('PROMPT_FILE_CONTEXT_MAX_TOKENS', '8000'))
+PROMPT_DOCUMENT_CONTEXT_MAX_TOKENS = int(os.getenv('PROMPT_DOCUMENT_CONTEXT_MAX_TOKENS', '6000'))
+PROMPT_MEMORY_MAX_TOKENS = int(os.getenv('PROMPT_MEMORY_MAX_TOKENS', '1500'))
+
+# General chat attachments (temporary, per session)
+ATTACHMENT_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), 'chat_attachments'))
+ATTACHMENT_TTL_SECONDS = int(os.getenv('ATTACHMENT_TTL_SECONDS', '86400'))
+ATTACHMENT_MAX_PER_SESSION = int(os.getenv('ATTACHMENT_MAX_PER_SESSION', '10'))
+
+# Literature review background jobs
+RESEARCH_JOBS_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), 'research_jobs'))
+RESEARCH_MAX_CONCURRENT_JOBS = int(os.getenv('RESEARCH_MAX_CONCURRENT_JOBS', '3'))
+RESEARCH_JOB_TIMEOUT_SECONDS = int(os.getenv('RESEARCH_JOB_TIMEOUT_SECONDS', '1800'))
+RESEARCH_JOB_RETENTION_SECONDS = int(os.getenv('RESEARCH_JOB_RETENTION_SECONDS', '21600'))
+
+# Worker startup: services created before traffic arrives (see gunicorn.conf.py)
+WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', 'true').lower() == 'true'
+WARM_UP_SERVICES = [name.strip() for name in os.getenv('WARM_UP_SERVICES', 'mongodb,search,http').split(',') if name.strip()]
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+HTTP_PRIME_TIMEOUT_SECONDS = float(os.getenv('HTTP_PRIME_TIMEOUT_SECONDS', '5'))
@@ -0,0 +1,245 @@
+"""
+document_digest.py - Compact per-document digests (summary, table of contents, key terms) built at ingest
+"""
+
+import re
+import logging
+import datetime
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from text_utils import tokenize, stem
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when the digest format changes, older digests are rebuilt on first use
+DIGEST_VERSION = 1
+SUMMARY_MAX_CHARS = 1200
+TOC_MAX_ENTRIES = 30
+KEY_TERMS_MAX = 20
+# Fallback chat context when Azure AI Search is unavailable
+FALLBACK_MAX_DOCUMENTS = 5
+FALLBACK_MAX_CONTEXT_CHARS = 3000
+# Digests built on demand per request, for documents uploaded before digests existed
+FALLBACK_MAX_DIGEST_BUILDS = 3
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])')
+# Markdown headings, numbered headings ("2.1 Cell membranes"), and chapter/section lines
+HEADING_PATTERNS = [
+    re.compile(r'^#{1,6}\s+(.+)$'),
+    re.compile(r'^(\d+(?:\.\d+)*\.?\s+[A-Z].{2,78})$'),
+    re.compile(r'^((?:chapter|section|part|unit|lecture|module)\s+[\w.]+.{0,70})$', re.IGNORECASE),
+]
+MIN_SENTENCE_CHARS = 40
+MAX_SENTENCE_CHARS = 400
+
+def _heading(line: str) -> Optional[str]:
+    """The heading text if a (stripped) line is a heading, otherwise None"""
+    if not line or len(line) > 80:
+        return None
+    for pattern in HEADING_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            return match.group(1).strip()
+    # Short all-caps lines ("INTRODUCTION") are headings in most slide decks and handouts
+    if line.isupper() and 3 <= len(line) <= 60 and any(char.isalpha() for char in line):
+        return line.title()
+    return None
+
+def extract_toc(text: str, max_entries: int = TOC_MAX_ENTRIES) -> List[str]:
+    """
+    Find the headings of a document
+
+    Args:
+        text: Extracted document text
+        max_entries: Maximum number of headings returned
+
+    Returns:
+        Headings in document order
+    """
+    toc = []
+    seen = set()
+    for line in text.splitlines():
+        heading = _heading(line.strip())
+        if heading and heading.lower() not in seen:
+            seen.add(heading.lower())
+            toc.append(heading)
+            if len(toc) >= max_entries:
+                break
+    return toc
+
+def extract_key_terms(text: str, max_terms: int = KEY_TERMS_MAX) -> List[str]:
+    """
+    Find the most characteristic terms and two-word phrases of a document
+
+    Args:
+        text: Extracted document text
+        max_terms: Maximum number of terms returned
+
+    Returns:
+        Key terms, most frequent first
+    """
+    tokens = tokenize(text, min_length=4)
+    if not tokens:
+        return []
+    # Count stems but report the most common surface form of each
+    stems = [stem(token) for token in tokens]
+    stem_counts = Counter(stems)
+    surface_forms = {}
+    for token, token_stem in zip(tokens, stems):
+        surface_forms.setdefault(token_stem, Counter())[token] += 1
+
+    phrase_counts = Counter(f"{first} {second}" for first, second in zip(tokens, tokens[1:]) if first != second)
+    # A phrase is only a key term if it recurs, it then replaces its single words
+    phrases = [(phrase, count) for phrase, count in phrase_counts.most_common(max_terms) if count >= 3]
+
+    terms = []
+    covered = set()
+    for phrase, count in phrases[:max_terms // 3]:
+        terms.append((phrase, count * 2))
+        covered.update(stem(word) for word in phrase.split())
+    for token_stem, count in stem_counts.most_common():
+        if len(terms) >= max_terms * 2:
+            break
+        if token_stem not in covered:
+            terms.append((surface_forms[token_stem].most_common(1)[0][0], count))
+    terms.sort(key=lambda item: item[1], reverse=True)
+    return [term for term, _ in terms[:max_terms]]
+
+def summarize_extractive(text: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """
+    Summarize a document by its most representative sentences
+
+    Sentences are scored by the average document frequency of their terms and the
+    best ones are returned in document order.
+
+    Args:
+        text: Extracted document text
+        max_chars: Maximum length of the summary
+
+    Returns:
+        Summary text
+    """
+    # Headings are in the table of contents already and would run into the following sentence
+    body = ' '.join(line for line in text.splitlines() if _heading(line.strip()) is None)
+    sentences = []
+    seen = set()
+    for sentence in SENTENCE_PATTERN.split(' '.join(body.split())):
+        sentence = sentence.strip()
+        # Repeated sentences (slide footers, running headers) would crowd out the rest
+        if MIN_SENTENCE_CHARS <= len(sentence) <= MAX_SENTENCE_CHARS and sentence.lower() not in seen:
+            seen.add(sentence.lower())
+            sentences.append(sentence)
+    if not sentences:
+        return ' '.join(text.split())[:max_chars]
+
+    frequencies = Counter(stem(token) for token in tokenize(text))
+    scored = []
+    for index, sentence in enumerate(sentences):
+        terms = [stem(token) for token in tokenize(sentence)]
+        if not terms:
+            continue
+        score = sum(frequencies[term] for term in set(terms)) / (len(terms) ** 0.5)
+        # Opening sentences usually state what a document is about
+        if index < 3:
+            score *= 1.2
+        scored.append((score, index, sentence))
+
+    chosen = []
+    length = 0
+    for score, index, sentence in sorted(scored, reverse=True):
+        if length + len(sentence) + 1 > max_chars:
+            continue
+        chosen.append((index, sentence))
+        length += len(sentence) + 1
+    return ' '.join(sentence for _, sentence in sorted(chosen))
+
+def build_digest(text: str) -> Dict[str, Any]:
+    """
+    Build the digest of a document
+
+    Args:
+        text: Extracted document text
+
+    Returns:
+        Dictionary with summary, toc, key_terms, char_count, version and created_at
+    """
+    return {
+        'summary': summarize_extractive(text),
+        'toc': extract_toc(text),
+        'key_terms': extract_key_terms(text),
+        'char_count': len(text),
+        'version': DIGEST_VERSION,
+        'created_at': datetime.datetime.utcnow()
+    }
+
+def has_current_digest(doc: Dict[str, Any]) -> bool:
+    """Whether a document has a digest in the current format"""
+    digest = doc.get('digest')
+    return bool(digest) and digest.get('version') == DIGEST_VERSION
+
+def get_or_build_digest(doc: Dict[str, Any], file_path: str, mongo_client=None) -> Optional[Dict[str, Any]]:
+    """
+    Get a document's digest, building (and storing) it from the file if it is missing or outdated
+
+    Documents uploaded before digests existed get theirs on first use this way.
+
+    Args:
+        doc: Document metadata from MongoDB
+        file_path: Path of the uploaded file
+        mongo_client: MongoDBClient to store a newly built digest with (not stored if None)
+
+    Returns:
+        The digest, or None if no text could be extracted
+    """
+    if has_current_digest(doc):
+        return doc['digest']
+
+    from document_processor import extract_document_text
+
+    text = extract_document_text(file_path)
+    if not text:
+        return None
+    digest = build_digest(text)
+    if mongo_client is not None and doc.get('_id'):
+        mongo_client.set_document_digest(doc['_id'], digest)
+    doc['digest'] = digest
+    return digest
+
+def format_digest(digest: Dict[str, Any], max_toc: int = 15, max_terms: int = 15) -> str:
+    """
+    Render a digest as prompt context
+
+    Args:
+        digest: Digest from build_digest
+        max_toc: Maximum number of headings included
+        max_terms: Maximum number of key terms included
+
+    Returns:
+        Text with the summary, contents and key terms
+    """
+    parts = []
+    if digest.get('summary'):
+        parts.append(f"Summary: {digest['summary']}")
+    if digest.get('toc'):
+        parts.append("Contents: " + '; '.join(digest['toc'][:max_toc]))
+    if digest.get('key_terms'):
+        parts.append("Key terms: " + ', '.join(digest['key_terms'][:max_terms]))
+    return '\n'.join(parts)
+
+def digest_relevance(digest: Dict[str, Any], query: str) -> int:
+    """
+    Number of query terms found in a digest's headings and key terms
+
+    Args:
+        digest: Digest from build_digest
+        query: The user's question
+
+    Returns:
+        Overlap count (higher is more relevant)
+    """
+    query_terms = {stem(token) for token in tokenize(query)}
+    digest_terms = {stem(token) for token in tokenize(' '.join(digest.get('toc', []) + digest.get('key_terms', [])))}
+    return len(query_terms & digest_terms)
@@ -3,11 +3,16 @@ document_processor.py - Utility functions for processing uploaded documents
 """
 
 import os
+import io
+import base64
+import binascii
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional
-import pdfplumber
-from docx import Document
-import markdown
+import threading
+import zipfile
+from xml.etree import ElementTree
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Union, BinaryIO, Tuple
 import re
 from pathlib import Path
 import warnings
@@ -16,105 +21,327 @@ import warnings
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# pdfplumber is imported by its extractor, so importing this module does not
+# load a PDF parser in workers that never see a PDF. DOCX and Markdown are
+# parsed with the standard library (zipfile, ElementTree, re)
+
 # Suppress specific pdfminer warnings
 warnings.filterwarnings("ignore", category=UserWarning, module='pdfminer.pdfpage')
 
-def extract_text_from_pdf(file_path: str) -> str:
+# A document can be given as a path, raw bytes or an open binary file-like object
+DocumentSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+# Base64 characters decoded per step when streaming (must be a multiple of 4)
+BASE64_DECODE_CHUNK_SIZE = 4 * 64 * 1024
+# Limits of the in-process cache of extracted text, keyed by content hash
+EXTRACTION_CACHE_MAX_ENTRIES = 64
+EXTRACTION_CACHE_MAX_CHARS = 20 * 1024 * 1024
+
+def _describe(source: DocumentSource) -> str:
+    """Describe a document source for log messages"""
+    if isinstance(source, (str, os.PathLike)):
+        return str(source)
+    return getattr(source, 'name', None) or f'<{type(source).__name__}>'
+
+def _as_binary_stream(source: DocumentSource) -> Union[str, os.PathLike, BinaryIO]:
+    """Wrap in-memory bytes in a file-like object; paths and streams are passed through"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+def _read_text(source: DocumentSource) -> str:
+    """Read a text document from a path, bytes or a binary stream"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'r', encoding='utf-8', errors='replace') as file:
+            return file.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source).decode('utf-8', errors='replace')
+    source.seek(0)
+    return source.read().decode('utf-8', errors='replace')
+
+def extract_text_from_pdf(file_path: DocumentSource) -> str:
     """
     Extract text content from a PDF file
 
     Args:
-        file_path: Path to the PDF file
+        file_path: Path to the PDF file, or its content as bytes or a binary stream
 
     Returns:
         Extracted text as a string
     """
     try:
+        import pdfplumber
+
         text_content = []
-        with pdfplumber.open(file_path) as pdf:
+        with pdfplumber.open(_as_binary_stream(file_path)) as pdf:
             for page in pdf.pages:
                 text = page.extract_text()
                 if text:
                     text_content.append(text)
         return "\n\n".join(text_content)
     except Exception as e:
-        logger.error(f"Error extracting text from PDF {file_path}: {str(e)}")
+        logger.error(f"Error extracting text from PDF {_describe(file_path)}: {str(e)}")
         return f"Error processing PDF: {str(e)}"
 
-def extract_text_from_docx(file_path: str) -> str:
+# WordprocessingML namespace of the elements in word/document.xml
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_PARAGRAPH = WORD_NAMESPACE + 'p'
+W_TEXT = WORD_NAMESPACE + 't'
+W_TAB = WORD_NAMESPACE + 'tab'
+W_BREAKS = (WORD_NAMESPACE + 'br', WORD_NAMESPACE + 'cr')
+W_TABLE_ROW = WORD_NAMESPACE + 'tr'
+W_TABLE_CELL = WORD_NAMESPACE + 'tc'
+W_VAL = WORD_NAMESPACE + 'val'
+HEADING_STYLE_PATTERN = re.compile(r'^(?:heading|title)\s*(\d?)$', re.IGNORECASE)
+
+def _docx_heading_level(paragraph) -> int:
+    """Heading level of a w:p element from its style or outline level (0 for body text)"""
+    properties = paragraph.find(WORD_NAMESPACE + 'pPr')
+    if properties is None:
+        return 0
+    outline = properties.find(WORD_NAMESPACE + 'outlineLvl')
+    if outline is not None and (outline.get(W_VAL) or '').isdigit():
+        # Level 9 is body text
+        level = int(outline.get(W_VAL)) + 1
+        return level if level <= 9 else 0
+    style = properties.find(WORD_NAMESPACE + 'pStyle')
+    match = HEADING_STYLE_PATTERN.match(style.get(W_VAL) or '') if style is not None else None
+    if match is None:
+        return 0
+    return int(match.group(1)) if match.group(1) else 1
+
+def _docx_main_part(archive: zipfile.ZipFile) -> str:
+    """Name of the main document part, found through the package relationships if not the usual one"""
+    if 'word/document.xml' in archive.namelist():
+        return 'word/document.xml'
+    relationships = ElementTree.fromstring(archive.read('_rels/.rels'))
+    for relationship in relationships:
+        if relationship.get('Type', '').endswith('/officeDocument'):
+            return relationship.get('Target', '').lstrip('/')
+    raise KeyError("No main document part in the DOCX package")
+
+def extract_text_from_docx(file_path: DocumentSource) -> str:
     """
     Extract text content from a DOCX file
 
+    Streams word/document.xml out of the archive with iterparse instead of
+    building the python-docx object model, whose row.cells re-resolves merged
+    cells and is quadratic on large tables. Tables stay where they are in the
+    document (one line per row, cells separated by " | ") and headings are
+    marked like markdown headings, so the table of contents can be found.
+
     Args:
-        file_path: Path to the DOCX file
+        file_path: Path to the DOCX file, or its content as bytes or a binary stream
 
     Returns:
         Extracted text as a string
     """
     try:
-        doc = Document(file_path)
         text_content = []
-
-        for para in doc.paragraphs:
-            if para.text:
-                text_content.append(para.text)
-
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = []
-                for cell in row.cells:
-                    if cell.text:
-                        row_text.append(cell.text)
-                if row_text:
-                    text_content.append(" | ".join(row_text))
+        # Text of the open paragraphs (text boxes nest paragraphs), cells and rows
+        paragraphs = []
+        cells = []
+        rows = []
+
+        with zipfile.ZipFile(_as_binary_stream(file_path)) as archive:
+            with archive.open(_docx_main_part(archive)) as document_xml:
+                for event, element in ElementTree.iterparse(document_xml, events=('start', 'end')):
+                    tag = element.tag
+                    if event == 'start':
+                        if tag == W_PARAGRAPH:
+                            paragraphs.append([])
+                        elif tag == W_TABLE_CELL:
+                            cells.append([])
+                        elif tag == W_TABLE_ROW:
+                            rows.append([])
+                        continue
+
+                    if tag == W_TEXT:
+                        if paragraphs and element.text:
+                            paragraphs[-1].append(element.text)
+                    elif tag == W_TAB:
+                        if paragraphs:
+                            paragraphs[-1].append('\t')
+                    elif tag in W_BREAKS:
+                        if paragraphs:
+                            paragraphs[-1].append('\n')
+                    elif tag == W_PARAGRAPH:
+                        text = ''.join(paragraphs.pop()).strip()
+                        if text:
+                            level = _docx_heading_level(element)
+                            if level:
+                                text = f"{'#' * level} {text}"
+                            (cells[-1] if cells else text_content).append(text)
+                        element.clear()
+                    elif tag == W_TABLE_CELL:
+                        # Cells merged horizontally appear once; cells continuing a vertical merge are empty
+                        rows[-1].append(' '.join(cells.pop()))
+                        element.clear()
+                    elif tag == W_TABLE_ROW:
+                        row_text = [cell for cell in rows.pop() if cell]
+                        if row_text:
+                            (cells[-1] if cells else text_content).append(" | ".join(row_text))
+                        element.clear()
 
         return "\n\n".join(text_content)
     except Exception as e:
-        logger.error(f"Error extracting text from DOCX {file_path}: {str(e)}")
+        logger.error(f"Error extracting text from DOCX {_describe(file_path)}: {str(e)}")
         return f"Error processing DOCX: {str(e)}"
 
-def extract_text_from_txt(file_path: str) -> str:
+def extract_text_from_txt(file_path: DocumentSource) -> str:
     """
     Extract text content from a TXT file
 
     Args:
-        file_path: Path to the TXT file
+        file_path: Path to the TXT file, or its content as bytes or a binary stream
 
     Returns:
         Extracted text as a string
     """
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-            return file.read()
+        return _read_text(file_path)
     except Exception as e:
-        logger.error(f"Error extracting text from TXT {file_path}: {str(e)}")
+        logger.error(f"Error extracting text from TXT {_describe(file_path)}: {str(e)}")
         return f"Error processing TXT: {str(e)}"
 
-def extract_text_from_markdown(file_path: str) -> str:
+# Block-level markdown syntax, matched at the start of a line
+MD_FENCE_PATTERN = re.compile(r'^\s{0,3}(`{3,}|~{3,})')
+MD_HEADING_PATTERN = re.compile(r'^\s{0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$')
+MD_SETEXT_UNDERLINE_PATTERN = re.compile(r'^\s{0,3}(?:=+|-+)\s*$')
+MD_RULE_PATTERN = re.compile(r'^\s{0,3}(?:(?:\*\s*){3,}|(?:-\s*){3,}|(?:_\s*){3,})$')
+MD_BLOCKQUOTE_PATTERN = re.compile(r'^\s{0,3}(?:>\s?)+')
+MD_LIST_PATTERN = re.compile(r'^(\s*)(?:[-*+]|\d{1,9}[.)])\s+(?:\[[ xX]\]\s+)?')
+MD_TABLE_DELIMITER_PATTERN = re.compile(r'^\s*\|?\s*:?-{3,}:?\s*(?:\|\s*:?-{3,}:?\s*)*\|?\s*$')
+MD_REFERENCE_DEFINITION_PATTERN = re.compile(r'^\s{0,3}\[[^\]]+\]:\s+\S+')
+# Inline markdown syntax
+MD_IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\([^)]*\)')
+MD_LINK_PATTERN = re.compile(r'\[([^\]]+)\](?:\([^)]*\)|\[[^\]]*\])')
+MD_AUTOLINK_PATTERN = re.compile(r'<((?:https?|mailto):[^>\s]+)>')
+MD_HTML_TAG_PATTERN = re.compile(r'</?[A-Za-z][^>]*>')
+MD_CODE_SPAN_PATTERN = re.compile(r'(`+)(.+?)\1')
+MD_EMPHASIS_PATTERN = re.compile(r'(\*{1,3}|~~)(?=\S)(.+?)(?<=\S)\1')
+# Underscores only delimit emphasis at word boundaries, so snake_case names stay intact
+MD_UNDERSCORE_EMPHASIS_PATTERN = re.compile(r'(?<!\w)(_{1,3})(?=\S)(.+?)(?<=\S)\1(?!\w)')
+MD_ESCAPE_PATTERN = re.compile(r'\\([\\`*_{}\[\]()#+\-.!|>~])')
+MD_LITERAL_PATTERN = re.compile('\x00(\\d+)\x00')
+
+def _markdown_inline_to_text(line: str) -> str:
+    """Strip the inline markdown syntax of a line, keeping the text"""
+    literals = []
+
+    def keep_literal(text):
+        # Code spans and escaped characters are taken literally, emphasis must not match inside them
+        literals.append(text)
+        return f"\x00{len(literals) - 1}\x00"
+
+    # Most lines of a syllabus are plain text, only run the patterns whose syntax occurs in the line
+    if '`' in line:
+        line = MD_CODE_SPAN_PATTERN.sub(lambda match: keep_literal(match.group(2).strip()), line)
+    if '\\' in line:
+        line = MD_ESCAPE_PATTERN.sub(lambda match: keep_literal(match.group(1)), line)
+    if '[' in line:
+        line = MD_IMAGE_PATTERN.sub(r'\1', line)
+        line = MD_LINK_PATTERN.sub(r'\1', line)
+    if '<' in line:
+        line = MD_AUTOLINK_PATTERN.sub(r'\1', line)
+        line = MD_HTML_TAG_PATTERN.sub('', line)
+    if '*' in line or '~' in line:
+        line = MD_EMPHASIS_PATTERN.sub(r'\2', line)
+    if '_' in line:
+        line = MD_UNDERSCORE_EMPHASIS_PATTERN.sub(r'\2', line)
+    if literals:
+        line = MD_LITERAL_PATTERN.sub(lambda match: literals[int(match.group(1))], line)
+    return line
+
+def markdown_to_text(md_content: str) -> str:
     """
-    Extract text content from a Markdown file
+    Convert markdown to plain text in one pass over its lines
+
+    Headings ("## Text"), list items and paragraphs keep their own lines, table
+    rows become "cell | cell" lines, code blocks are kept verbatim, and links,
+    images, emphasis, inline HTML and escapes are reduced to their text.
 
     Args:
-        file_path: Path to the Markdown file
+        md_content: Markdown source
 
     Returns:
-        Extracted text as a string (with markdown formatting removed)
+        Plain text
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-            md_content = file.read()
+    lines = []
+    fence = None
+    for line in md_content.splitlines():
+        # Block syntax is recognized by the first character, so plain lines skip the patterns
+        first = line.lstrip()[:1]
+        if fence is not None:
+            # Inside a fenced code block until the matching closing fence
+            match = MD_FENCE_PATTERN.match(line) if first == fence[0] else None
+            if match and len(match.group(1)) >= len(fence):
+                fence = None
+            else:
+                lines.append(line)
+            continue
+        if first in ('`', '~'):
+            match = MD_FENCE_PATTERN.match(line)
+            if match:
+                fence = match.group(1)
+                continue
+
+        if first in ('*', '-', '_', '=', '[', '|', ':'):
+            if MD_RULE_PATTERN.match(line) or MD_REFERENCE_DEFINITION_PATTERN.match(line):
+                continue
+            if MD_SETEXT_UNDERLINE_PATTERN.match(line) and lines and lines[-1]:
+                # The line above is a heading
+                continue
+            if MD_TABLE_DELIMITER_PATTERN.match(line) and '-' in line and lines and '|' in lines[-1]:
+                continue
+
+        if first == '>':
+            line = MD_BLOCKQUOTE_PATTERN.sub('', line)
+            first = line.lstrip()[:1]
+        if first == '#':
+            heading = MD_HEADING_PATTERN.match(line)
+            if heading:
+                # Normalized to "## Text" like DOCX headings, so the table of contents can be found
+                line = f"{heading.group(1)} {heading.group(2)}"
+        elif first in ('-', '*', '+') or first.isdigit():
+            line = MD_LIST_PATTERN.sub(r'\1', line)
+
+        stripped = line.strip()
+        if '|' in stripped and (stripped.startswith('|') or stripped.endswith('|') or
+                                (stripped.count('|') >= 2 and '`' not in stripped)):
+            cells = [_markdown_inline_to_text(cell).strip() for cell in stripped.strip('|').split('|')]
+            line = " | ".join(cell for cell in cells if cell)
+        else:
+            line = _markdown_inline_to_text(line.rstrip())
+        lines.append(line)
 
-        # Convert markdown to HTML
-        html_content = markdown.markdown(md_content)
+    return "\n".join(lines)
 
-        # Remove HTML tags
-        clean_text = re.sub(r'<[^>]*>', '', html_content)
+def extract_text_from_markdown(file_path: DocumentSource) -> str:
+    """
+    Extract text content from a Markdown file
 
-        return clean_text
+    Args:
+        file_path: Path to the Markdown file, or its content as bytes or a binary stream
+
+    Returns:
+        Extracted text as a string (with markdown formatting removed)
+    """
+    try:
+        return markdown_to_text(_read_text(file_path))
     except Exception as e:
-        logger.error(f"Error extracting text from Markdown {file_path}: {str(e)}")
+        logger.error(f"Error extracting text from Markdown {_describe(file_path)}: {str(e)}")
         return f"Error processing Markdown: {str(e)}"
 
+EXTRACTORS = {
+    '.pdf': extract_text_from_pdf,
+    '.docx': extract_text_from_docx,
+    '.txt': extract_text_from_txt,
+    '.md': extract_text_from_markdown
+}
+
 def extract_document_text(file_path: str) -> Optional[str]:
     """
     Extract text from a document based on its file extension
@@ -126,18 +353,110 @@ def extract_document_text(file_path: str) -> Optional[str]:
         Extracted text as a string or None if the file type is not supported
     """
     file_extension = Path(file_path).suffix.lower()
+    extractor = EXTRACTORS.get(file_extension)
 
-    if file_extension == '.pdf':
-        return extract_text_from_pdf(file_path)
-    elif file_extension == '.docx':
-        return extract_text_from_docx(file_path)
-    elif file_extension == '.txt':
-        return extract_text_from_txt(file_path)
-    elif file_extension == '.md':
-        return extract_text_from_markdown(file_path)
-    else:
+    if extractor is None:
         logger.warning(f"Unsupported file type: {file_extension}")
         return None
+    return extractor(file_path)
+
+class ExtractionCache:
+    """Thread-safe LRU cache of extracted document text keyed by content hash"""
+
+    def __init__(self, max_entries: int = EXTRACTION_CACHE_MAX_ENTRIES, max_chars: int = EXTRACTION_CACHE_MAX_CHARS):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(content_hash)
+            if text is not None:
+                self._entries.move_to_end(content_hash)
+            return text
+
+    def put(self, content_hash: str, text: str) -> None:
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            previous = self._entries.pop(content_hash, None)
+            if previous is not None:
+                self._chars -= len(previous)
+            self._entries[content_hash] = text
+            self._chars += len(text)
+            while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+
+extraction_cache = ExtractionCache()
+
+def decode_base64_content(base64_data: str) -> Tuple[io.BytesIO, str]:
+    """
+    Decode base64 (optionally a data URI) chunk by chunk into a buffer, hashing as it goes
+
+    Decoding in slices avoids building a stripped copy of the whole encoded string
+    and a second copy of the decoded bytes.
+
+    Args:
+        base64_data: Base64-encoded content, optionally prefixed with "data:...;base64,"
+
+    Returns:
+        Tuple of (buffer positioned at the start, SHA-256 hex digest of the content)
+    """
+    # Skip the data URI prefix if present
+    start = base64_data.index(',') + 1 if base64_data.startswith('data:') else 0
+
+    buffer = io.BytesIO()
+    digest = hashlib.sha256()
+    try:
+        for offset in range(start, len(base64_data), BASE64_DECODE_CHUNK_SIZE):
+            chunk = base64.b64decode(base64_data[offset:offset + BASE64_DECODE_CHUNK_SIZE], validate=True)
+            buffer.write(chunk)
+            digest.update(chunk)
+    except binascii.Error:
+        # Embedded whitespace breaks chunk alignment, decode the payload in one go instead
+        data = base64.b64decode(base64_data[start:])
+        buffer = io.BytesIO(data)
+        digest = hashlib.sha256(data)
+
+    buffer.seek(0)
+    return buffer, digest.hexdigest()
+
+def extract_text_from_buffer(data: DocumentSource, file_name: str, content_hash: Optional[str] = None) -> Optional[str]:
+    """
+    Extract text from an in-memory document, reusing earlier extractions of the same content
+
+    Args:
+        data: Document content as bytes, memoryview or a binary stream
+        file_name: Original file name, used to pick the extractor
+        content_hash: SHA-256 hex digest of the content if already known
+
+    Returns:
+        Extracted text as a string or None if the file type is not supported
+    """
+    extractor = EXTRACTORS.get(Path(file_name).suffix.lower())
+    if extractor is None:
+        logger.warning(f"Unsupported file type: {file_name}")
+        return None
+
+    if content_hash is None:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            content_hash = hashlib.sha256(data).hexdigest()
+        else:
+            content_hash = hashlib.sha256(data.getbuffer() if isinstance(data, io.BytesIO) else data.read()).hexdigest()
+    cache_key = f"{content_hash}:{Path(file_name).suffix.lower()}"
+
+    cached_text = extraction_cache.get(cache_key)
+    if cached_text is not None:
+        logger.info(f"Reusing cached extraction for {file_name}")
+        return cached_text
+
+    text = extractor(data)
+    if text and not text.startswith("Error"):
+        extraction_cache.put(cache_key, text)
+    return text
 
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
     """
@@ -184,7 +503,7 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[st
     return chunks
 
 def prepare_document_for_indexing(doc_info: Dict[str, Any], subject_name: str,
-                                  file_path: str) -> List[Dict[str, Any]]:
+                                  file_path: str, document_text: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Prepare document for indexing in Azure AI Search
 
@@ -192,13 +511,15 @@ def prepare_document_for_indexing(doc_info: Dict[str, Any], subject_name: str,
         doc_info: Document information dictionary
         subject_name: Name of the subject
         file_path: Path to the document file
+        document_text: Text already extracted from the file (extracted here if None)
 
     Returns:
         List of document chunks ready for indexing
     """
     try:
         # Extract text from document
-        document_text = extract_document_text(file_path)
+        if document_text is None:
+            document_text = extract_document_text(file_path)
 
         if not document_text:
             logger.warning(f"No text could be extracted from {file_path}")
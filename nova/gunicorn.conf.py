@@ -0,0 +1,24 @@
+"""
+gunicorn.conf.py - Gunicorn settings for Nova
+
+Run from the nova directory with: gunicorn -c gunicorn.conf.py
+"""
+
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+def post_fork(server, worker):
+    """Warm up the worker's services (MongoDB, Azure AI Search, HTTP pool) before it takes traffic"""
+    from app import app
+
+    services = app.extensions['services']
+    # With preload_app the services may have been created in the master, never share them across a fork
+    services.reset()
+    if app.config['WARM_UP_ON_START']:
+        # In the background, so the worker answers /healthz (and /readyz with 503) while connecting
+        services.start_warm_up(app.config['WARM_UP_SERVICES'])
+        server.log.info(f"Worker {worker.pid} warming up: {', '.join(app.config['WARM_UP_SERVICES'])}")
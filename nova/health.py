@@ -0,0 +1,28 @@
+"""
+health.py - Liveness, readiness and cache metrics endpoints for load balancers and monitoring
+"""
+
+from flask import Blueprint, current_app, jsonify
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz')
+def liveness():
+    """The worker process is up and answering requests"""
+    return jsonify({"status": "ok"})
+
+@health_bp.route('/readyz')
+def readiness():
+    """The worker has finished warming up and its required services are usable"""
+    result = current_app.extensions['services'].readiness()
+    return jsonify(result), (200 if result['ready'] else 503)
+
+@health_bp.route('/metrics/caches')
+def cache_metrics():
+    """Hit rates of the in-process caches of this worker"""
+    services = current_app.extensions['services']
+    metrics = {}
+    for name in ('search_cache', 'response_cache'):
+        cache = services.peek(name)
+        metrics[name] = cache.stats() if cache is not None else None
+    return jsonify(metrics)
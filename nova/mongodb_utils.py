@@ -4,10 +4,10 @@ mongodb_utils.py - MongoDB Atlas integration module for the Student AI Assistant
 
 import logging
 import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Set
 from pymongo import MongoClient
 from pymongo.collection import Collection
-from pymongo.errors import ConnectionFailure, PyMongoError
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, PyMongoError
 from bson.objectid import ObjectId
 
 # Configure logging
@@ -80,6 +80,22 @@ class MongoDBClient:
 
         return self.db[collection_name]
 
+    def ping(self) -> bool:
+        """
+        Check that MongoDB is reachable, reconnecting if needed
+
+        Returns:
+            True if the server answered, False otherwise
+        """
+        if not self.connected:
+            return self.connect()
+        try:
+            self.client.admin.command('ping')
+            return True
+        except PyMongoError as e:
+            logger.error(f"MongoDB ping failed: {str(e)}")
+            return False
+
     def close(self):
         """Close MongoDB connection"""
         if self.client:
@@ -288,6 +304,29 @@ class MongoDBClient:
             logger.error(f"Failed to get subject {subject_id}: {str(e)}")
             return None
 
+    def bump_subject_documents_version(self, subject_id: str) -> bool:
+        """
+        Increment the documents version of a subject so caches derived from its
+        documents (e.g. cached chat responses) are invalidated in every worker
+
+        Args:
+            subject_id: Subject ID
+
+        Returns:
+            True if the subject was updated, False otherwise
+        """
+        try:
+            collection = self.get_collection('subjects')
+            if collection is None:
+                return False
+
+            result = collection.update_one({'_id': ObjectId(subject_id)}, {'$inc': {'documents_version': 1}})
+            return result.modified_count > 0
+
+        except PyMongoError as e:
+            logger.error(f"Failed to bump documents version for subject {subject_id}: {str(e)}")
+            return False
+
     # Document metadata operations
 
     def add_document_metadata(self, document_data: Dict[str, Any]) -> Optional[str]:
@@ -318,6 +357,29 @@ class MongoDBClient:
             logger.error(f"Failed to add document metadata: {str(e)}")
             return None
 
+    def set_document_digest(self, document_id: str, digest: Dict[str, Any]) -> bool:
+        """
+        Store the digest (summary, table of contents, key terms) of a document
+
+        Args:
+            document_id: Document ID
+            digest: Digest from document_digest.build_digest
+
+        Returns:
+            True if the document was updated, False otherwise
+        """
+        try:
+            collection = self.get_collection('documents')
+            if collection is None:
+                return False
+
+            result = collection.update_one({'_id': ObjectId(document_id)}, {'$set': {'digest': digest}})
+            return result.matched_count > 0
+
+        except PyMongoError as e:
+            logger.error(f"Failed to store digest of document {document_id}: {str(e)}")
+            return False
+
     def get_subject_documents(self, subject_id: str, user_id: str = None) -> List[Dict[str, Any]]:
         """
         Get documents for a specific subject, optionally filtered by user ID
@@ -351,6 +413,55 @@ class MongoDBClient:
             logger.error(f"Failed to get documents for subject {subject_id}: {str(e)}")
             return []
 
+    def iter_documents(self, subject_id: str = None, after_id: str = None,
+                       batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Stream document metadata in _id order, e.g. for rebuilding the search index
+
+        Args:
+            subject_id: Optional subject ID to filter by
+            after_id: Only documents with a greater _id (to resume an interrupted run)
+            batch_size: Number of documents fetched from the server per round trip
+
+        Returns:
+            Iterator of document metadata dictionaries
+        """
+        collection = self.get_collection('documents')
+        if collection is None:
+            return
+
+        query = {}
+        if subject_id:
+            query['subject_id'] = subject_id
+        if after_id:
+            query['_id'] = {'$gt': ObjectId(after_id)}
+
+        for doc in collection.find(query).sort('_id', 1).batch_size(batch_size):
+            doc['_id'] = str(doc['_id'])
+            yield doc
+
+    def get_document_ids(self, subject_id: str = None) -> Optional[Set[str]]:
+        """
+        Get the IDs of all stored documents
+
+        Args:
+            subject_id: Optional subject ID to filter by
+
+        Returns:
+            Set of document IDs, or None if they could not be read
+        """
+        try:
+            collection = self.get_collection('documents')
+            if collection is None:
+                return None
+
+            query = {'subject_id': subject_id} if subject_id else {}
+            return {str(doc['_id']) for doc in collection.find(query, {'_id': 1})}
+
+        except PyMongoError as e:
+            logger.error(f"Failed to get document IDs: {str(e)}")
+            return None
+
     def get_document_by_id(self, document_id: str, user_id: str = None) -> Optional[Dict[str, Any]]:
         """
         Get a document by ID, optionally verifying user ownership
@@ -416,6 +527,134 @@ class MongoDBClient:
             logger.error(f"Failed to delete document {document_id}: {str(e)}")
             return False
 
+    # Subject digest operations (see subject_digest.py)
+
+    def get_subject_digest(self, subject_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the knowledge digest of a subject
+
+        Args:
+            subject_id: Subject ID
+
+        Returns:
+            Subject digest record if found, None otherwise
+        """
+        try:
+            collection = self.get_collection('subject_digests')
+            if collection is None:
+                return None
+
+            return collection.find_one({'_id': subject_id})
+
+        except PyMongoError as e:
+            logger.error(f"Failed to get digest of subject {subject_id}: {str(e)}")
+            return None
+
+    def add_document_to_subject_digest(self, subject_id: str, document_id: str, entry: Dict[str, Any],
+                                       digest_format: int) -> bool:
+        """
+        Fold a document into a subject's digest (creating the digest for the first document)
+
+        Only the document's own entry and term weights are written, the update is
+        conditional on the document not being in the digest yet so it is never
+        counted twice.
+
+        Args:
+            subject_id: Subject ID
+            document_id: Document ID
+            entry: Document map entry from subject_digest.document_entry
+            digest_format: Format of the subject digest record
+
+        Returns:
+            True if the digest was updated, False otherwise
+        """
+        try:
+            collection = self.get_collection('subject_digests')
+            if collection is None:
+                return False
+
+            increments = {'version': 1}
+            for term, weight in entry.get('term_weights', {}).items():
+                increments[f'term_weights.{term}'] = weight
+            collection.update_one(
+                {'_id': subject_id, f'documents.{document_id}': {'$exists': False}},
+                {
+                    '$set': {f'documents.{document_id}': entry, 'updated_at': datetime.datetime.utcnow()},
+                    '$setOnInsert': {'format': digest_format},
+                    '$inc': increments
+                },
+                upsert=True
+            )
+            return True
+
+        except DuplicateKeyError:
+            # The digest exists and already covers the document, so the upsert tried to insert a second one
+            return False
+        except PyMongoError as e:
+            logger.error(f"Failed to add document {document_id} to digest of subject {subject_id}: {str(e)}")
+            return False
+
+    def remove_document_from_subject_digest(self, subject_id: str, document_id: str) -> bool:
+        """
+        Fold a document out of a subject's digest
+
+        Args:
+            subject_id: Subject ID
+            document_id: Document ID
+
+        Returns:
+            True if the digest was updated, False otherwise
+        """
+        try:
+            collection = self.get_collection('subject_digests')
+            if collection is None:
+                return False
+
+            record = collection.find_one({'_id': subject_id}, {f'documents.{document_id}': 1})
+            entry = ((record or {}).get('documents') or {}).get(document_id)
+            if entry is None:
+                return False
+
+            increments = {'version': 1}
+            for term, weight in entry.get('term_weights', {}).items():
+                increments[f'term_weights.{term}'] = -weight
+            # Conditional on the entry still being there, so concurrent removals subtract the weights once
+            result = collection.update_one(
+                {'_id': subject_id, f'documents.{document_id}': {'$exists': True}},
+                {
+                    '$unset': {f'documents.{document_id}': ''},
+                    '$set': {'updated_at': datetime.datetime.utcnow()},
+                    '$inc': increments
+                }
+            )
+            return result.modified_count > 0
+
+        except PyMongoError as e:
+            logger.error(f"Failed to remove document {document_id} from digest of subject {subject_id}: {str(e)}")
+            return False
+
+    def delete_subject_digest(self, subject_id: str) -> bool:
+        """
+        Delete the knowledge digest of a subject
+
+        Args:
+            subject_id: Subject ID
+
+        Returns:
+            True if a digest was deleted, False otherwise
+        """
+        try:
+            collection = self.get_collection('subject_digests')
+            if collection is None:
+                return False
+
+            result = collection.delete_one({'_id': subject_id})
+            return result.deleted_count > 0
+
+        except PyMongoError as e:
+            logger.error(f"Failed to delete digest of subject {subject_id}: {str(e)}")
+            return False
+
     # Journal operations
 
     def add_user_journal_entry(self, entry_data: Dict[str, Any]) -> Optional[str]:
@@ -0,0 +1,154 @@
+"""
+prompt_builder.py - Token-budgeted assembly of chat prompts for Azure OpenAI
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional, fall back to a character heuristic
+    tiktoken = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rough number of characters per token for English text when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Sections that would be cut below this many tokens are dropped instead
+MIN_SECTION_TOKENS = 50
+TRUNCATION_MARKER = "\n[... content truncated to fit the context window ...]\n"
+
+_encoding = None
+
+def _get_encoding():
+    """Get (and cache) the tiktoken encoding used for counting, or None"""
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding, estimating token counts: {str(e)}")
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in a piece of text
+
+    Args:
+        text: The text to count
+
+    Returns:
+        Number of tokens (estimated from the length if tiktoken is not installed)
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_to_tokens(text: str, max_tokens: int, strategy: str = 'head') -> str:
+    """
+    Truncate text so that it fits within a token budget
+
+    Args:
+        text: The text to truncate
+        max_tokens: Maximum number of tokens to keep
+        strategy: 'head' keeps the beginning of the text, 'head_tail' keeps the
+            beginning and the end (useful for documents whose conclusion matters)
+
+    Returns:
+        The (possibly) truncated text
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    keep = max(max_tokens - count_tokens(TRUNCATION_MARKER), 1)
+    encoding = _get_encoding()
+
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if strategy == 'head_tail':
+            head = keep * 2 // 3
+            return encoding.decode(tokens[:head]) + TRUNCATION_MARKER + encoding.decode(tokens[len(tokens) - (keep - head):])
+        return encoding.decode(tokens[:keep]) + TRUNCATION_MARKER
+
+    keep_chars = keep * CHARS_PER_TOKEN
+    if strategy == 'head_tail':
+        head = keep_chars * 2 // 3
+        return text[:head] + TRUNCATION_MARKER + text[len(text) - (keep_chars - head):]
+    return text[:keep_chars] + TRUNCATION_MARKER
+
+@dataclass
+class PromptSection:
+    """A block of context added to the prompt as its own chat message"""
+
+    title: str
+    content: str
+    role: str = 'system'
+    # Lower values are more important and are truncated last
+    priority: int = 0
+    # Per-section cap applied before the overall budget
+    max_tokens: Optional[int] = None
+    # Truncation strategy passed to truncate_to_tokens
+    strategy: str = 'head'
+
+def build_messages(system_message: str, user_message: str, sections: Optional[List[PromptSection]] = None,
+                   max_prompt_tokens: int = 12000) -> List[Dict[str, str]]:
+    """
+    Build the chat messages for a request, fitting the context sections into a token budget
+
+    Each section is first cut to its own max_tokens. If the prompt is still over
+    budget, the remaining tokens are handed out in priority order, so the least
+    important sections are truncated (or dropped) first.
+
+    Args:
+        system_message: The system prompt
+        user_message: The user's message
+        sections: Context sections, in the order they should appear
+        max_prompt_tokens: Token budget for the whole prompt
+
+    Returns:
+        List of chat messages ready for the chat completions API
+    """
+    sections = [section for section in (sections or []) if section.content and section.content.strip()]
+
+    fixed_tokens = count_tokens(system_message) + count_tokens(user_message) + 2 * MESSAGE_OVERHEAD_TOKENS
+    available = max_prompt_tokens - fixed_tokens
+
+    contents = {}
+    for index, section in enumerate(sections):
+        content = section.content
+        if section.max_tokens is not None:
+            content = truncate_to_tokens(content, section.max_tokens, section.strategy)
+        contents[index] = content
+
+    # Hand out the remaining budget by priority (stable for equal priorities)
+    for index in sorted(range(len(sections)), key=lambda i: sections[i].priority):
+        section = sections[index]
+        header_tokens = count_tokens(section.title) + MESSAGE_OVERHEAD_TOKENS + 1
+        budget = available - header_tokens
+        if budget < MIN_SECTION_TOKENS:
+            logger.warning(f"Dropping prompt section '{section.title}': token budget exhausted")
+            contents[index] = None
+            continue
+
+        content = truncate_to_tokens(contents[index], budget, section.strategy)
+        if content != contents[index]:
+            logger.info(f"Truncated prompt section '{section.title}' to {budget} tokens")
+        contents[index] = content
+        available -= count_tokens(content) + header_tokens
+
+    messages = [{'role': 'system', 'content': system_message}]
+    for index, section in enumerate(sections):
+        if contents[index]:
+            messages.append({'role': section.role, 'content': f"{section.title}:\n{contents[index]}"})
+    messages.append({'role': 'user', 'content': user_message})
+    return messages
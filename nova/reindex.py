@@ -0,0 +1,299 @@
+"""
+reindex.py - Rebuild the Azure AI Search index from the documents stored in MongoDB
+
+Streams the metadata of every uploaded document from MongoDB, extracts and
+chunks the files in a process pool (document_processor) and uploads the chunks
+through the search client's buffered sender while later files are still being
+extracted. Progress is checkpointed, so an interrupted run continues where it
+stopped. After a complete run, index entries of documents that no longer exist
+in MongoDB are deleted. --recreate-index drops the index and creates it from
+the current schema first (for schema changes).
+
+Usage (from the nova directory):
+    python reindex.py [--subject-id ID] [--workers 4] [--dry-run] [--restart] [--recreate-index]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import config
+from document_processor import prepare_document_for_indexing
+from mongodb_utils import MongoDBClient
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reindex_checkpoint.json')
+
+def prepare_chunks(doc_info: Dict[str, Any], subject_name: str, file_path: str) -> List[Dict[str, Any]]:
+    """Extract and chunk one document (runs in a worker process)"""
+    if not os.path.exists(file_path):
+        return []
+    return prepare_document_for_indexing(doc_info=doc_info, subject_name=subject_name, file_path=file_path)
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    """
+    Read the checkpoint of a previous run
+
+    Args:
+        path: Checkpoint file
+
+    Returns:
+        Checkpoint dictionary (empty if there is none)
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable checkpoint {path}: {str(e)}")
+        return {}
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]):
+    """Atomically write the checkpoint"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp_path, path)
+
+class ThroughputReporter:
+    """Logs documents/s and chunks/s at a fixed interval and at the end of a run"""
+
+    def __init__(self, interval_seconds: float = 10):
+        self.interval_seconds = interval_seconds
+        self.started_at = time.monotonic()
+        self._last_report = self.started_at
+        self.documents = 0
+        self.chunks = 0
+        self.skipped = 0
+
+    def add(self, chunks: int):
+        self.documents += 1
+        self.chunks += chunks
+        if not chunks:
+            self.skipped += 1
+        now = time.monotonic()
+        if now - self._last_report >= self.interval_seconds:
+            self._last_report = now
+            self.report()
+
+    def report(self, prefix: str = "Progress"):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        logger.info(f"{prefix}: {self.documents} documents ({self.skipped} without text), {self.chunks} chunks "
+                    f"in {elapsed:.1f}s - {self.documents / elapsed:.1f} docs/s, {self.chunks / elapsed:.1f} chunks/s")
+
+def remove_stale_entries(mongo_client: MongoDBClient, search_client, subject_id: str = None) -> int:
+    """
+    Delete the index entries of documents that no longer exist in MongoDB
+
+    Args:
+        mongo_client: Connected MongoDBClient
+        search_client: AzureSearchClient of the index
+        subject_id: Only check the entries of this subject
+
+    Returns:
+        Number of index entries deleted
+    """
+    document_ids = mongo_client.get_document_ids(subject_id=subject_id)
+    if document_ids is None:
+        # An empty answer because of an error would delete the whole index
+        logger.error("Could not read the document IDs from MongoDB, not removing stale index entries")
+        return 0
+
+    stale_keys = []
+    stale_documents = set()
+    for entry in search_client.iter_index_entries(select=['id', 'document_id'], subject_id=subject_id):
+        if entry.get('document_id') not in document_ids:
+            stale_keys.append(entry['id'])
+            stale_documents.add(entry.get('document_id'))
+    if not stale_keys:
+        logger.info("No stale index entries")
+        return 0
+
+    deleted = search_client.delete_documents(stale_keys)
+    logger.info(f"Deleted {deleted}/{len(stale_keys)} index entries of {len(stale_documents)} documents missing from MongoDB")
+    return deleted
+
+def reindex(mongo_client: MongoDBClient, search_client=None, subject_id: str = None, workers: int = 4,
+            checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH, checkpoint_every: int = 100,
+            restart: bool = False, limit: int = None, report_interval: float = 10,
+            recreate_index: bool = False) -> Dict[str, Any]:
+    """
+    Re-extract, re-chunk and re-upload every stored document
+
+    Args:
+        mongo_client: Connected MongoDBClient to read document metadata from
+        search_client: AzureSearchClient to upload to, None for a dry run (extract and chunk only)
+        subject_id: Only reindex the documents of this subject
+        workers: Number of extraction processes
+        checkpoint_path: Where progress is saved, None to disable checkpointing
+        checkpoint_every: Save progress after this many documents
+        restart: Ignore an existing checkpoint and start from the first document
+        limit: Stop after this many documents
+        report_interval: Seconds between throughput reports
+        recreate_index: Drop the index and create it from the current schema before reindexing
+                        (implies restart)
+
+    Returns:
+        Summary with document, chunk, upload and stale entry counts
+    """
+    dry_run = search_client is None
+    if recreate_index:
+        if dry_run:
+            raise ValueError("Recreating the index needs a search client, it can't be combined with a dry run")
+        if not search_client.recreate_index():
+            raise RuntimeError(f"Could not recreate index '{search_client.index_name}'")
+        # Nothing of a previous run is in the new index
+        restart = True
+    checkpoint = {} if (restart or not checkpoint_path) else load_checkpoint(checkpoint_path)
+    if checkpoint.get('completed'):
+        checkpoint = {}
+    if checkpoint and checkpoint.get('subject_id') != subject_id:
+        logger.warning("Checkpoint was written for a different subject filter, starting from the beginning")
+        checkpoint = {}
+    after_id = checkpoint.get('last_document_id')
+    if after_id:
+        logger.info(f"Resuming after document {after_id} ({checkpoint.get('documents', 0)} already done)")
+
+    subject_names = {}
+    def subject_name_for(doc_subject_id):
+        if doc_subject_id not in subject_names:
+            try:
+                subject = mongo_client.get_subject(doc_subject_id) if doc_subject_id else None
+            except Exception as e:
+                logger.warning(f"Could not look up subject {doc_subject_id}: {str(e)}")
+                subject = None
+            subject_names[doc_subject_id] = subject['name'] if subject else ''
+        return subject_names[doc_subject_id]
+
+    reporter = ThroughputReporter(report_interval)
+    buffer = None if dry_run else search_client.indexing_buffer()
+    last_done_id = after_id
+    done_since_checkpoint = 0
+
+    def write_checkpoint(completed=False):
+        if dry_run or not checkpoint_path or last_done_id is None:
+            return
+        # Only documents whose chunks are uploaded may be recorded as done
+        buffer.flush()
+        save_checkpoint(checkpoint_path, {
+            'subject_id': subject_id,
+            'last_document_id': last_done_id,
+            'documents': checkpoint.get('documents', 0) + reporter.documents,
+            'chunks': checkpoint.get('chunks', 0) + reporter.chunks,
+            # A completed run is not resumed, the next run starts from the first document again
+            'completed': completed,
+            'updated_at': time.time()
+        })
+
+    # spawn: the upload threads of the indexing buffer must not be forked
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pending = deque()
+
+        def complete_oldest():
+            # Results are taken in _id order, so the checkpoint never skips an unfinished document
+            nonlocal last_done_id, done_since_checkpoint
+            doc_id, future = pending.popleft()
+            try:
+                chunks = future.result()
+            except Exception as e:
+                logger.error(f"Error preparing document {doc_id}: {str(e)}")
+                chunks = []
+            if buffer is not None:
+                # Blocks while the upload slots are busy, which also holds back extraction
+                buffer.add_many(chunks)
+            reporter.add(len(chunks))
+            last_done_id = doc_id
+            done_since_checkpoint += 1
+            if done_since_checkpoint >= checkpoint_every:
+                write_checkpoint()
+                done_since_checkpoint = 0
+
+        for count, doc in enumerate(mongo_client.iter_documents(subject_id=subject_id, after_id=after_id)):
+            if limit is not None and count >= limit:
+                break
+            file_path = os.path.join(config.UPLOAD_FOLDER, doc.get('storage_path', ''))
+            future = pool.submit(prepare_chunks, doc, subject_name_for(doc.get('subject_id')), file_path)
+            pending.append((doc['_id'], future))
+            # Keep a bounded number of documents in extraction
+            while len(pending) >= workers * 2:
+                complete_oldest()
+
+        while pending:
+            complete_oldest()
+
+    stats = buffer.close() if buffer is not None else {}
+    write_checkpoint(completed=limit is None)
+    reporter.report("Finished" if not dry_run else "Dry run finished")
+
+    # A recreated index only holds what was just uploaded; a partial run has not seen every document yet
+    stale_removed = 0
+    if not dry_run and not recreate_index and limit is None:
+        stale_removed = remove_stale_entries(mongo_client, search_client, subject_id=subject_id)
+    return {
+        'documents': reporter.documents,
+        'documents_without_text': reporter.skipped,
+        'chunks': reporter.chunks,
+        'uploaded': stats.get('uploaded', 0),
+        'failed': stats.get('failed', 0),
+        'failed_keys': buffer.failed_keys if buffer is not None else [],
+        'stale_removed': stale_removed,
+        'last_document_id': last_done_id
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the Azure AI Search index from the documents in MongoDB")
+    parser.add_argument('--subject-id', help="Only reindex the documents of this subject")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help="Extraction processes")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH, help="Checkpoint file used to resume")
+    parser.add_argument('--checkpoint-every', type=int, default=100, help="Save progress every N documents")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and start from the first document")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after N documents")
+    parser.add_argument('--dry-run', action='store_true', help="Extract and chunk only, upload nothing")
+    parser.add_argument('--report-interval', type=float, default=10, help="Seconds between throughput reports")
+    parser.add_argument('--recreate-index', action='store_true',
+                        help="Drop the index and create it from the current schema before reindexing (implies --restart)")
+    args = parser.parse_args()
+    if args.recreate_index and args.dry_run:
+        parser.error("--recreate-index can't be combined with --dry-run")
+
+    mongo_client = MongoDBClient(uri=config.MONGODB_URI, db_name=config.MONGODB_DB_NAME)
+    if not mongo_client.connect():
+        sys.exit("Could not connect to MongoDB")
+
+    search_client = None
+    if not args.dry_run:
+        if not (config.AZURE_SEARCH_ENDPOINT and config.AZURE_SEARCH_API_KEY):
+            sys.exit("Azure AI Search is not configured (AZURE_SEARCH_ENDPOINT, AZURE_SEARCH_API_KEY)")
+        from search_utils import AzureSearchClient
+        search_client = AzureSearchClient(endpoint=config.AZURE_SEARCH_ENDPOINT, api_key=config.AZURE_SEARCH_API_KEY,
+                                          index_name=config.AZURE_SEARCH_INDEX_NAME,
+                                          upload_concurrency=config.AZURE_SEARCH_UPLOAD_CONCURRENCY,
+                                          upload_batch_bytes=config.AZURE_SEARCH_UPLOAD_BATCH_BYTES)
+        if not search_client.is_available and not args.recreate_index:
+            sys.exit(f"Azure AI Search index '{config.AZURE_SEARCH_INDEX_NAME}' is not accessible")
+
+    try:
+        summary = reindex(mongo_client, search_client, subject_id=args.subject_id, workers=args.workers,
+                          checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                          restart=args.restart, limit=args.limit, report_interval=args.report_interval,
+                          recreate_index=args.recreate_index)
+    finally:
+        mongo_client.close()
+
+    if summary['failed']:
+        logger.error(f"{summary['failed']} chunks could not be uploaded: {', '.join(map(str, summary['failed_keys'][:20]))}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+research_jobs.py - Background job runner for literature reviews
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+class ResearchJobManager:
+    """
+    Runs literature reviews outside of the request cycle.
+
+    A single background thread owns an asyncio event loop on which every review
+    (and its autogen runtime) runs. Job state and progress events are kept in
+    memory and mirrored to a JSON file per job, so any worker on the same host
+    can answer status polls.
+    """
+
+    def __init__(self, jobs_folder: str, max_concurrent_jobs: int = 1, job_timeout_seconds: int = 1800,
+                 job_retention_seconds: int = 6 * 3600, max_events: int = 200):
+        """
+        Initialize the job manager
+
+        Args:
+            jobs_folder: Folder where job state files are written
+            max_concurrent_jobs: Maximum number of reviews running at the same time
+            job_timeout_seconds: Time after which a running review is cancelled
+            job_retention_seconds: Time finished jobs are kept before being forgotten
+            max_events: Maximum number of progress events kept per job
+        """
+        self.jobs_folder = jobs_folder
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.job_timeout_seconds = job_timeout_seconds
+        self.job_retention_seconds = job_retention_seconds
+        self.max_events = max_events
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        os.makedirs(jobs_folder, exist_ok=True)
+
+    def _ensure_started(self) -> None:
+        """Start the event loop thread on first use (after any worker fork)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
+            self._thread = threading.Thread(target=self._loop.run_forever, name='research-jobs', daemon=True)
+            self._thread.start()
+            logger.info("Started research job event loop")
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_folder, f"{job_id}.json")
+
+    def _persist(self, job: Dict[str, Any]) -> None:
+        """Write the job state atomically so other workers can read it"""
+        try:
+            temp_path = self._job_path(job['id']) + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(job, f)
+            os.replace(temp_path, self._job_path(job['id']))
+        except OSError as e:
+            logger.error(f"Failed to persist research job {job['id']}: {str(e)}")
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            job['updated_at'] = time.time()
+            snapshot = dict(job, events=list(job['events']))
+        self._persist(snapshot)
+
+    def add_event(self, job_id: str, event_type: str, message: str, **data) -> None:
+        """
+        Record a progress event for a job
+
+        Args:
+            job_id: ID of the job
+            event_type: Machine readable event type (e.g. 'papers_found', 'paper_summarized')
+            message: Human readable description of the event
+            data: Additional event data
+        """
+        event = {'type': event_type, 'message': message, 'timestamp': time.time(), 'data': data}
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['events'].append(event)
+            job['event_count'] += 1
+            # Keep only the most recent events, event_count still counts all of them
+            del job['events'][:-self.max_events]
+            job['updated_at'] = time.time()
+            snapshot = dict(job, events=list(job['events']))
+        self._persist(snapshot)
+
+    def submit(self, query: str, owner_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Submit a literature review job
+
+        Args:
+            query: The research query
+            owner_id: ID of the user or session that owns the job
+
+        Returns:
+            The job state
+        """
+        self._ensure_started()
+        self.cleanup_finished()
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        job = {
+            'id': job_id,
+            'query': query,
+            'owner_id': owner_id,
+            'status': JOB_QUEUED,
+            'events': [],
+            'event_count': 0,
+            'report': None,
+            'partial_report': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        self._persist(job)
+
+        asyncio.run_coroutine_threadsafe(self._run(job_id), self._loop)
+        logger.info(f"Submitted research job {job_id} for query: {query}")
+        return self.get(job_id)
+
+    async def _run(self, job_id: str) -> None:
+        async with self._semaphore:
+            query = self._jobs[job_id]['query']
+            self._update(job_id, status=JOB_RUNNING)
+            self.add_event(job_id, 'started', 'Literature review started')
+
+            def progress(event_type, message, **data):
+                # The preliminary or streamed report replaces the previous one instead of piling up in events
+                partial_report = data.pop('partial_report', None)
+                if partial_report is not None:
+                    self._update(job_id, partial_report=partial_report)
+                if message is not None:
+                    self.add_event(job_id, event_type, message, **data)
+
+            try:
+                # Imported here so the research stack is only loaded once a job runs
+                from agents.research_agent import literature_review
+
+                report_path = await asyncio.wait_for(literature_review(query, progress=progress, job_id=job_id),
+                                                     timeout=self.job_timeout_seconds)
+
+                if not report_path or not os.path.exists(report_path):
+                    raise RuntimeError("Failed to generate literature review report")
+
+                with open(report_path, 'r') as f:
+                    report = f.read()
+
+                self._update(job_id, status=JOB_COMPLETED, report=report, partial_report=None)
+                self.add_event(job_id, 'completed', 'Literature review completed')
+
+            except asyncio.TimeoutError:
+                logger.error(f"Research job {job_id} timed out")
+                self._update(job_id, status=JOB_FAILED, error="The literature review took too long and was cancelled")
+                self.add_event(job_id, 'failed', 'Literature review timed out')
+            except Exception as e:
+                logger.error(f"Research job {job_id} failed: {str(e)}")
+                self._update(job_id, status=JOB_FAILED, error=str(e))
+                self.add_event(job_id, 'failed', f"Literature review failed: {str(e)}")
+
+    def get(self, job_id: str, since: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of a job
+
+        Args:
+            job_id: ID of the job
+            since: Only include events after this many events (for incremental polling)
+
+        Returns:
+            Job state dictionary or None if the job is unknown
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            job = dict(job, events=list(job['events'])) if job else None
+
+        # Jobs started by another worker are read from their state file
+        if job is None:
+            if not all(c in '0123456789abcdef' for c in job_id):
+                return None
+            try:
+                with open(self._job_path(job_id), 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                return None
+
+        # Events are capped, so map the absolute index onto the kept events
+        first_kept = job['event_count'] - len(job['events'])
+        job['events'] = job['events'][max(since - first_kept, 0):]
+        job['next_event'] = job['event_count']
+        return job
+
+    def cleanup_finished(self) -> int:
+        """
+        Forget finished jobs older than the retention period and remove their state files
+
+        Returns:
+            Number of jobs removed
+        """
+        cutoff = time.time() - self.job_retention_seconds
+        removed = 0
+        try:
+            for file_name in os.listdir(self.jobs_folder):
+                if not file_name.endswith('.json'):
+                    continue
+                path = os.path.join(self.jobs_folder, file_name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        except OSError as e:
+            logger.error(f"Error cleaning up research jobs: {str(e)}")
+
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job['status'] in FINISHED_STATES and job['updated_at'] < cutoff]:
+                del self._jobs[job_id]
+        return removed
@@ -0,0 +1,193 @@
+"""
+response_cache.py - Opt-in cache of AI responses for repeated subject chat questions
+"""
+
+import re
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, FrozenSet, Optional
+
+from text_utils import STOP_WORDS, stem
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words that change what a question asks, kept although they are stop words elsewhere
+QUESTION_WORDS = {'no', 'not', 'nor', 'what', 'which', 'who', 'whom', 'why', 'how', 'when', 'where'}
+# Words of any length, so "AI", "Go" and "C++" are not dropped
+QUERY_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?[+#]*")
+# Below this many terms one differing term changes the question, only exact matches are reused
+MIN_TERMS_FOR_SIMILARITY = 4
+
+def normalize_query(query: str) -> FrozenSet[str]:
+    """
+    Reduce a question to a set of stemmed terms
+
+    Stop words are dropped, but negations and interrogatives are kept, so "Why
+    does mitosis happen?" and "How does mitosis happen?" stay different questions.
+
+    Args:
+        query: The user's question
+
+    Returns:
+        Frozen set of normalized terms
+    """
+    terms = set()
+    for word in QUERY_WORD_PATTERN.findall((query or '').lower()):
+        if word.endswith("n't"):
+            # "isn't" asks the opposite of "is"
+            terms.add('not')
+            word = word[:-3]
+        word = word.split("'", 1)[0]
+        if word in QUESTION_WORDS or (word and word not in STOP_WORDS):
+            terms.add(stem(word))
+    return frozenset(terms)
+
+def context_fingerprint(*parts: str) -> str:
+    """
+    Compute a stable fingerprint of the context sent along with a question
+
+    Args:
+        parts: Context strings (retrieved document chunks, memory, ...)
+
+    Returns:
+        Hex digest identifying the exact context
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or '').encode('utf-8', errors='replace'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+class ResponseCache:
+    """In-memory cache of chat responses keyed by normalized question and context fingerprint"""
+
+    def __init__(self, ttl_seconds: int = 3600, similarity_threshold: float = 0.8,
+                 max_entries_per_subject: int = 200):
+        """
+        Initialize the response cache
+
+        Args:
+            ttl_seconds: How long a cached response stays valid
+            similarity_threshold: Minimum Jaccard similarity between two normalized
+                questions for one to be answered from the other's cached response
+            max_entries_per_subject: Maximum number of cached responses kept per subject
+        """
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_entries_per_subject = max_entries_per_subject
+        self._subjects: Dict[str, OrderedDict] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+        # Short questions are only answered from an exact match (see get)
+        if len(a) < MIN_TERMS_FOR_SIMILARITY or len(b) < MIN_TERMS_FOR_SIMILARITY:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    def get(self, subject_id: str, query: str, fingerprint: str, generation: int = 0) -> Optional[str]:
+        """
+        Look up a cached response for a question asked against the same context
+
+        Args:
+            subject_id: ID of the subject the question was asked in
+            query: The user's question
+            fingerprint: Fingerprint of the retrieved context (see context_fingerprint)
+            generation: Document version of the subject; entries from older versions never match
+
+        Returns:
+            The cached response or None on a miss
+        """
+        terms = normalize_query(query)
+        if not terms:
+            # Nothing identifies the question, it could be answered with any other one's response
+            with self._lock:
+                self.misses += 1
+            return None
+        now = time.monotonic()
+
+        with self._lock:
+            entries = self._subjects.get(subject_id)
+            if entries:
+                # Exact normalized match first, then fall back to a similarity scan
+                key = (generation, fingerprint, terms)
+                entry = entries.get(key)
+                if entry is None:
+                    best_score = 0.0
+                    for (entry_generation, entry_fingerprint, entry_terms), candidate in entries.items():
+                        if entry_generation != generation or entry_fingerprint != fingerprint:
+                            continue
+                        score = self._similarity(terms, entry_terms)
+                        if score >= self.similarity_threshold and score > best_score:
+                            best_score, key, entry = score, (entry_generation, entry_fingerprint, entry_terms), candidate
+
+                if entry is not None:
+                    if now - entry['created_at'] <= self.ttl_seconds:
+                        entries.move_to_end(key)
+                        self.hits += 1
+                        return entry['response']
+                    # Expired entry, drop it
+                    del entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, subject_id: str, query: str, fingerprint: str, response: str, generation: int = 0) -> None:
+        """
+        Store a response for a question
+
+        Args:
+            subject_id: ID of the subject the question was asked in
+            query: The user's question
+            fingerprint: Fingerprint of the retrieved context
+            response: The AI response to cache
+            generation: Document version of the subject
+        """
+        if not response:
+            return
+
+        terms = normalize_query(query)
+        if not terms:
+            return
+
+        key = (generation, fingerprint, terms)
+        with self._lock:
+            entries = self._subjects.setdefault(subject_id, OrderedDict())
+            entries[key] = {'response': response, 'created_at': time.monotonic()}
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries_per_subject:
+                entries.popitem(last=False)
+
+    def invalidate_subject(self, subject_id: str) -> None:
+        """
+        Drop all cached responses for a subject (e.g. after its documents changed)
+
+        Args:
+            subject_id: ID of the subject
+        """
+        with self._lock:
+            if self._subjects.pop(subject_id, None) is not None:
+                logger.info(f"Invalidated cached responses for subject {subject_id}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hit/miss counts, hit rate and number of cached entries
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'entries': sum(len(entries) for entries in self._subjects.values())
+            }
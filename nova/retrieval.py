@@ -0,0 +1,332 @@
+"""
+retrieval.py - Multi-query retrieval of subject chat context from Azure AI Search
+
+A question is searched as several variants at once (the raw question, its key
+terms, and the key terms expanded with synonyms). The rankings are fused with
+reciprocal rank fusion, the fused candidates are re-ranked lexically (see
+reranking.py), and neighbouring chunks of the same document (which overlap, see
+document_processor.chunk_text) are deduplicated. Searches still running when
+the latency budget is spent are not waited for.
+"""
+
+import time
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional, Tuple
+
+from text_utils import STOP_WORDS
+from reranking import rerank
+from search_utils import (CONTEXT_SELECT_FIELDS, HIGHLIGHT_TAG_PATTERN, NO_RESULTS_CONTEXT, SEARCH_FAILED_CONTEXT,
+                          format_context)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constant of reciprocal rank fusion, dampens the weight of the top ranks
+RRF_K = 60
+# Neighbouring chunks share up to chunk_text's overlap (200 characters); shorter matches are coincidence
+MAX_CHUNK_OVERLAP = 300
+MIN_CHUNK_OVERLAP = 20
+MAX_SEARCH_WORKERS = 8
+
+# Small study-vocabulary thesaurus for query expansion
+SYNONYMS = {
+    'definition': ['meaning'],
+    'define': ['meaning', 'definition'],
+    'explain': ['describe', 'explanation'],
+    'example': ['instance', 'illustration'],
+    'cause': ['reason', 'origin'],
+    'effect': ['impact', 'consequence', 'result'],
+    'function': ['role', 'purpose'],
+    'difference': ['contrast', 'comparison'],
+    'compare': ['contrast', 'comparison'],
+    'method': ['technique', 'approach', 'procedure'],
+    'advantage': ['benefit', 'strength'],
+    'disadvantage': ['drawback', 'limitation', 'weakness'],
+    'formula': ['equation'],
+    'summary': ['overview', 'summarize'],
+    'process': ['procedure', 'mechanism'],
+    'structure': ['composition', 'organization'],
+    'property': ['characteristic', 'feature'],
+    'type': ['kind', 'category', 'classification'],
+    'increase': ['rise', 'growth'],
+    'decrease': ['decline', 'reduction'],
+    'important': ['significant', 'key'],
+    'theory': ['model', 'principle'],
+    'rule': ['law', 'principle'],
+    'goal': ['objective', 'aim'],
+    'problem': ['issue', 'challenge'],
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Thread pool the query variants are searched on, shared by all requests of the worker"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_SEARCH_WORKERS, thread_name_prefix='retrieval')
+    return _executor
+
+def extract_search_terms(query, max_terms=5):
+    """
+    Extract key search terms from a long query to improve search results
+    """
+    try:
+        # Remove common words and keep nouns and key terms
+        words = query.lower().split()
+        # Keep words that are not stop words and are at least 3 characters long
+        filtered_words = [word for word in words if word not in STOP_WORDS and len(word) >= 3]
+
+        # Get the most frequent terms (excluding very common words)
+        word_counts = Counter(filtered_words)
+        top_terms = [word for word, count in word_counts.most_common(max_terms)]
+
+        # Join the top terms back into a search query
+        if top_terms:
+            return ' '.join(top_terms)
+        else:
+            # If no good terms found, return the original query
+            return query
+    except Exception as e:
+        logger.error(f"Error extracting search terms: {str(e)}")
+        return query
+
+def expand_synonyms(terms: List[str]) -> List[str]:
+    """
+    Add the local synonyms of each term
+
+    Args:
+        terms: Search terms
+
+    Returns:
+        The terms followed by their synonyms, without duplicates
+    """
+    expanded = list(terms)
+    for term in terms:
+        # Also match simple plurals ("effects" -> "effect")
+        base = term[:-1] if term.endswith('s') and term[:-1] in SYNONYMS else term
+        for synonym in SYNONYMS.get(base, []):
+            if synonym not in expanded:
+                expanded.append(synonym)
+    return expanded
+
+def build_query_variants(query: str, max_terms: int = 5) -> List[Tuple[str, str]]:
+    """
+    Build the variants a question is searched as
+
+    Args:
+        query: The user's question
+        max_terms: Number of key terms in the keyword variant
+
+    Returns:
+        List of (variant name, search text), without duplicate search texts
+    """
+    # Punctuation would otherwise end up inside the terms
+    cleaned = ''.join(char if char.isalnum() or char.isspace() or char in "'-" else ' ' for char in query)
+    keywords = extract_search_terms(cleaned, max_terms)
+    candidates = [
+        ('raw', query.strip()),
+        ('keywords', keywords),
+        ('synonyms', ' '.join(expand_synonyms(keywords.split()))),
+    ]
+    variants = []
+    seen = set()
+    for name, text in candidates:
+        if text and text.lower() not in seen:
+            seen.add(text.lower())
+            variants.append((name, text))
+    return variants
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], k: int = RRF_K,
+                           key_field: str = 'id') -> List[Dict[str, Any]]:
+    """
+    Fuse several rankings of search hits
+
+    Each hit scores sum(1 / (k + rank)) over the rankings it appears in.
+
+    Args:
+        rankings: Result lists, best hit first
+        k: Rank constant
+        key_field: Field identifying a hit across rankings
+
+    Returns:
+        Hits ordered by fused score (the first copy of each hit, with highlights of all copies)
+    """
+    scores = {}
+    hits = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = hit.get(key_field)
+            if key is None:
+                continue
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in hits:
+                hits[key] = dict(hit)
+            else:
+                # Different variants highlight different passages of the same chunk
+                fragments = list((hits[key].get('@search.highlights') or {}).get('content') or [])
+                for fragment in (hit.get('@search.highlights') or {}).get('content') or []:
+                    if fragment not in fragments:
+                        fragments.append(fragment)
+                hits[key]['@search.highlights'] = {'content': fragments}
+    return [hits[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+def _overlap_length(earlier: str, later: str, max_overlap: int = MAX_CHUNK_OVERLAP) -> int:
+    """Length of the longest end of earlier that later starts with"""
+    for length in range(min(len(earlier), len(later), max_overlap), MIN_CHUNK_OVERLAP - 1, -1):
+        if earlier.endswith(later[:length]):
+            return length
+    return 0
+
+def dedupe_overlapping(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Remove the text neighbouring chunks of a document share
+
+    A hit next to a better ranked hit of the same document loses the overlapping
+    part of its content and the highlights that lie within its neighbour; hits
+    left with nothing new are dropped.
+
+    Args:
+        results: Hits in rank order
+
+    Returns:
+        Deduplicated hits in rank order
+    """
+    kept = {}
+    deduped = []
+    for hit in results:
+        document_id, chunk_id = hit.get('document_id'), hit.get('chunk_id')
+        if document_id is None or chunk_id is None:
+            deduped.append(hit)
+            continue
+        hit = dict(hit)
+        content = hit.get('content') or ''
+        previous = kept.get((document_id, chunk_id - 1))
+        following = kept.get((document_id, chunk_id + 1))
+        if previous is not None:
+            content = content[_overlap_length(previous.get('content') or '', content):]
+        if following is not None:
+            overlap = _overlap_length(content, following.get('content') or '')
+            content = content[:len(content) - overlap]
+
+        neighbours = [neighbour.get('content') or '' for neighbour in (previous, following) if neighbour is not None]
+        fragments = (hit.get('@search.highlights') or {}).get('content') or []
+        fragments = [fragment for fragment in fragments
+                     if not any(HIGHLIGHT_TAG_PATTERN.sub('', fragment) in neighbour for neighbour in neighbours)]
+        if neighbours and not fragments and not content.strip():
+            continue
+
+        kept[(document_id, chunk_id)] = hit
+        hit['content'] = content.strip()
+        hit['@search.highlights'] = {'content': fragments}
+        deduped.append(hit)
+    return deduped
+
+def multi_query_search(search_client, query: str, subject_id: str, top: int = 5,
+                       budget_seconds: float = 1.5, candidates: int = 50) -> Optional[List[Dict[str, Any]]]:
+    """
+    Search all variants of a question concurrently, fuse the results and re-rank them
+
+    Args:
+        search_client: AzureSearchClient instance
+        query: The user's question
+        subject_id: ID of the subject
+        top: Number of hits to return
+        budget_seconds: Time to wait for the variants; searches not finished by then
+                        are ignored (unless none has finished yet) and cancelled if not started
+        candidates: Number of hits fetched per variant and re-ranked
+
+    Returns:
+        Re-ranked and deduplicated hits, best first, or None if the circuit breaker refused the
+        search or every variant that finished failed
+    """
+    # The fan-out is one call for the circuit breaker: a transient error must not count once per variant
+    if not search_client.breaker.allow_request():
+        logger.warning("Azure AI Search is not available. Cannot perform search.")
+        return None
+    variants = build_query_variants(query)
+    started_at = time.monotonic()
+    executor = _get_executor()
+    futures = {
+        executor.submit(search_client.search, query=text, subject_id=subject_id, top=max(top, candidates),
+                        select=CONTEXT_SELECT_FIELDS, highlight_fields='content', use_breaker=False): name
+        for name, text in variants
+    }
+
+    done, not_done = wait(futures, timeout=budget_seconds)
+    if not done:
+        # Better late results than the much slower extraction fallback
+        done, not_done = wait(futures, return_when=FIRST_COMPLETED)
+    if not_done:
+        # Variants still queued behind other requests' searches are dropped so they don't take a
+        # worker; running ones can't be interrupted and finish in the background
+        running = [futures[future] for future in not_done if not future.cancel()]
+        logger.info(f"Retrieval budget of {budget_seconds}s spent, skipping variants: "
+                    f"{', '.join(futures[future] for future in not_done)}"
+                    + (f" ({', '.join(running)} still running)" if running else ''))
+
+    # Keep the variant order so ties in the fused score favour the raw question
+    rankings = []
+    for future, name in futures.items():
+        if future in done:
+            try:
+                ranking = future.result()
+            except Exception as e:
+                logger.error(f"Search variant '{name}' failed: {str(e)}")
+                continue
+            # The client returns None for a failed search, which must not look like one without hits
+            if ranking is not None:
+                rankings.append(ranking)
+
+    if not rankings:
+        logger.warning(f"All {len(done)} finished query variants failed")
+        search_client.breaker.record_failure()
+        return None
+    search_client.breaker.record_success()
+
+    fused = reciprocal_rank_fusion(rankings)[:candidates]
+    # Re-rank the whole candidate set, dedupe in the new order, then keep the best few
+    best = dedupe_overlapping(rerank(query, fused))[:top]
+    logger.info(f"Fused {len(rankings)}/{len(variants)} query variants into {len(fused)} candidates, "
+                f"kept {len(best)} in {time.monotonic() - started_at:.2f}s")
+    return best
+
+def retrieve_context(search_client, query: str, subject_id: str, max_results: int = 5,
+                     budget_seconds: float = 1.5, candidates: int = 50) -> str:
+    """
+    Get the document context for a question with multi-query retrieval
+
+    Args:
+        search_client: AzureSearchClient instance
+        query: The user's question
+        subject_id: ID of the subject
+        max_results: Maximum number of document chunks to include
+        budget_seconds: Latency budget of the search fan-out
+        candidates: Number of hits per variant considered by the re-ranker
+
+    Returns:
+        Concatenated relevant context, NO_RESULTS_CONTEXT if nothing matched, or a message
+        starting like get_relevant_context's when Azure AI Search is unavailable or failed
+    """
+    try:
+        if not search_client.is_available:
+            return "Azure AI Search is not available. Unable to retrieve context from documents. Please check your configuration."
+
+        results = multi_query_search(search_client, query, subject_id, top=max_results,
+                                     budget_seconds=budget_seconds, candidates=candidates)
+        if results is None:
+            return SEARCH_FAILED_CONTEXT
+        if not results:
+            logger.info(f"No search results found for query: '{query}' in subject_id: '{subject_id}'")
+            return NO_RESULTS_CONTEXT
+
+        return format_context(results)
+
+    except Exception as e:
+        logger.error(f"Error retrieving context: {str(e)}")
+        return f"Error retrieving context: {str(e)}"
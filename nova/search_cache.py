@@ -0,0 +1,137 @@
+"""
+search_cache.py - Short-lived cache of document search context for subject chat
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Stripped from both ends of a query for its cache key
+QUERY_PUNCTUATION = ' ?!.,;:'
+
+class SearchResultCache:
+    """
+    TTL/LRU cache of retrieved document context, so retries and the same
+    question asked in several tabs don't query Azure AI Search again.
+
+    Entries are keyed by subject, the subject's documents version (its index
+    generation, bumped in MongoDB by every upload or deletion) and the query text
+    (lowercased, whitespace collapsed, surrounding punctuation stripped), so
+    "What is osmosis?" and "what is  osmosis" share an entry but "What is AI?"
+    and "What is ML?" do not.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 1024):
+        """
+        Initialize the search result cache
+
+        Args:
+            ttl_seconds: How long a cached result stays valid
+            max_entries: Maximum number of cached results (least recently used are evicted)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(subject_id: str, query: str, generation: int = 0, variant: Any = None) -> Optional[tuple]:
+        """
+        Build the cache key of a search
+
+        Args:
+            subject_id: ID of the subject searched in
+            query: The search query
+            generation: Documents version of the subject
+            variant: Anything else the result depends on (e.g. the number of results)
+
+        Returns:
+            Hashable cache key, or None if the query has no text (such searches are not cached)
+        """
+        text = ' '.join((query or '').lower().split()).strip(QUERY_PUNCTUATION)
+        if not text:
+            return None
+        return (subject_id, generation, text, variant)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        """
+        Look up a cached result
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            The cached result or None on a miss
+        """
+        if key is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry['created_at'] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry['result']
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, result: Any) -> None:
+        """
+        Store a result
+
+        Args:
+            key: Key from make_key
+            result: The search result to cache
+        """
+        if key is None or result is None:
+            return
+        with self._lock:
+            self._entries[key] = {'result': result, 'created_at': time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_subject(self, subject_id: str) -> None:
+        """
+        Drop all cached results for a subject (the documents version already keeps
+        other workers from serving them, this frees the memory in this one)
+
+        Args:
+            subject_id: ID of the subject
+        """
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == subject_id]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached search results for subject {subject_id}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hit/miss counts, hit rate, evictions and number of cached entries
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries)
+            }
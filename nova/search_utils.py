@@ -3,10 +3,15 @@ search_utils.py - Utility functions for Azure AI Search integration
 """
 
 import os
+import re
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 import json
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
 from azure.search.documents import SearchClient
 from azure.search.documents.models import QueryType
 from azure.search.documents.indexes import SearchIndexClient
@@ -21,10 +26,286 @@ from azure.search.documents.indexes.models import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Azure AI Search accepts at most 1000 documents and 16 MB per indexing request
+MAX_BATCH_DOCUMENTS = 1000
+MAX_BATCH_BYTES = 8 * 1024 * 1024
+# Per-document (and per-request) status codes worth retrying: conflicts, throttling, service busy
+RETRIABLE_STATUS_CODES = {409, 422, 429, 500, 502, 503, 504}
+
+def _payload_bytes(document: Dict[str, Any]) -> int:
+    """Approximate size of a document in an indexing request"""
+    return len(json.dumps(document, default=str).encode('utf-8')) + 1
+
+class IndexingBuffer:
+    """
+    Buffered sender for indexing documents.
+
+    Documents are collected into batches capped by document count and payload
+    bytes; full batches are uploaded by a thread pool while the caller keeps
+    adding documents. When max_in_flight batches are pending, add() blocks
+    (backpressure), so memory stays bounded however many documents are added.
+    Only documents that failed with a retriable status are sent again, with
+    exponential backoff; a batch rejected as too large is split in half.
+    """
+
+    def __init__(self, search_client, max_batch_documents: int = MAX_BATCH_DOCUMENTS,
+                 max_batch_bytes: int = MAX_BATCH_BYTES, max_in_flight: int = 4,
+                 max_retries: int = 3, backoff_seconds: float = 1.0, key_field: str = 'id'):
+        """
+        Initialize the indexing buffer
+
+        Args:
+            search_client: azure.search.documents.SearchClient to upload with
+            max_batch_documents: Maximum number of documents per request
+            max_batch_bytes: Maximum payload bytes per request
+            max_in_flight: Number of batches uploaded concurrently
+            max_retries: Retries of failed documents (or requests) per batch
+            backoff_seconds: Delay before the first retry, doubled for every further retry
+            key_field: Key field of the index
+        """
+        self.search_client = search_client
+        self.max_batch_documents = max_batch_documents
+        self.max_batch_bytes = max_batch_bytes
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.key_field = key_field
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='search-upload')
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._futures = []
+        self._batch = []
+        self._batch_bytes = 0
+        self._stats_lock = threading.Lock()
+        self.stats = {'uploaded': 0, 'failed': 0, 'retried': 0, 'batches': 0, 'failed_batches': 0}
+        self.failed_keys = []
+
+    def add(self, document: Dict[str, Any]):
+        """Add a document, uploading the current batch first if the document does not fit in it"""
+        size = _payload_bytes(document)
+        if self._batch and (len(self._batch) >= self.max_batch_documents or self._batch_bytes + size > self.max_batch_bytes):
+            self._send()
+        self._batch.append(document)
+        self._batch_bytes += size
+
+    def add_many(self, documents: List[Dict[str, Any]]):
+        for document in documents:
+            self.add(document)
+
+    def _send(self):
+        batch = self._batch
+        self._batch = []
+        self._batch_bytes = 0
+        # Blocks while max_in_flight batches are being uploaded
+        self._slots.acquire()
+        future = self._executor.submit(self._upload_batch, batch)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _record(self, **counts):
+        with self._stats_lock:
+            for name, count in counts.items():
+                self.stats[name] += count
+
+    def _fail(self, documents: List[Dict[str, Any]]):
+        with self._stats_lock:
+            self.stats['failed'] += len(documents)
+            self.failed_keys.extend(document.get(self.key_field) for document in documents)
+
+    def _upload_batch(self, batch: List[Dict[str, Any]]):
+        """Upload one batch, retrying only the documents that failed"""
+        self._record(batches=1)
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._record(retried=len(pending))
+                time.sleep(self.backoff_seconds * (2 ** (attempt - 1)))
+            try:
+                results = self.search_client.upload_documents(documents=pending)
+            except Exception as e:
+                status_code = getattr(e, 'status_code', None)
+                if status_code == 413 and len(pending) > 1:
+                    # Too large for one request after all, send it as two
+                    middle = len(pending) // 2
+                    self._upload_batch(pending[:middle])
+                    self._upload_batch(pending[middle:])
+                    return
+                # No status code means the request did not get through (connection error, timeout)
+                if (status_code is not None and status_code not in RETRIABLE_STATUS_CODES) or attempt == self.max_retries:
+                    logger.error(f"Batch upload of {len(pending)} documents failed: {str(e)}")
+                    self._record(failed_batches=1)
+                    self._fail(pending)
+                    return
+                logger.warning(f"Batch upload of {len(pending)} documents failed, retrying: {str(e)}")
+                continue
+
+            retry_keys = set()
+            permanent_failures = 0
+            succeeded = 0
+            for result in results:
+                if result.succeeded:
+                    succeeded += 1
+                elif result.status_code in RETRIABLE_STATUS_CODES:
+                    retry_keys.add(result.key)
+                else:
+                    permanent_failures += 1
+                    logger.error(f"Document '{result.key}' was rejected: {result.error_message}")
+            self._record(uploaded=succeeded)
+            if permanent_failures:
+                with self._stats_lock:
+                    self.stats['failed'] += permanent_failures
+                    self.failed_keys.extend(result.key for result in results
+                                            if not result.succeeded and result.key not in retry_keys)
+
+            pending = [document for document in pending if document.get(self.key_field) in retry_keys]
+            if not pending:
+                return
+        logger.error(f"Giving up on {len(pending)} documents after {self.max_retries} retries")
+        self._fail(pending)
+
+    def flush(self) -> Dict[str, int]:
+        """
+        Upload the remaining documents and wait for all batches
+
+        Returns:
+            Counts of uploaded, failed and retried documents and of (failed) batches
+        """
+        if self._batch:
+            self._send()
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        return dict(self.stats)
+
+    def close(self) -> Dict[str, int]:
+        try:
+            return self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+# Fields fetched for chat context (file_path, subject fields and the like are never needed there)
+CONTEXT_SELECT_FIELDS = ['id', 'document_id', 'document_name', 'chunk_id', 'content']
+# Highlighted passages are marked with these tags, and the tags removed again before prompting
+HIGHLIGHT_PRE_TAG = '<em>'
+HIGHLIGHT_POST_TAG = '</em>'
+HIGHLIGHT_TAG_PATTERN = re.compile(r'</?em>')
+CONTEXT_MAX_CHARS_PER_RESULT = 600
+# Context returned when the search found nothing, and when it failed (starts with "Error" like other failures)
+NO_RESULTS_CONTEXT = "No relevant information found in the uploaded documents."
+SEARCH_FAILED_CONTEXT = "Error retrieving context: the Azure AI Search request failed."
+
+# Indexes known to exist, per (endpoint, index name), shared by every client in the process
+_verified_indexes = set()
+_verified_indexes_lock = threading.Lock()
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for a while instead of failing every request.
+
+    closed:    calls go through, consecutive failures are counted
+    open:      calls are refused until reset_timeout_seconds have passed
+    half_open: one probe call is let through; success closes the circuit,
+               failure opens it again
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout_seconds: float = 30):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout_seconds: Time the circuit stays open before a probe is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def available(self) -> bool:
+        """Whether a call would be let through right now (does not claim the half-open probe)"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                return time.monotonic() - self._opened_at >= self.reset_timeout_seconds
+            return False
+
+    def allow_request(self) -> bool:
+        """
+        Claim permission for a call
+
+        Returns:
+            True if the call may be made; in the half-open state only one caller gets True
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_seconds:
+                self._state = self.HALF_OPEN
+                logger.info("Azure AI Search circuit half-open, probing")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Azure AI Search circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self):
+        """Open the circuit immediately"""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self._state != self.OPEN:
+            logger.warning(f"Azure AI Search circuit open for {self.reset_timeout_seconds}s after {self._failures} failure(s)")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+
+def index_fields() -> List[SimpleField]:
+    """Schema of the search index, used when the index is created"""
+    return [
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+        # Filterable so the chunks of a deleted document can be found (see delete_document_entries)
+        SimpleField(name="document_id", type=SearchFieldDataType.String, filterable=True),
+        SimpleField(name="document_name", type=SearchFieldDataType.String),
+        SimpleField(name="subject_id", type=SearchFieldDataType.String, filterable=True),
+        SimpleField(name="subject_name", type=SearchFieldDataType.String),
+        SimpleField(name="chunk_id", type=SearchFieldDataType.Int32),
+        SearchableField(name="content", type=SearchFieldDataType.String),
+        SimpleField(name="file_path", type=SearchFieldDataType.String)
+    ]
+
 class AzureSearchClient:
     """Class for interacting with Azure AI Search"""
 
-    def __init__(self, endpoint: str, api_key: str, index_name: str):
+    def __init__(self, endpoint: str, api_key: str, index_name: str,
+                 failure_threshold: int = 3, reset_timeout_seconds: float = 30,
+                 upload_concurrency: int = 4, upload_batch_bytes: int = MAX_BATCH_BYTES):
         """
         Initialize the Azure Search client
 
@@ -32,21 +313,23 @@ class AzureSearchClient:
             endpoint: Azure Search endpoint URL
             api_key: Azure Search API key
             index_name: Name of the search index to use
+            failure_threshold: Consecutive failed calls before search is skipped for a while
+            reset_timeout_seconds: How long search is skipped before it is tried again
+            upload_concurrency: Number of upload batches in flight at once
+            upload_batch_bytes: Maximum payload bytes per upload batch
         """
         self.endpoint = endpoint
         self.api_key = api_key
         self.index_name = index_name
         self.credential = AzureKeyCredential(api_key)
-        self.is_available = True
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout_seconds)
+        self.upload_concurrency = upload_concurrency
+        self.upload_batch_bytes = upload_batch_bytes
+        self._configured = True
+        self._index_ready = False
 
         try:
             self.index_client = SearchIndexClient(endpoint=endpoint, credential=self.credential)
-
-            # Ensure index exists before initializing search client
-            if not self.ensure_index_exists():
-                self.is_available = False
-                logger.warning("Azure AI Search index could not be created or accessed. Search functionality will be limited.")
-
             self.search_client = SearchClient(
                 endpoint=endpoint,
                 index_name=index_name,
@@ -54,22 +337,46 @@ class AzureSearchClient:
             )
         except Exception as e:
             logger.error(f"Failed to initialize Azure AI Search client: {str(e)}")
-            self.is_available = False
+            self._configured = False
+            return
+
+        # Ensure index exists before the first search; if it can't be reached, retry once the circuit half-opens
+        if not self.ensure_index_exists():
+            self.breaker.trip()
+            logger.warning("Azure AI Search index could not be created or accessed. Search functionality will be limited.")
+
+    @property
+    def is_available(self) -> bool:
+        """Whether Azure AI Search is configured and not currently skipped by the circuit breaker"""
+        return self._configured and self.breaker.available
+
+    def _index_is_ready(self) -> bool:
+        """Check (and cache) the index before a call made through the circuit breaker"""
+        return self._index_ready or self.ensure_index_exists()
 
     def ensure_index_exists(self) -> bool:
         """
         Ensure that the search index exists, creating it if necessary
 
+        The result is cached for the process, so only the first client pays for the lookup.
+
         Returns:
             True if index exists or was created successfully, False otherwise
         """
+        cache_key = (self.endpoint, self.index_name)
+        if cache_key in _verified_indexes:
+            self._index_ready = True
+            return True
+
         try:
-            # Check if index exists
+            # Look up just this index instead of listing every index of the service
             try:
-                indexes = list(self.index_client.list_indexes())
-                if self.index_name in [index.name for index in indexes]:
-                    logger.info(f"Index '{self.index_name}' already exists")
-                    return True
+                self.index_client.get_index(self.index_name)
+                logger.info(f"Index '{self.index_name}' already exists")
+                self._mark_index_ready(cache_key)
+                return True
+            except ResourceNotFoundError:
+                pass
             except Exception as e:
                 logger.error(f"Error checking if index exists: {str(e)}")
                 return False
@@ -77,23 +384,12 @@ class AzureSearchClient:
             # Create index if it doesn't exist
             logger.info(f"Creating index '{self.index_name}'")
 
-            # Define index fields
-            fields = [
-                SimpleField(name="id", type=SearchFieldDataType.String, key=True),
-                SimpleField(name="document_id", type=SearchFieldDataType.String),
-                SimpleField(name="document_name", type=SearchFieldDataType.String),
-                SimpleField(name="subject_id", type=SearchFieldDataType.String, filterable=True),
-                SimpleField(name="subject_name", type=SearchFieldDataType.String),
-                SimpleField(name="chunk_id", type=SearchFieldDataType.Int32),
-                SearchableField(name="content", type=SearchFieldDataType.String),
-                SimpleField(name="file_path", type=SearchFieldDataType.String)
-            ]
-
             # Create the index
             try:
-                index = SearchIndex(name=self.index_name, fields=fields)
+                index = SearchIndex(name=self.index_name, fields=index_fields())
                 self.index_client.create_or_update_index(index)
                 logger.info(f"Index '{self.index_name}' created successfully")
+                self._mark_index_ready(cache_key)
                 return True
             except Exception as e:
                 logger.error(f"Error creating index: {str(e)}")
@@ -103,6 +399,99 @@ class AzureSearchClient:
             logger.error(f"Error ensuring index exists: {str(e)}")
             return False
 
+    def _mark_index_ready(self, cache_key):
+        with _verified_indexes_lock:
+            _verified_indexes.add(cache_key)
+        self._index_ready = True
+
+    def recreate_index(self) -> bool:
+        """
+        Drop the search index and create it again from the current schema, e.g. after a schema change
+
+        Everything indexed so far is lost, the documents have to be uploaded again.
+
+        Returns:
+            True if the index was recreated, False otherwise
+        """
+        if not self._configured:
+            logger.warning("Azure AI Search is not configured. Cannot recreate the index.")
+            return False
+
+        with _verified_indexes_lock:
+            _verified_indexes.discard((self.endpoint, self.index_name))
+        self._index_ready = False
+        try:
+            self.index_client.delete_index(self.index_name)
+            logger.info(f"Deleted index '{self.index_name}'")
+        except ResourceNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error deleting index '{self.index_name}': {str(e)}")
+            return False
+
+        return self.ensure_index_exists()
+
+    def iter_index_entries(self, select: List[str] = None, subject_id: str = None):
+        """
+        Iterate over every entry of the index (pages are fetched as the iterator advances)
+
+        Args:
+            select: Fields to return (all if None)
+            subject_id: Only entries of this subject
+
+        Returns:
+            Iterator of index entries
+        """
+        filter_condition = f"subject_id eq '{subject_id}'" if subject_id else None
+        return iter(self.search_client.search(search_text='*', select=select, filter=filter_condition))
+
+    def delete_documents(self, keys: List[str]) -> int:
+        """
+        Delete entries from the index by key
+
+        Args:
+            keys: Values of the key field ('id') of the entries to delete
+
+        Returns:
+            Number of entries deleted
+        """
+        deleted = 0
+        for start in range(0, len(keys), MAX_BATCH_DOCUMENTS):
+            batch = [{'id': key} for key in keys[start:start + MAX_BATCH_DOCUMENTS]]
+            try:
+                results = self.search_client.delete_documents(documents=batch)
+                deleted += sum(1 for result in results if result.succeeded)
+            except Exception as e:
+                logger.error(f"Error deleting {len(batch)} documents from the index: {str(e)}")
+        return deleted
+
+    def delete_document_entries(self, document_id: str) -> int:
+        """
+        Delete the index entries (chunks) of one document
+
+        Needs document_id to be filterable, which indexes created before it was
+        have to be recreated for (reindex.py --recreate-index); until then the
+        entries are left to reindex's stale entry removal.
+
+        Args:
+            document_id: ID of the document
+
+        Returns:
+            Number of entries deleted
+        """
+        if not self.is_available:
+            logger.warning("Azure AI Search is not available. Cannot delete document entries.")
+            return 0
+
+        try:
+            entries = self.search_client.search(search_text='*', select=['id'],
+                                                filter=f"document_id eq '{document_id}'")
+            keys = [entry['id'] for entry in entries]
+        except Exception as e:
+            logger.error(f"Error finding the index entries of document {document_id}: {str(e)}")
+            return 0
+        return self.delete_documents(keys) if keys else 0
+
     def create_or_update_index(self, fields: List[Dict[str, Any]]) -> bool:
         """
         Create or update the search index
@@ -136,34 +525,51 @@ class AzureSearchClient:
         Returns:
             Number of documents successfully uploaded
         """
-        if not self.is_available:
+        if not documents:
+            return 0
+        if not self._configured or not self.breaker.allow_request():
             logger.warning("Azure AI Search is not available. Cannot upload documents.")
             return 0
 
         try:
-            if not documents:
-                return 0
-
-            # Upload documents in batches of 1000 (Azure Search limit)
-            batch_size = 1000
-            uploaded_count = 0
-
-            for i in range(0, len(documents), batch_size):
-                batch = documents[i:i+batch_size]
-                result = self.search_client.upload_documents(documents=batch)
-                succeeded = sum([1 for r in result if r.succeeded])
-                uploaded_count += succeeded
-                logger.info(f"Batch upload: {succeeded}/{len(batch)} succeeded")
-
-            return uploaded_count
+            if not self._index_is_ready():
+                raise RuntimeError(f"Index '{self.index_name}' is not accessible")
+
+            with self.indexing_buffer() as buffer:
+                buffer.add_many(documents)
+            stats = buffer.stats
+            logger.info(f"Uploaded {stats['uploaded']}/{len(documents)} documents in {stats['batches']} batches "
+                        f"({stats['retried']} retried, {stats['failed']} failed)")
+
+            # Rejected documents are not an outage, only requests that failed outright count against the service
+            if stats['failed_batches'] and not stats['uploaded']:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return stats['uploaded']
 
         except Exception as e:
             logger.error(f"Error uploading documents: {str(e)}")
-            self.is_available = False
+            self.breaker.record_failure()
             return 0
 
+    def indexing_buffer(self, **kwargs) -> IndexingBuffer:
+        """
+        Create a buffered sender for uploading many documents, e.g. while they are still being prepared
+
+        Args:
+            kwargs: Overrides of the IndexingBuffer settings
+
+        Returns:
+            IndexingBuffer uploading to this client's index (use it as a context manager)
+        """
+        settings = {'max_in_flight': self.upload_concurrency, 'max_batch_bytes': self.upload_batch_bytes}
+        settings.update(kwargs)
+        return IndexingBuffer(self.search_client, **settings)
+
     def search(self, query: str, subject_id: str = None,
-               top: int = 3, filter_condition: str = None) -> List[Dict[str, Any]]:
+               top: int = 3, filter_condition: str = None, select: List[str] = None,
+               highlight_fields: str = None, use_breaker: bool = True) -> Optional[List[Dict[str, Any]]]:
         """
         Search the index for documents matching the query
 
@@ -172,15 +578,23 @@ class AzureSearchClient:
             subject_id: Optional subject ID to filter by
             top: Maximum number of results to return
             filter_condition: Optional additional filter condition
+            select: Fields to return (all fields if None)
+            highlight_fields: Comma separated fields to return highlighted fragments for,
+                              available as result['@search.highlights'][field]
+            use_breaker: False if the caller claimed the circuit breaker and records the outcome
+                         itself, e.g. for several searches answering one question
 
         Returns:
-            List of search results
+            List of search results (empty if nothing matched), or None if the search could not be made or failed
         """
-        if not self.is_available:
+        if not self._configured or (use_breaker and not self.breaker.allow_request()):
             logger.warning("Azure AI Search is not available. Cannot perform search.")
-            return []
+            return None
 
         try:
+            if not self._index_is_ready():
+                raise RuntimeError(f"Index '{self.index_name}' is not accessible")
+
             # Construct filter
             filters = []
             if subject_id:
@@ -191,11 +605,18 @@ class AzureSearchClient:
             filter_expr = " and ".join(filters) if filters else None
 
             # Use basic search parameters that are supported across all versions
+            search_options = {}
+            if select:
+                search_options['select'] = select
+            if highlight_fields:
+                search_options['highlight_fields'] = highlight_fields
+                search_options['highlight_pre_tag'] = HIGHLIGHT_PRE_TAG
+                search_options['highlight_post_tag'] = HIGHLIGHT_POST_TAG
             results = self.search_client.search(
                 search_text=query,
                 filter=filter_expr,
-                include_total_count=True,
-                top=top
+                top=top,
+                **search_options
             )
 
             # Convert results to a list of dictionaries
@@ -204,23 +625,86 @@ class AzureSearchClient:
                 doc_dict = {k: v for k, v in result.items()}
                 documents.append(doc_dict)
 
+            if use_breaker:
+                self.breaker.record_success()
             return documents
 
         except Exception as e:
             logger.error(f"Error searching documents: {str(e)}")
-            self.is_available = False
-            return []
+            if use_breaker:
+                self.breaker.record_failure()
+            return None
+
+def _truncate_at_sentence(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, at the end of a sentence where possible"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = max(cut.rfind('. '), cut.rfind('? '), cut.rfind('! '), cut.rfind('\n'))
+    if sentence_end > max_chars // 2:
+        return cut[:sentence_end + 1].rstrip()
+    return cut.rstrip() + '...'
+
+def extract_relevant_text(result: Dict[str, Any], max_chars: int = CONTEXT_MAX_CHARS_PER_RESULT) -> str:
+    """
+    Reduce a search hit to the passages that matched the query
+
+    Uses the highlight fragments Azure AI Search returned for the content field; a
+    hit without highlights (e.g. matched through stemming only) falls back to the
+    start of its content.
+
+    Args:
+        result: Search result from AzureSearchClient.search
+        max_chars: Maximum length of the returned text
+
+    Returns:
+        Relevant text of the hit
+    """
+    fragments = (result.get('@search.highlights') or {}).get('content') or []
+    passages = []
+    seen = set()
+    for fragment in fragments:
+        passage = HIGHLIGHT_TAG_PATTERN.sub('', fragment).strip()
+        if passage and passage not in seen:
+            seen.add(passage)
+            passages.append(passage)
+    if passages:
+        return _truncate_at_sentence(' ... '.join(passages), max_chars)
+    return _truncate_at_sentence(result.get('content', '') or '', max_chars)
+
+def format_context(results: List[Dict[str, Any]], max_chars_per_result: int = CONTEXT_MAX_CHARS_PER_RESULT) -> str:
+    """
+    Combine search hits into the document context of a prompt
+
+    Args:
+        results: Search results (with highlights) in rank order
+        max_chars_per_result: Maximum length of the text taken from one chunk
+
+    Returns:
+        Concatenated relevant context as a string
+    """
+    context_parts = []
+    for result in results:
+        content = extract_relevant_text(result, max_chars_per_result)
+        doc_name = result.get("document_name", "Unknown document")
+        context_parts.append(f"Document: {doc_name}\n{content}")
+    return "\n\n---\n\n".join(context_parts)
 
 def get_relevant_context(search_client: AzureSearchClient, query: str,
-                         subject_id: str, max_results: int = 5) -> str:
+                         subject_id: str, max_results: int = 5,
+                         max_chars_per_result: int = CONTEXT_MAX_CHARS_PER_RESULT) -> str:
     """
     Get relevant context from documents based on the query
 
+    Only the fields needed for the prompt are fetched, and only the passages of
+    each chunk that matched the query are kept.
+
     Args:
         search_client: AzureSearchClient instance
         query: The user's question
         subject_id: ID of the subject
         max_results: Maximum number of document chunks to retrieve
+        max_chars_per_result: Maximum length of the text taken from one chunk
 
     Returns:
         Concatenated relevant context as a string
@@ -231,28 +715,21 @@ def get_relevant_context(search_client: AzureSearchClient, query: str,
             return "Azure AI Search is not available. Unable to retrieve context from documents. Please check your configuration."
 
         # Search for relevant document chunks
-        results = search_client.search(query=query, subject_id=subject_id, top=max_results)
+        results = search_client.search(query=query, subject_id=subject_id, top=max_results,
+                                       select=CONTEXT_SELECT_FIELDS, highlight_fields='content')
 
+        if results is None:
+            return SEARCH_FAILED_CONTEXT
         if not results:
             logger.info(f"No search results found for query: '{query}' in subject_id: '{subject_id}'")
-            return "No relevant information found in the uploaded documents."
+            return NO_RESULTS_CONTEXT
 
         # Log success to help with debugging
         logger.info(f"Found {len(results)} document chunks relevant to query: '{query}'")
 
-        # Combine the content from the results
-        context_parts = []
-
-        for i, result in enumerate(results):
-            content = result.get("content", "")
-            doc_name = result.get("document_name", "Unknown document")
-            context_parts.append(f"Document: {doc_name}\n{content}")
-
-        # Combine all context parts
-        full_context = "\n\n---\n\n".join(context_parts)
-
-        return full_context
+        # Combine the relevant passages of the results
+        return format_context(results, max_chars_per_result)
 
     except Exception as e:
         logger.error(f"Error retrieving context: {str(e)}")
-        return f"Error retrieving context: {str(e)}"
\ No newline at end of file
+        return f"Error retrieving context: {str(e)}"
@@ -0,0 +1,190 @@
+"""
+services.py - Thread-safe container for the app's process wide services (clients, stores, managers)
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """
+    Creates every registered service once per process, on first use or during
+    warm-up, and answers health checks about them.
+
+    Each service has its own lock, so a slow service (e.g. a MongoDB connection
+    that times out) never blocks the creation of the others, and two request
+    threads can not both create the same service.
+    """
+
+    def __init__(self):
+        self._services = {}
+        self._instances = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread = None
+        self.warm_up_started_at = None
+        self.warm_up_finished_at = None
+        self.warm_up_results = {}
+
+    def register(self, name: str, factory: Callable[[], Any], close: Callable[[Any], None] = None,
+                 check: Callable[[Any], bool] = None, required: bool = False):
+        """
+        Register a service
+
+        Args:
+            name: Name the service is looked up by
+            factory: Creates the service, called at most once per process
+            close: Releases the service's resources on shutdown
+            check: Returns True if the service is usable (used by warm-up and readiness)
+            required: Whether the app is not ready while the service is unusable
+        """
+        with self._lock:
+            self._services[name] = {'factory': factory, 'close': close, 'check': check, 'required': required}
+            self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        """
+        Get a service, creating it on first use
+
+        Args:
+            name: Name of the service
+
+        Returns:
+            The service instance
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            # Another thread may have created it while we were waiting for the lock
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._services[name]['factory']()
+                self._instances[name] = instance
+        return instance
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Get a service only if it was already created"""
+        return self._instances.get(name)
+
+    def check(self, name: str) -> bool:
+        """
+        Create a service if needed and run its check
+
+        Args:
+            name: Name of the service
+
+        Returns:
+            True if the service is usable
+        """
+        try:
+            instance = self.get(name)
+            check = self._services[name]['check']
+            return bool(check(instance)) if check else True
+        except Exception as e:
+            logger.error(f"Service '{name}' is not usable: {str(e)}")
+            return False
+
+    def warm_up(self, names: Iterable[str]) -> Dict[str, bool]:
+        """
+        Create and check services before traffic arrives
+
+        Args:
+            names: Services to warm up (unknown names are skipped)
+
+        Returns:
+            Dictionary of service name to check result
+        """
+        self.warm_up_started_at = time.time()
+        results = {}
+        for name in names:
+            if name not in self._services:
+                logger.warning(f"Skipping warm-up of unknown service '{name}'")
+                continue
+            start = time.perf_counter()
+            results[name] = self.check(name)
+            logger.info(f"Warmed up '{name}' in {time.perf_counter() - start:.2f}s (usable: {results[name]})")
+        self.warm_up_results = results
+        self.warm_up_finished_at = time.time()
+        return results
+
+    def start_warm_up(self, names: Iterable[str]) -> threading.Thread:
+        """
+        Warm up services in a background thread, so the worker can answer liveness
+        probes while slow connections are being established
+
+        Args:
+            names: Services to warm up
+
+        Returns:
+            The warm-up thread
+        """
+        self.warm_up_started_at = time.time()
+        self.warm_up_finished_at = None
+        self._warm_up_thread = threading.Thread(target=self.warm_up, args=(list(names),), name='service-warm-up', daemon=True)
+        self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    @property
+    def warming_up(self) -> bool:
+        return self.warm_up_started_at is not None and self.warm_up_finished_at is None
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Check whether the app can serve traffic
+
+        Only required services are checked on every call; the others report
+        their warm-up result, so frequent probes stay cheap.
+
+        Returns:
+            Dictionary with 'ready' and the state of every service
+            ('ok', 'unavailable', 'started' or 'not started')
+        """
+        if self.warming_up:
+            return {'ready': False, 'status': 'warming up', 'services': {}}
+
+        states = {}
+        ready = True
+        for name, service in list(self._services.items()):
+            if service['required']:
+                usable = self.check(name)
+                ready = ready and usable
+            elif name in self.warm_up_results:
+                usable = self.warm_up_results[name]
+            else:
+                states[name] = 'started' if name in self._instances else 'not started'
+                continue
+            states[name] = 'ok' if usable else 'unavailable'
+        return {'ready': ready, 'status': 'ready' if ready else 'not ready', 'services': states}
+
+    def reset(self):
+        """
+        Forget all created services without closing them
+
+        Called in a freshly forked worker: connections inherited from the parent
+        process must not be used (or closed) by the child.
+        """
+        with self._lock:
+            self._instances = {}
+            self._locks = {name: threading.Lock() for name in self._services}
+        self._warm_up_thread = None
+        self.warm_up_started_at = None
+        self.warm_up_finished_at = None
+        self.warm_up_results = {}
+
+    def close(self):
+        """Close all created services (on process shutdown)"""
+        for name, instance in list(self._instances.items()):
+            close = self._services[name]['close']
+            if close is None:
+                continue
+            try:
+                close(instance)
+            except Exception as e:
+                logger.error(f"Error closing service '{name}': {str(e)}")
+        self._instances = {}
@@ -0,0 +1,242 @@
+"""
+subject_digest.py - Per-subject knowledge digest (topics, key terms, document map) maintained incrementally
+
+The subject digest lives in the 'subject_digests' collection, one record per
+subject:
+
+    {
+        '_id': subject_id,
+        'format': SUBJECT_DIGEST_FORMAT,
+        'version': 7,                       # incremented by every change
+        'documents': {document_id: {...}},  # document map, see document_entry
+        'term_weights': {term: weight},     # summed key term weights of all documents
+        'updated_at': datetime
+    }
+
+Adding or removing a document folds only that document's entry and term weights
+into the record (see MongoDBClient.add_document_to_subject_digest and
+remove_document_from_subject_digest), so quiz generation, timetable topic
+extraction and subject chat read one record instead of re-extracting every file.
+"""
+
+import os
+import logging
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from document_digest import (DIGEST_VERSION, KEY_TERMS_MAX, has_current_digest, get_or_build_digest,
+                             format_digest, digest_relevance)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when the record format changes, older records are rebuilt on first use
+SUBJECT_DIGEST_FORMAT = 1
+SUBJECT_TOPICS_MAX = 25
+SUBJECT_KEY_TERMS_MAX = 30
+
+def document_entry(filename: str, digest: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the document map entry of a document
+
+    Args:
+        filename: Original file name
+        digest: Document digest from document_digest.build_digest
+
+    Returns:
+        Entry with the document's summary, headings, key terms and their weights
+    """
+    key_terms = digest.get('key_terms', [])
+    return {
+        'filename': filename,
+        'summary': digest.get('summary', ''),
+        'toc': digest.get('toc', []),
+        'key_terms': key_terms,
+        # Higher ranked key terms weigh more, the weights are summed over the subject
+        'term_weights': {term: KEY_TERMS_MAX - rank for rank, term in enumerate(key_terms[:KEY_TERMS_MAX])},
+        'digest_version': digest.get('version', DIGEST_VERSION)
+    }
+
+def fold_in_document(mongo_client, subject_id: str, document_id: str, filename: str,
+                     digest: Dict[str, Any]) -> bool:
+    """
+    Add a document to its subject's digest
+
+    Args:
+        mongo_client: MongoDBClient instance
+        subject_id: Subject ID
+        document_id: Document ID
+        filename: Original file name
+        digest: Document digest from document_digest.build_digest
+
+    Returns:
+        True if the digest was updated, False if it already covered the document or the update failed
+    """
+    return mongo_client.add_document_to_subject_digest(subject_id, document_id, document_entry(filename, digest),
+                                                       SUBJECT_DIGEST_FORMAT)
+
+def fold_out_document(mongo_client, subject_id: str, document_id: str) -> bool:
+    """
+    Remove a document from its subject's digest
+
+    Args:
+        mongo_client: MongoDBClient instance
+        subject_id: Subject ID
+        document_id: Document ID
+
+    Returns:
+        True if the digest was updated, False if it did not cover the document or the update failed
+    """
+    return mongo_client.remove_document_from_subject_digest(subject_id, document_id)
+
+def subject_key_terms(subject_digest: Dict[str, Any], max_terms: int = SUBJECT_KEY_TERMS_MAX) -> List[str]:
+    """
+    Get the key terms of a subject
+
+    Args:
+        subject_digest: Subject digest record
+        max_terms: Maximum number of terms returned
+
+    Returns:
+        Terms ordered by their summed weight over the subject's documents
+    """
+    # Removing a document leaves its terms at zero weight rather than deleting them
+    weights = {term: weight for term, weight in (subject_digest.get('term_weights') or {}).items() if weight > 0}
+    return sorted(weights, key=lambda term: (-weights[term], term))[:max_terms]
+
+def subject_topics(subject_digest: Dict[str, Any], max_topics: int = SUBJECT_TOPICS_MAX) -> List[str]:
+    """
+    Get the topics of a subject
+
+    Args:
+        subject_digest: Subject digest record
+        max_topics: Maximum number of topics returned
+
+    Returns:
+        Document headings, the ones shared by most documents first
+    """
+    counts = Counter()
+    first_seen = {}
+    for entry in (subject_digest.get('documents') or {}).values():
+        for heading in entry.get('toc', []):
+            key = heading.lower()
+            counts[key] += 1
+            first_seen.setdefault(key, heading)
+    # Counter.most_common keeps insertion order for ties, i.e. document order
+    return [first_seen[key] for key, _ in counts.most_common(max_topics)]
+
+def relevant_documents(subject_digest: Dict[str, Any], query: str) -> List[str]:
+    """
+    Find the documents of a subject that match a query
+
+    Args:
+        subject_digest: Subject digest record
+        query: A question or topic
+
+    Returns:
+        IDs of the documents whose headings or key terms contain query terms, best match first
+    """
+    scored = []
+    for document_id, entry in (subject_digest.get('documents') or {}).items():
+        score = digest_relevance(entry, query)
+        if score > 0:
+            scored.append((score, document_id))
+    scored.sort(key=lambda item: -item[0])
+    return [document_id for _, document_id in scored]
+
+def format_subject_digest(subject_digest: Dict[str, Any], query: Optional[str] = None,
+                          max_documents: Optional[int] = None, max_chars: Optional[int] = None) -> str:
+    """
+    Render a subject digest as prompt context
+
+    Args:
+        subject_digest: Subject digest record
+        query: Documents matching this query are listed first (document order if None)
+        max_documents: Maximum number of documents listed (all if None)
+        max_chars: Stop adding documents once the text is this long (no limit if None)
+
+    Returns:
+        Text with the subject's topics, key terms and a summary of each document
+    """
+    documents = subject_digest.get('documents') or {}
+    parts = []
+    topics = subject_topics(subject_digest)
+    if topics:
+        parts.append("Subject topics: " + '; '.join(topics))
+    key_terms = subject_key_terms(subject_digest)
+    if key_terms:
+        parts.append("Subject key terms: " + ', '.join(key_terms))
+
+    order = list(documents)
+    if query:
+        matching = relevant_documents(subject_digest, query)
+        order = matching + [document_id for document_id in order if document_id not in matching]
+    if max_documents is not None:
+        order = order[:max_documents]
+
+    for document_id in order:
+        entry = documents[document_id]
+        parts.append(f"Document: {entry.get('filename', 'Unnamed Document')}\n{format_digest(entry)}")
+        if max_chars is not None and len('\n\n'.join(parts)) > max_chars:
+            break
+    return '\n\n'.join(parts)
+
+def sync_subject_digest(mongo_client, subject_id: str, upload_folder: str,
+                        max_builds: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Get a subject's digest, catching up on documents it does not cover
+
+    Uploads and deletions keep the digest current; this folds in documents
+    uploaded before subject digests existed (or whose update failed), folds out
+    deleted ones, and rebuilds records of an older format. Only the documents
+    missing from the digest are read, and only those without a document digest
+    are extracted.
+
+    Args:
+        mongo_client: MongoDBClient instance
+        subject_id: Subject ID
+        upload_folder: Folder the uploaded files are stored in
+        max_builds: Maximum number of document digests extracted from files in this call (no limit if None)
+
+    Returns:
+        The subject digest record, or None if the subject has no readable documents
+    """
+    subject_digest = mongo_client.get_subject_digest(subject_id)
+    if subject_digest is not None and subject_digest.get('format') != SUBJECT_DIGEST_FORMAT:
+        logger.info(f"Rebuilding digest of subject {subject_id} in format {SUBJECT_DIGEST_FORMAT}")
+        mongo_client.delete_subject_digest(subject_id)
+        subject_digest = None
+
+    # All of the subject's documents, not only the requesting user's, so that deletions are recognized
+    documents = mongo_client.get_subject_documents(subject_id)
+    covered = (subject_digest or {}).get('documents') or {}
+    changed = False
+
+    for doc in documents:
+        entry = covered.get(doc['_id'])
+        if entry is not None and entry.get('digest_version') == DIGEST_VERSION:
+            continue
+        file_path = os.path.join(upload_folder, doc['storage_path'])
+        if not has_current_digest(doc):
+            if max_builds == 0 or not os.path.exists(file_path):
+                continue
+            if max_builds is not None:
+                max_builds -= 1
+        digest = get_or_build_digest(doc, file_path, mongo_client)
+        if not digest:
+            continue
+        if entry is not None:
+            fold_out_document(mongo_client, subject_id, doc['_id'])
+        fold_in_document(mongo_client, subject_id, doc['_id'], doc['filename'], digest)
+        changed = True
+
+    # An empty list may also be a failed query, the deletion route folds documents out itself
+    stale = set(covered) - {doc['_id'] for doc in documents} if documents else set()
+    for document_id in stale:
+        fold_out_document(mongo_client, subject_id, document_id)
+        changed = True
+
+    if changed:
+        subject_digest = mongo_client.get_subject_digest(subject_id)
+    return subject_digest
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The application modules are imported from the nova directory, as in app.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,79 @@
+"""
+Tests of the streaming DOCX extractor and the Markdown tokenizer in document_processor
+"""
+
+import io
+import zipfile
+
+from document_digest import extract_toc
+from document_processor import extract_text_from_docx, extract_text_from_markdown, markdown_to_text
+
+WORD_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+def _paragraph(text: str, style: str = None) -> str:
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{properties}<w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+
+def _cell(text: str, merge: str = None) -> str:
+    if merge is None:
+        return f'<w:tc>{_paragraph(text)}</w:tc>'
+    value = f' w:val="{merge}"' if merge else ''
+    return f'<w:tc><w:tcPr><w:vMerge{value}/></w:tcPr>{_paragraph(text)}</w:tc>'
+
+def _docx(body: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', f'<?xml version="1.0" encoding="UTF-8"?>'
+                                              f'<w:document xmlns:w="{WORD_NAMESPACE}"><w:body>{body}</w:body></w:document>')
+    return buffer.getvalue()
+
+def test_markdown_keeps_underscores_inside_words():
+    text = markdown_to_text("Use snake_case_name and file_name_here")
+    assert text == "Use snake_case_name and file_name_here"
+
+def test_markdown_strips_emphasis():
+    text = markdown_to_text("Read the *assigned* chapter, _carefully_ and __twice__, ~~not~~ **now**")
+    assert text == "Read the assigned chapter, carefully and twice, not now"
+
+def test_markdown_keeps_heading_markers():
+    text = markdown_to_text("# Biology 101\n\nIntro\n\n## Week 1: Cells ##\n")
+    assert text.splitlines()[0] == "# Biology 101"
+    assert "## Week 1: Cells" in text.splitlines()
+    assert extract_toc(text) == ["Biology 101", "Week 1: Cells"]
+
+def test_markdown_links_code_and_tables():
+    source = "\n".join([
+        "See the [course page](https://example.edu) and `problem_set.pdf`",
+        "",
+        "| Week | Topic |",
+        "|---|---|",
+        "| 1 | Cells |",
+        "",
+        "```",
+        "x = *not emphasis*",
+        "```",
+    ])
+    lines = markdown_to_text(source).splitlines()
+    assert lines[0] == "See the course page and problem_set.pdf"
+    assert "Week | Topic" in lines
+    assert "1 | Cells" in lines
+    assert "x = *not emphasis*" in lines
+
+def test_extract_text_from_markdown_bytes():
+    assert extract_text_from_markdown("## Notes\n- item_one".encode('utf-8')) == "## Notes\nitem_one"
+
+def test_docx_headings_paragraphs_and_merged_cells():
+    rows = [
+        _cell('1', 'restart') + _cell('Session 1') + _cell('Cells'),
+        _cell('', '') + _cell('Session 2') + _cell('Membranes'),
+    ]
+    body = (_paragraph('Biology 101', 'Heading1') + _paragraph('Course outline')
+            + '<w:tbl>' + ''.join(f'<w:tr>{row}</w:tr>' for row in rows) + '</w:tbl>'
+            + _paragraph('Assessment', 'Heading2'))
+    text = extract_text_from_docx(_docx(body))
+    assert text.split('\n\n') == ["# Biology 101", "Course outline", "1 | Session 1 | Cells",
+                                  "Session 2 | Membranes", "## Assessment"]
+    assert extract_toc(text) == ["Biology 101", "Assessment"]
+
+def test_docx_invalid_file():
+    assert extract_text_from_docx(b'not a zip file').startswith("Error processing DOCX")
@@ -0,0 +1,82 @@
+"""
+Tests of the Semantic Scholar client against the local mock server
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from agents import semantic_scholar
+from agents.semantic_scholar import ResponseCache, SemanticScholarClient, SemanticScholarError, TokenBucket
+from agents.semantic_scholar_mock import MockSemanticScholarServer
+
+def _client(server: MockSemanticScholarServer, rate_limiter: TokenBucket = None, cache: ResponseCache = None,
+            max_retries: int = 3) -> SemanticScholarClient:
+    # A fast limiter, so only Retry-After pauses show up in the timings
+    return SemanticScholarClient(base_url=server.api_url, api_key='', rate_limiter=rate_limiter or TokenBucket(100, 10),
+                                 cache=cache, max_retries=max_retries, timeout=5)
+
+def test_retries_rate_limited_search_after_retry_after():
+    with MockSemanticScholarServer(rate_limit_first=2, retry_after=0.2) as server:
+        started_at = time.monotonic()
+        papers = asyncio.run(_client(server).search_papers('osmosis', limit=3))
+        elapsed = time.monotonic() - started_at
+
+    assert len(papers) == 3
+    assert len(server.requests) == 3
+    # Two 429 responses, each waited out for its Retry-After
+    assert elapsed >= 0.4
+
+def test_rate_limit_pauses_every_request_sharing_the_limiter():
+    rate_limiter = TokenBucket(100, 10)
+
+    async def search_later(client, query, delay):
+        await asyncio.sleep(delay)
+        await client.search_papers(query, limit=1)
+        return time.monotonic()
+
+    async def run(server):
+        # The second search starts while the first one waits out its 429
+        return await asyncio.gather(search_later(_client(server, rate_limiter), 'osmosis', 0),
+                                    search_later(_client(server, rate_limiter), 'diffusion', 0.1))
+
+    with MockSemanticScholarServer(rate_limit_first=1, retry_after=0.5) as server:
+        started_at = time.monotonic()
+        _, second_done_at = asyncio.run(run(server))
+
+    assert len(server.requests) == 3
+    assert second_done_at - started_at >= 0.45
+
+def test_token_bucket_pause_delays_all_callers():
+    bucket = TokenBucket(100, 10)
+    assert bucket.reserve() == 0
+    bucket.pause(1)
+    assert bucket.reserve() > 0.9
+    assert bucket.reserve() > 0.9
+
+def test_client_error_is_not_retried():
+    with MockSemanticScholarServer() as server:
+        with pytest.raises(SemanticScholarError, match='404'):
+            asyncio.run(_client(server).get('/paper/unknown'))
+    assert len(server.requests) == 1
+
+def test_cached_response_is_served_without_a_request(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_seconds=60)
+    with MockSemanticScholarServer() as server:
+        client = _client(server, cache=cache)
+        first = asyncio.run(client.search_papers('osmosis', limit=2))
+        second = asyncio.run(client.search_papers('osmosis', limit=2))
+
+    assert first == second
+    assert len(server.requests) == 1
+
+def test_response_cache_expires_after_ttl(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttl_seconds=60)
+    key = ResponseCache.make_key('https://example.org/paper/search', {'query': 'osmosis'})
+    cache.put(key, {'data': []})
+    assert cache.get(key) == {'data': []}
+
+    now = time.time()
+    monkeypatch.setattr(semantic_scholar.time, 'time', lambda: now + 61)
+    assert cache.get(key) is None
@@ -0,0 +1,59 @@
+"""
+text_utils.py - Shared helpers for normalizing and tokenizing free text
+"""
+
+import re
+from typing import List
+
+# Common English stop words to filter out of queries and documents
+STOP_WORDS = {'a', 'an', 'the', 'and', 'or', 'but', 'is', 'are', 'was', 'were',
+              'be', 'been', 'being', 'to', 'of', 'for', 'with', 'about', 'against',
+              'between', 'into', 'through', 'during', 'before', 'after', 'above',
+              'below', 'from', 'up', 'down', 'in', 'out', 'on', 'off', 'over',
+              'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when',
+              'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more',
+              'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own',
+              'same', 'so', 'than', 'too', 'very', 'can', 'will', 'just', 'should',
+              'now', 'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those'}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def tokenize(text: str, min_length: int = 3) -> List[str]:
+    """
+    Split text into lowercase word tokens, dropping stop words and short words
+
+    Args:
+        text: The text to tokenize
+        min_length: Minimum number of characters a token must have
+
+    Returns:
+        List of tokens in the order they appear in the text
+    """
+    if not text:
+        return []
+
+    tokens = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        # Drop contractions such as "what's" down to their stem
+        word = word.split("'", 1)[0]
+        if len(word) >= min_length and word not in STOP_WORDS:
+            tokens.append(word)
+    return tokens
+
+def stem(token: str) -> str:
+    """
+    Very light suffix stripping so that simple plural forms compare equal
+
+    Args:
+        token: A lowercase token
+
+    Returns:
+        The stemmed token
+    """
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 4 and token.endswith('sses'):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
@@ -8,10 +8,10 @@ import json
 from typing import Dict, Any, List, Optional
 import datetime
 import calendar
-from document_processor import extract_document_text
+from document_digest import get_or_build_digest, format_digest
+from subject_digest import subject_topics, subject_key_terms
 from journal_utils import JournalExtractor
 import requests
-from icalendar import Calendar, Event
 from datetime import datetime as dt, timedelta
 
 # Configure logging
@@ -48,7 +48,8 @@ class TimetableAgentSystem:
         self.document_intelligence_endpoint = document_intelligence_endpoint
         self.document_intelligence_key = document_intelligence_key
 
-    def extract_topics_from_documents(self, documents: List[Dict[str, Any]], upload_folder: str, scope: str) -> Dict[str, Any]:
+    def extract_topics_from_documents(self, documents: List[Dict[str, Any]], upload_folder: str, scope: str,
+                                      mongo_client=None, subject_digest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Agent 1 (Topic Extractor): Extract topics from documents based on specified scope
 
@@ -56,6 +57,8 @@ class TimetableAgentSystem:
             documents: List of document metadata
             upload_folder: Path to folder containing uploaded documents
             scope: User-specified scope of topics to focus on
+            mongo_client: MongoDBClient to store digests built for older documents with (optional)
+            subject_digest: The subject's digest record (see subject_digest.py); documents it covers are not read
 
         Returns:
             Dictionary containing extracted topics and other metadata
@@ -64,6 +67,18 @@ class TimetableAgentSystem:
 
         all_document_text = []
         documents_info = []
+        digest_entries = (subject_digest or {}).get('documents') or {}
+
+        if digest_entries:
+            # Topics shared across documents and the subject's key terms
+            all_document_text.append({
+                "filename": "Subject overview",
+                "text": "\n".join([
+                    "Topics: " + "; ".join(subject_topics(subject_digest)),
+                    "Key terms: " + ", ".join(subject_key_terms(subject_digest))
+                ]),
+                "info": {"filename": "Subject overview", "id": None}
+            })
 
         # Process each document to extract text
         for doc in documents:
@@ -77,14 +92,14 @@ class TimetableAgentSystem:
                     "id": doc['_id']
                 }
 
-                # Extract text using existing document processor
-                document_text = extract_document_text(file_path)
+                # Use the digest stored at upload (summary, contents, key terms) instead of parsing the file
+                digest = digest_entries.get(str(doc['_id'])) or get_or_build_digest(doc, file_path, mongo_client)
 
-                if document_text:
+                if digest:
                     # Keep track of document text for topic extraction
                     all_document_text.append({
                         "filename": filename,
-                        "text": document_text[:10000],  # Limit text size for API calls
+                        "text": format_digest(digest, max_toc=30, max_terms=20),
                         "info": doc_info
                     })
 
@@ -638,6 +653,8 @@ class TimetableAgentSystem:
             Bytes containing the iCalendar file content
         """
         logger.info("Generating iCalendar file from timetable data")
+        # Imported here, only the calendar export needs icalendar
+        from icalendar import Calendar, Event
 
         try:
             # Create a calendar